@@ -16,11 +16,27 @@ from collections import deque
 import psutil
 import os
 import gc
+import atexit
 import time
 import csv
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from flask_socketio import SocketIO
+from ticket_mask import numbers_to_mask, match_count, masks_to_strings
+from combination_index import TicketHistogram
+from rng_streams import RNGStreams
+from pool_accounting import PoolAccount
+from detail_records import DetailRecords
+from kernels import KERNEL_BACKEND, play_batch_round
+from phase_timer import PhaseTimer
+from metrics import init_app as init_metrics, record_rounds, ACTIVE_JOBS, QUEUE_DEPTH
+from progress_stream import ProgressBroadcaster, sse_response
+from progress_store import ProgressStore
+from serialization import init_app as init_json, typed_array
+from stats_log import StatsAnalysis, StatsLog, TIERS as STATS_TIERS
+from stats_log import EXPORT_COLUMNS as STATS_EXPORT_COLUMNS, EXPORT_TYPES as STATS_EXPORT_TYPES
+from export_stream import (arrow_schema, check_options as check_export_options, export_response,
+                           record_batches, select_columns)
 
 def cleanup_memory():
     """执行内存清理"""
@@ -80,28 +96,32 @@ PRIZE_TABLE = {
     4: 100.0       # 四等奖
 }
 
-def generate_random_numbers(count, max_num):
+def generate_random_numbers(count, max_num, rnd=random):
     """生成指定数量的不重复随机数字"""
-    return sorted(random.sample(range(1, max_num + 1), count))
+    return sorted(rnd.sample(range(1, max_num + 1), count))
 
-def generate_biased_numbers():
+def generate_biased_numbers(rnd=random):
     """生成偏向于小数字的号码（模拟使用生日等特殊数字的情况）"""
     numbers = set()
     while len(numbers) < 6:
-        if random.random() < 0.7:  # 70%概率选择小数字
-            num = random.randint(1, 31)  # 偏向于1-31（月份和日期范围）
+        if rnd.random() < 0.7:  # 70%概率选择小数字
+            num = rnd.randint(1, 31)  # 偏向于1-31（月份和日期范围）
         else:
-            num = random.randint(32, 42)
+            num = rnd.randint(32, 42)
         numbers.add(num)
     return sorted(list(numbers))
 
+def generate_winning_numbers():
+    """生成中奖号码"""
+    return generate_random_numbers(6, 42)
+
 def generate_player_numbers():
     """生成玩家投注号码"""
     return sorted(random.sample(range(1, 43), 6))
 
 def check_matches(winning_numbers, player_numbers):
     """检查匹配数量"""
-    return len(set(winning_numbers) & set(player_numbers))
+    return match_count(numbers_to_mask(winning_numbers), numbers_to_mask(player_numbers))
 
 def get_memory_usage():
     """获取当前进程的内存使用情况（MB）"""
@@ -112,185 +132,109 @@ def cleanup_memory():
     """清理内存"""
     gc.collect()
     
-def cleanup_progress():
-    """清理进度文件"""
-    try:
-        if os.path.exists('progress.json'):
-            os.remove('progress.json')
-    except Exception as e:
-        current_app.logger.error(f"清理进度文件失败: {str(e)}")
-
-def convert_to_serializable(obj):
-    """转换数据为可序列化的格式"""
-    if isinstance(obj, dict):
-        return {str(k): convert_to_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [convert_to_serializable(x) for x in obj]
-    elif isinstance(obj, (int, float, str, bool, type(None))):
-        return obj
-    elif isinstance(obj, (datetime, timedelta)):
-        return str(obj)
-    else:
-        return str(obj)
 def get_memory_usage():
     """获取当前进程的内存使用情况"""
     process = psutil.Process(os.getpid())
     return process.memory_info().rss / 1024 / 1024  # 转换为MB
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (np.int_, np.intc, np.intp, np.int8, np.int16, np.int32,
-                          np.int64, np.uint8, np.uint16, np.uint32, np.uint64)):
-            return int(obj)
-        elif isinstance(obj, (np.float_, np.float16, np.float32, np.float64)):
-            return float(obj)
-        return super().default(obj)
-
 app = Flask(__name__)
 CORS(app)
-app.json_encoder = CustomJSONEncoder
+# jsonify直接编码NumPy类型，不再逐层转换
+init_json(app)
+init_metrics(app)
+
+# 模拟进度的推送频道，/progress/stream的订阅者从内存读取
+PROGRESS_CHANNEL = 'simulation'
+progress_broadcaster = ProgressBroadcaster()
+
+# 进度只保存固定数量的计数器；设置环境变量LOTTO_PROGRESS_FILE时，
+# 另外按PROGRESS_PERSIST_INTERVAL限速把进度原子写入该文件
+PROGRESS_PERSIST_INTERVAL = 5.0
+progress_store = ProgressStore(persist_path=os.environ.get('LOTTO_PROGRESS_FILE'),
+                               persist_interval=PROGRESS_PERSIST_INTERVAL,
+                               broadcaster=progress_broadcaster, channel=PROGRESS_CHANNEL)
+
+def publish_progress(progress, status='running', force=False):
+    """把进度计数器写入progress_store（不含图表和详细数据），并推送给/progress/stream的订阅者"""
+    stats = progress['stats']
+    progress_store.update(
+        force=force,
+        status=status,
+        current_round=progress['current_round'],
+        total_rounds=progress['total_rounds'],
+        start_time=stats['start_time'],
+        total_players=stats['total_players'],
+        total_bets=float(stats['total_bets']),
+        total_payouts=float(stats['total_payouts']),
+        jackpot_hits=stats['jackpot_hits'],
+        prize_counts=stats['prize_counts'],
+        rtp=float(stats['rtp']),
+        memory_usage=stats['memory_usage'],
+        elapsed_time=stats['elapsed_time']
+    )
+
+@app.route('/progress/stream')
+def stream_progress():
+    """以Server-Sent Events推送模拟进度，代替轮询/progress"""
+    return sse_response(progress_broadcaster, PROGRESS_CHANNEL)
 
 def analyze_stats(stats_list):
     """分析统计数据趋势"""
-    if not stats_list:
-        return {}
-    
-    analysis = {
-        'trends': {
-            'rtp': [],
-            'players_per_round': [],
-            'bets_per_round': [],
-            'payouts_per_round': [],
-            'jackpot_frequency': []
-        },
-        'averages': {},
-        'peaks': {},
-        'total_duration': ''
-    }
-    
-    # 计算趋势
-    for stats in stats_list:
-        completed_rounds = stats['completed_rounds']
-        if completed_rounds > 0:
-            analysis['trends']['rtp'].append(stats['stats']['rtp'])
-            analysis['trends']['players_per_round'].append(
-                stats['stats']['total_players'] / completed_rounds)
-            analysis['trends']['bets_per_round'].append(
-                stats['stats']['total_bets'] / completed_rounds)
-            analysis['trends']['payouts_per_round'].append(
-                stats['stats']['total_payouts'] / completed_rounds)
-            analysis['trends']['jackpot_frequency'].append(
-                stats['stats']['jackpot_hits'] / completed_rounds if stats['stats']['jackpot_hits'] > 0 else 0)
-    
-    # 计算平均值
-    for key, values in analysis['trends'].items():
-        if values:
-            analysis['averages'][key] = sum(values) / len(values)
-    
-    # 计算峰值
-    for key, values in analysis['trends'].items():
-        if values:
-            analysis['peaks'][key] = max(values)
-    
-    # 计算总持续时间
-    if len(stats_list) >= 2:
-        start_time = datetime.strptime(stats_list[0]['timestamp'], "%Y-%m-%d %H:%M:%S")
-        end_time = datetime.strptime(stats_list[-1]['timestamp'], "%Y-%m-%d %H:%M:%S")
-        analysis['total_duration'] = str(end_time - start_time).split('.')[0]
-    
-    return analysis
+    return StatsAnalysis().extend(stats_list).result()
 
 @app.route('/stats_analysis')
 def get_stats_analysis():
-    """获取统计数据分析结果"""
+    """获取统计数据分析结果，可用start/end参数限定时间范围"""
     try:
-        stats_dir = ensure_stats_dir()
-        all_stats = []
-        
-        # 读取所有统计文件
-        for file in sorted(os.listdir(stats_dir)):
-            if file.startswith('stats_') and file.endswith('.json'):
-                with open(os.path.join(stats_dir, file), 'r') as f:
-                    stats = json.load(f)
-                    all_stats.append(stats)
-        
-        if not all_stats:
+        start, end = request.args.get('start'), request.args.get('end')
+        stats_log = get_stats_log()
+        total_stats = stats_log.count(start, end)
+
+        if not total_stats:
             return jsonify({"error": "No statistics available for analysis"})
-        
-        # 执行分析
-        analysis = analyze_stats(all_stats)
-        
+
+        # 按时间范围选择分辨率；不限定范围时使用增量缓存，只处理新追加的统计
+        resolution = stats_log.resolution_for(start, end)
+        analysis = stats_log.analyze(start, end, resolution)
+
         return jsonify({
             "analysis": analysis,
-            "total_stats": len(all_stats),
-            "time_range": {
-                "start": all_stats[0]['timestamp'] if all_stats else None,
-                "end": all_stats[-1]['timestamp'] if all_stats else None
-            }
+            "total_stats": total_stats,
+            "resolution_seconds": STATS_TIERS[resolution][0],
+            "time_range": stats_log.time_range(start, end)
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"统计数据分析失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/export_stats')
 def export_stats():
-    """导出统计数据为CSV格式"""
+    """
+    流式导出统计数据
+
+    参数: start/end限定时间范围，columns为逗号分隔的列名，
+    format为csv（默认）、jsonl或parquet，compression为gzip或zstd
+    """
     try:
-        stats_dir = ensure_stats_dir()
-        all_stats = []
-        
-        # 读取所有统计文件
-        for file in sorted(os.listdir(stats_dir)):
-            if file.startswith('stats_') and file.endswith('.json'):
-                with open(os.path.join(stats_dir, file), 'r') as f:
-                    stats = json.load(f)
-                    all_stats.append(stats)
-        
-        if not all_stats:
+        start, end = request.args.get('start'), request.args.get('end')
+        fmt = request.args.get('format', 'csv')
+        compression = request.args.get('compression') or None
+        columns = select_columns(STATS_EXPORT_COLUMNS, request.args.get('columns'))
+        check_export_options(fmt, compression)
+        stats_log = get_stats_log()
+        if not stats_log.count(start, end):
             return jsonify({"error": "No statistics available for export"})
-        
-        # 创建CSV文件
-        csv_filename = f'stats_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        csv_path = os.path.join(stats_dir, csv_filename)
-        
-        # 写入CSV数据
-        with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:  # 使用UTF-8-SIG编码支持Excel
-            writer = csv.writer(f)
-            # 写入表头
-            writer.writerow([
-                'Timestamp', 'Elapsed Time', 'Completed Rounds', 'Total Rounds',
-                'Completion %', 'Total Players', 'Total Bets', 'Total Payouts',
-                'Jackpot Hits', 'RTP', 'Prize Count 1', 'Prize Count 2',
-                'Prize Count 3', 'Prize Count 4'
-            ])
-            
-            # 写入数据行
-            for stat in all_stats:
-                writer.writerow([
-                    stat['timestamp'],
-                    stat['elapsed_time'],
-                    stat['completed_rounds'],
-                    stat['total_rounds'],
-                    stat['completion_percentage'],
-                    stat['stats']['total_players'],
-                    stat['stats']['total_bets'],
-                    stat['stats']['total_payouts'],
-                    stat['stats']['jackpot_hits'],
-                    stat['stats']['rtp'],
-                    stat['stats']['prize_counts'].get('1', 0),
-                    stat['stats']['prize_counts'].get('2', 0),
-                    stat['stats']['prize_counts'].get('3', 0),
-                    stat['stats']['prize_counts'].get('4', 0)
-                ])
-        
-        # 返回文件下载
-        return send_file(
-            csv_path,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=csv_filename
-        )
-        
+
+        # 逐批读取范围内的统计，边编码边发送，不再先写出整个CSV文件
+        batches = record_batches(stats_log.iter_rows(start, end), columns, batch_rows=1000)
+        schema = arrow_schema(STATS_EXPORT_TYPES, columns) if fmt == 'parquet' else None
+        return export_response(batches, 'stats_export', fmt, compression,
+                               schema=schema, csv_bom=True)  # CSV带BOM，便于Excel打开
+
+    except (ValueError, ImportError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"导出统计数据失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -324,21 +268,10 @@ def download_stats(filename):
 def get_latest_stats():
     """获取最新的统计数据"""
     try:
-        stats_dir = ensure_stats_dir()
-        stats_files = []
-        for file in os.listdir(stats_dir):
-            if file.startswith('stats_') and file.endswith('.json'):
-                file_path = os.path.join(stats_dir, file)
-                stats_files.append((file, os.path.getmtime(file_path)))
-        
-        if not stats_files:
+        stats = get_stats_log().latest()
+        if stats is None:
             return jsonify({"error": "No statistics available"})
-        
-        # 获取最新的统计文件
-        latest_file = max(stats_files, key=lambda x: x[1])[0]
-        with open(os.path.join(stats_dir, latest_file), 'r') as f:
-            stats = json.load(f)
-        
+
         return jsonify(stats)
     except Exception as e:
         current_app.logger.error(f"获取最新统计数据失败: {str(e)}")
@@ -346,127 +279,79 @@ def get_latest_stats():
 
 @app.route('/all_stats')
 def get_all_stats():
-    """获取所有统计数据"""
+    """获取所有统计数据，可用start/end参数限定时间范围，limit限制条数，分辨率按时间范围选择"""
     try:
-        stats_dir = ensure_stats_dir()
-        all_stats = []
-        for file in sorted(os.listdir(stats_dir)):
-            if file.startswith('stats_') and file.endswith('.json'):
-                with open(os.path.join(stats_dir, file), 'r') as f:
-                    stats = json.load(f)
-                    all_stats.append(stats)
-        
-        return jsonify(all_stats)
+        start, end = request.args.get('start'), request.args.get('end')
+        limit = request.args.get('limit', type=int)
+        stats_log = get_stats_log()
+        resolution = stats_log.resolution_for(start, end)
+        response = jsonify(stats_log.query(start, end, limit, resolution))
+        response.headers['X-Stats-Resolution'] = str(STATS_TIERS[resolution][0])
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"获取所有统计数据失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def convert_to_serializable(obj):
-    """转换数据为可序列化的格式"""
-    if isinstance(obj, dict):
-        return {str(k): convert_to_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [convert_to_serializable(x) for x in obj]
-    elif isinstance(obj, (int, float, str, bool, type(None))):
-        return obj
-    elif isinstance(obj, (datetime, timedelta)):
-        return str(obj)
-    else:
-        return str(obj)
-
-def save_progress(progress):
-    """保存进度信息"""
+
+def update_progress(progress, batch_results, batch_size, start_time):
+    """
+    把一批次的结果累加到进度中，奖级注数由调用方累加
+    
+    Returns:
+        是否更新成功
+    """
     try:
-        # 确保数据可以序列化
-        serializable_progress = convert_to_serializable(progress)
-        
-        # 添加调试日志
-        current_app.logger.info(f"Saving progress: current_round={serializable_progress['current_round']}, "
-                              f"total_rounds={serializable_progress['total_rounds']}")
-        current_app.logger.info(f"Stats: {serializable_progress['stats']}")
+        batch_rounds = min(batch_size, progress['total_rounds'] - progress['current_round'])
+        # 逐轮累计的头奖次数，用于头奖趋势图
+        hits_per_round = {}
+        for record in batch_results['jackpot_records']:
+            hits_per_round[record['round']] = hits_per_round.get(record['round'], 0) + 1
+        cumulative = progress['jackpot_history'][-1]
+        for i in range(batch_rounds):
+            cumulative += hits_per_round.get(i, 0)
+            progress['jackpot_history'].append(cumulative)
+        progress['current_round'] += batch_rounds
         
-        # 添加时间戳
-        serializable_progress['last_update'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        stats = progress['stats']
+        stats['total_players'] += batch_results['total_players']
+        stats['total_bets'] += batch_results['total_bets']
+        stats['total_payouts'] += batch_results['total_payouts']
+        stats['jackpot_hits'] += batch_results['jackpot_hits']
+        stats['memory_usage'] = get_memory_usage()
+        stats['elapsed_time'] = str(datetime.now() - start_time).split('.')[0]
         
-        # 计算完成百分比
-        if serializable_progress['total_rounds'] > 0:
-            serializable_progress['completion_percentage'] = \
-                (serializable_progress['current_round'] / serializable_progress['total_rounds']) * 100
-        else:
-            serializable_progress['completion_percentage'] = 0
-            
-        with open('progress.json', 'w') as f:
-            json.dump(serializable_progress, f, indent=2)
-    except Exception as e:
-        current_app.logger.error(f"保存进度失败: {str(e)}")
-        current_app.logger.error(f"Progress data: {progress}")
-        raise
+        # 只保留最近MAX_DETAILED_DATA条详细数据
+        progress['detailed_data'].extend(batch_results['last_round_bets'])
+        del progress['detailed_data'][:-MAX_DETAILED_DATA]
+        return True
+    except (KeyError, TypeError) as e:
+        current_app.logger.error(f"更新进度失败: {str(e)}")
+        return False
 
 @app.route('/progress')
 def get_progress():
-    """获取进度信息"""
-    try:
-        if os.path.exists('progress.json'):
-            try:
-                with open('progress.json', 'r') as f:
-                    progress = json.load(f)
-                    current_app.logger.info(f"Loaded progress data: {progress}")
-            except json.JSONDecodeError as e:
-                current_app.logger.error(f"JSON解析错误: {str(e)}")
-                return jsonify({"error": "Invalid progress data format"}), 500
-            except Exception as e:
-                current_app.logger.error(f"读取进度文件失败: {str(e)}")
-                return jsonify({"error": "Failed to read progress file"}), 500
-            
-            # 确保所有必要的字段都存在
-            if not isinstance(progress, dict):
-                current_app.logger.error("Progress data is not a dictionary")
-                return jsonify({"error": "Invalid progress data format"}), 500
-            
-            # 添加默认值
-            progress.setdefault('current_round', 0)
-            progress.setdefault('total_rounds', 0)
-            progress.setdefault('completion_percentage', 0)
-            progress.setdefault('last_update', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            
-            stats = progress.setdefault('stats', {})
-            stats.setdefault('total_players', 0)
-            stats.setdefault('total_bets', 0.0)
-            stats.setdefault('total_payouts', 0.0)
-            stats.setdefault('jackpot_hits', 0)
-            stats.setdefault('prize_counts', {str(i): 0 for i in range(1, 5)})
-            stats.setdefault('rtp', 0.0)
-            stats.setdefault('elapsed_time', '0:00:00')
-            
-            # 重新计算完成百分比
-            if progress['total_rounds'] > 0:
-                progress['completion_percentage'] = \
-                    (progress['current_round'] / progress['total_rounds']) * 100
-            
-            current_app.logger.info(f"Returning progress data: {progress}")
-            return jsonify(progress)
-        
-        # 如果文件不存在，返回默认值
-        default_response = {
-            "current_round": 0,
-            "total_rounds": 0,
-            "completion_percentage": 0,
-            "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "stats": {
-                "total_players": 0,
-                "total_bets": 0.0,
-                "total_payouts": 0.0,
-                "jackpot_hits": 0,
-                "prize_counts": {'1': 0, '2': 0, '3': 0, '4': 0},  # 使用字符串键
-                "rtp": 0.0,
-                "elapsed_time": "0:00:00"
-            }
+    """获取进度信息，直接读取内存中的progress_store"""
+    state = progress_store.snapshot()
+    return jsonify({
+        "status": state['status'],
+        "current_round": state['current_round'],
+        "total_rounds": state['total_rounds'],
+        "completion_percentage": state['completion_percentage'],
+        "last_update": state['last_update'],
+        "stats": {
+            "total_players": state['total_players'],
+            "total_bets": state['total_bets'],
+            "total_payouts": state['total_payouts'],
+            "jackpot_hits": state['jackpot_hits'],
+            "prize_counts": state['prize_counts'],  # 使用字符串键
+            "rtp": state['rtp'],
+            "memory_usage": state['memory_usage'],
+            "elapsed_time": state['elapsed_time']
         }
-        current_app.logger.info("Progress file not found, returning default values")
-        return jsonify(default_response)
-    except Exception as e:
-        current_app.logger.error(f"获取进度失败: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    })
+
 def simulate_lottery(
     num_rounds: int,
     players_range: tuple[int, int],
@@ -474,7 +359,9 @@ def simulate_lottery(
     ticket_price: float = 20.0,
     initial_jackpot: float = 30_000_000.0,
     pool_insert = 0.43,
-    return_pool = 0.9
+    return_pool = 0.9,
+    seed: int | None = None,
+    timer: PhaseTimer | None = None
 ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Memory-efficient simulation of a lottery game with funding pool mechanism.
@@ -486,81 +373,80 @@ def simulate_lottery(
       Else: 15% of ticket_price -> jackpot pool
     - Jackpot rollover: if 1st prize hit, payout full jackpot pool, then inject initial_jackpot (funding_pool -= initial_jackpot)
 
+    - Contributions are settled per round in integer cents from the ticket count (see pool_accounting)
+    - seed: if given, each round draws from its own stream keyed by (seed, round_no),
+      so any single round can be re-simulated without replaying the ones before it
+    - timer: per-phase wall/CPU timer (a new one by default); its totals and the
+      get_memory_usage() readings are returned in summary_df.attrs["timings"]
+
     Returns summary, detail, and jackpot DataFrames.  Summary includes funding_pool_shortfall.
     """
+    streams = RNGStreams(seed) if seed is not None else None
+    timer = timer if timer is not None else PhaseTimer(memory_probe=get_memory_usage)
     summary_records = []
-    detail_buffer = deque(maxlen=10_000)
+    detail_buffer = DetailRecords(maxlen=10_000)  # compact structured rows, rendered at the end
     jackpot_list = []
 
-    # Pools
-    jackpot_pool = initial_jackpot
-    funding_pool = -initial_jackpot
+    # Pools, kept in integer cents
+    pools = PoolAccount(ticket_price, pool_insert, return_pool, initial_jackpot)
 
     # Prize map for non-jackpot tiers
     prize_map = {6: None, 5: 50_000, 4: 1_500, 3: 60, 2: 20}
 
     for round_no in range(1, num_rounds + 1):
         # Setup round
-        num_players = random.randint(*players_range)
+        rnd = streams.python_random(round_no) if streams else random
+        num_players = rnd.randint(*players_range)
         total_cards = 0
-        winning_nums = set(random.sample(range(1, 43), 6))
+        winning_nums = set(rnd.sample(range(1, 43), 6))
+        winning_mask = numbers_to_mask(winning_nums)
         winning_str = ",".join(map(str, sorted(winning_nums)))
+        detail_buffer.set_winning(round_no, winning_mask)
         tier_counts = {tier: 0 for tier in prize_map}
         tier_totals = {tier: 0.0 for tier in prize_map}
-        total_bet_amount = 0.0
         current_jackpots = []
 
-        # Betting and contributions
-        for player_id in range(1, num_players + 1):
-            num_cards = random.randint(*cards_per_player_range)
-            total_cards += num_cards
-            for card_idx in range(1, num_cards + 1):
-                total_bet_amount += ticket_price
-                # Contribution split
-                if funding_pool < 0:
-                   total_insert = ticket_price * pool_insert      # 43% 的投入
-                   max_repay    = -funding_pool                   # 最多还到 0 的债务量
-                   repay_amount = min(total_insert * return_pool, max_repay)
-                   # 剩余部分都进奖池
-                   jackpot_contrib = total_insert - repay_amount
-                
-                   funding_pool  += repay_amount
-                   jackpot_pool   += jackpot_contrib
-                else:
-                   # 债务清完后，43% 全部进奖池
-                   jackpot_pool += ticket_price * pool_insert
-
-                # Ticket evaluation
-                ticket_nums = set(random.sample(range(1, 43), 6))
-                ticket_str = ",".join(map(str, sorted(ticket_nums)))
-                matches = len(ticket_nums & winning_nums)
-                prize = 0.0
-                prize_tier = None
-                if 2 <= matches < 6:
-                    prize = prize_map[matches]
-                    prize_tier = matches
-                    tier_counts[matches] += 1
-                    tier_totals[matches] += prize
-
-                # Record detail
-                bet = {
-                    "round": round_no,
-                    "player_id": player_id,
-                    "card_id": f"P{player_id:04d}_C{card_idx:04d}",
-                    "ticket_numbers": ticket_str,
-                    "winning_numbers": winning_str,
-                    "bet_amount": ticket_price,
-                    "matches": matches,
-                    "prize_tier": prize_tier,
-                    "prize_amount": prize,
-                }
-                detail_buffer.append(bet)
-                if matches == 6:
-                    current_jackpots.append(bet)
+        # Betting (generation, matching and detail recording are interleaved per ticket)
+        with timer.phase("tickets"):
+            for player_id in range(1, num_players + 1):
+                num_cards = rnd.randint(*cards_per_player_range)
+                total_cards += num_cards
+                for card_idx in range(1, num_cards + 1):
+                    # Ticket evaluation
+                    ticket_mask = numbers_to_mask(rnd.sample(range(1, 43), 6))
+                    matches = match_count(ticket_mask, winning_mask)
+                    prize = 0.0
+                    prize_tier = -1
+                    if 2 <= matches < 6:
+                        prize = prize_map[matches]
+                        prize_tier = matches
+                        tier_counts[matches] += 1
+                        tier_totals[matches] += prize
+
+                    # Record detail; strings are rendered only when building the DataFrame
+                    detail_buffer.append(round_no, player_id, card_idx, ticket_mask, matches, prize_tier, prize)
+                    if matches == 6:
+                        current_jackpots.append({
+                            "round": round_no,
+                            "player_id": player_id,
+                            "card_id": f"P{player_id:04d}_C{card_idx:04d}",
+                            "ticket_numbers": ticket_mask,  # 导出时再转换为号码字符串
+                            "winning_numbers": winning_str,
+                            "bet_amount": ticket_price,
+                            "matches": matches,
+                            "prize_tier": None,
+                            "prize_amount": prize,
+                        })
+
+        # Contribution split depends only on the ticket count: repay the funding pool
+        # shortfall first, then everything goes to the jackpot pool
+        with timer.phase("pool_accounting"):
+            total_bet_amount = pools.bet_amount(total_cards)
+            pools.contribute(total_cards)
 
         # Snapshot pools before payout
-        jackpot_after = jackpot_pool
-        funding_shortfall = funding_pool
+        jackpot_after = pools.jackpot_pool
+        funding_shortfall = pools.funding_pool
 
         # Jackpot payout
         if current_jackpots:
@@ -569,11 +455,11 @@ def simulate_lottery(
                 bet["prize_amount"] = share
                 bet["prize_tier"] = 6
                 jackpot_list.append(bet)
+            detail_buffer.set_jackpot_prize(round_no, share)
             tier_counts[6] = len(current_jackpots)
             tier_totals[6] = jackpot_after
             # Reset jackpot pool and inject funding
-            jackpot_pool = initial_jackpot
-            funding_pool -= initial_jackpot
+            pools.reset_jackpot()
 
         # Record summary
         total_payout = sum(tier_totals.values())
@@ -600,10 +486,14 @@ def simulate_lottery(
             "RTP": rtp,
         })
 
-    # Build DataFrames
-    summary_df = pd.DataFrame(summary_records)
-    detail_df = pd.DataFrame(list(detail_buffer))
-    jackpot_df = pd.DataFrame(jackpot_list)
+    # Build DataFrames, rendering ticket masks back to number strings
+    with timer.phase("dataframe_build"):
+        summary_df = pd.DataFrame(summary_records)
+        detail_df = detail_buffer.to_dataframe(ticket_price)
+        jackpot_df = pd.DataFrame(jackpot_list)
+        if not jackpot_df.empty:
+            jackpot_df["ticket_numbers"] = masks_to_strings(jackpot_df["ticket_numbers"].to_numpy(dtype=np.uint64))
+    summary_df.attrs["timings"] = timer.to_dict()
     return summary_df, detail_df, jackpot_df
 
 @app.route('/simulate', methods=['POST'])
@@ -611,10 +501,9 @@ def start_simulation():
     return simulate()
 
 def cleanup_progress():
-    """清理进度文件"""
+    """清空进度，并删除进度文件（如果启用了持久化）"""
     try:
-        if os.path.exists('progress.json'):
-            os.remove('progress.json')
+        progress_store.reset()
     except Exception as e:
         current_app.logger.error(f"清理进度文件失败: {str(e)}")
 
@@ -654,7 +543,7 @@ def get_prize_level(matches):
 
 def count_matches(ticket_numbers, winning_numbers):
     """计算匹配数"""
-    return len(set(ticket_numbers) & set(winning_numbers))
+    return match_count(numbers_to_mask(ticket_numbers), numbers_to_mask(winning_numbers))
 
 def generate_ticket_numbers():
     """生成一注彩票号码"""
@@ -724,7 +613,7 @@ def run_simulation_batch(batch_rounds):
         current_app.logger.error(f"批次模拟失败: {str(e)}")
         raise
     
-def simulate_batch(batch_size, total_rounds, current_round):
+def simulate_batch(batch_size, total_rounds, current_round, seed=None, players_range=(100000, 150000)):
     """
     模拟一批次的彩票游戏
     
@@ -732,6 +621,9 @@ def simulate_batch(batch_size, total_rounds, current_round):
         batch_size: 本批次要模拟的轮数
         total_rounds: 总轮数
         current_round: 当前轮数
+        seed: 随机种子，指定时每轮的随机数流只由(种子, 轮次)决定，
+            分批方式和断点续跑都不影响结果
+        players_range: 工作日每轮的基础玩家数范围，周末再乘以1.3-1.5
     
     Returns:
         batch_results: 包含本批次模拟结果的字典
@@ -743,19 +635,25 @@ def simulate_batch(batch_size, total_rounds, current_round):
         'total_bets': 0.0,
         'total_payouts': 0.0,
         'prize_counts': {'1': 0, '2': 0, '3': 0, '4': 0},
-        'rounds_data': []
+        'rounds_data': [],
+        'kernel_backend': KERNEL_BACKEND
     }
+    timer = PhaseTimer(memory_probe=get_memory_usage)
+    # 纯Python后端每轮复用的投注热度直方图，内存占用固定，与玩家数量无关
+    histogram = TicketHistogram() if KERNEL_BACKEND == "python" else None
+    streams = RNGStreams(seed) if seed is not None else None
 
     try:
         for i in range(batch_size):
+            rnd = streams.python_random(current_round + i + 1) if streams else random
             # 生成本轮中奖号码
-            winning_numbers = generate_random_numbers(6, 42)
+            winning_numbers = generate_random_numbers(6, 42, rnd)
             print(f"第 {current_round + i + 1} 轮中奖号码: {winning_numbers}")
             
             # 生成随机玩家数量
             is_weekend = (current_round + i) % 7 >= 5
-            base_players = random.randint(100000, 150000)
-            weekend_multiplier = random.uniform(1.3, 1.5) if is_weekend else 1.0
+            base_players = rnd.randint(*players_range)
+            weekend_multiplier = rnd.uniform(1.3, 1.5) if is_weekend else 1.0
             num_players = int(base_players * weekend_multiplier)
             batch_results['total_players'] += num_players
             
@@ -764,37 +662,39 @@ def simulate_batch(batch_size, total_rounds, current_round):
             round_payouts = 0.0
             round_prizes = {'1': 0, '2': 0, '3': 0, '4': 0}
             
-            # 模拟每个玩家的投注
-            for _ in range(num_players):
-                # 玩家投注策略
-                if random.random() < 0.8:
-                    num_tickets = random.randint(1, 2)
-                else:
-                    num_tickets = random.randint(3, 10)
-                
-                total_bet = num_tickets * BET_AMOUNT
-                round_bets += total_bet
+            # 模拟每个玩家的投注，号码只计入热度直方图
+            if KERNEL_BACKEND != "python":
+                # JIT内核直接逐注兑奖，只返回总注数和各匹配数的注数
+                with timer.phase('tickets'):
+                    total_tickets, match_counts = play_batch_round(num_players, numbers_to_mask(winning_numbers), rnd)
+                round_bets += total_tickets * BET_AMOUNT
+            else:
+                with timer.phase('tickets'):
+                    histogram.clear()
+                    for _ in range(num_players):
+                        # 玩家投注策略
+                        if rnd.random() < 0.8:
+                            num_tickets = rnd.randint(1, 2)
+                        else:
+                            num_tickets = rnd.randint(3, 10)
+                        
+                        total_bet = num_tickets * BET_AMOUNT
+                        round_bets += total_bet
+                        
+                        for _ in range(num_tickets):
+                            # 生成玩家选号
+                            player_numbers = generate_biased_numbers(rnd) if rnd.random() < 0.3 else generate_random_numbers(6, 42, rnd)
+                            histogram.add_numbers(player_numbers)
                 
-                for _ in range(num_tickets):
-                    # 生成玩家选号
-                    player_numbers = generate_biased_numbers() if random.random() < 0.3 else generate_random_numbers(6, 42)
-                    
-                    # 判断中奖情况
-                    matches = len(set(player_numbers) & set(winning_numbers))
-                    
-                    # 确定中奖等级和奖金
-                    if matches == 6:
-                        round_prizes['1'] += 1
-                        round_payouts += PRIZE_TABLE[1]
-                    elif matches == 5:
-                        round_prizes['2'] += 1
-                        round_payouts += PRIZE_TABLE[2]
-                    elif matches == 4:
-                        round_prizes['3'] += 1
-                        round_payouts += PRIZE_TABLE[3]
-                    elif matches == 3:
-                        round_prizes['4'] += 1
-                        round_payouts += PRIZE_TABLE[4]
+                # 按直方图统计各匹配数的注数
+                with timer.phase('matching'):
+                    match_counts = histogram.match_counts(winning_numbers)
+            
+            # 确定中奖等级和奖金
+            for level, matches in (('1', 6), ('2', 5), ('3', 4), ('4', 3)):
+                winners = int(match_counts[matches])
+                round_prizes[level] += winners
+                round_payouts += winners * PRIZE_TABLE[int(level)]
             
             # 更新批次总计
             batch_results['total_bets'] += round_bets
@@ -822,6 +722,9 @@ def simulate_batch(batch_size, total_rounds, current_round):
                 print(f"轮次数据验证失败: {str(e)}")
                 raise
         
+        timer.sample_memory()
+        batch_results['timings'] = timer.to_dict()
+        
         # 验证批次结果
         try:
             validate_batch_results(batch_results)
@@ -843,41 +746,46 @@ def ensure_stats_dir():
         os.makedirs(stats_dir)
     return stats_dir
 
+# 阶段性统计追加到stats目录下的SQLite库，按时间戳建索引
+STATS_DB_NAME = 'stats.sqlite3'
+_stats_log = None
+
+def get_stats_log():
+    """阶段性统计的存储，第一次使用时创建，并导入旧版本写出的stats_*.json文件"""
+    global _stats_log
+    if _stats_log is None:
+        _stats_log = StatsLog(os.path.join(ensure_stats_dir(), STATS_DB_NAME))
+        if _stats_log.created:
+            imported = _stats_log.import_json_dir(ensure_stats_dir())
+            if imported:
+                print(f"已导入{imported}个旧统计文件")
+    return _stats_log
+
 def cleanup_old_stats():
-    """清理旧的统计文件"""
-    stats_dir = ensure_stats_dir()
-    current_time = datetime.now()
-    for file in os.listdir(stats_dir):
-        if file.startswith('stats_') and file.endswith('.json'):
-            file_path = os.path.join(stats_dir, file)
-            file_time = datetime.strptime(file[6:-5], "%Y%m%d_%H%M%S")
-            # 删除超过24小时的统计文件
-            if (current_time - file_time).total_seconds() > 86400:
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    current_app.logger.error(f"删除旧统计文件失败: {str(e)}")
-
-def save_interval_stats(stats, interval_time):
-    """保存阶段性统计结果"""
+    """把超过各层保留时间的统计数据合并到更粗的层级（10秒保留1小时，1分钟保留1天，1小时永久保留）"""
     try:
-        stats_dir = ensure_stats_dir()
-        filename = f'stats_{interval_time.strftime("%Y%m%d_%H%M%S")}.json'
-        file_path = os.path.join(stats_dir, filename)
-        with open(file_path, 'w') as f:
-            json.dump(convert_to_serializable(stats), f)
-        cleanup_old_stats()  # 清理旧文件
+        get_stats_log().compact()
+    except Exception as e:
+        current_app.logger.error(f"合并旧统计数据失败: {str(e)}")
+
+def save_interval_stats(stats, interval_time, run_id=None):
+    """保存阶段性统计结果，run_id区分不同的模拟批次"""
+    try:
+        get_stats_log().append(stats, run_id)
+        cleanup_old_stats()  # 合并旧数据
     except Exception as e:
         current_app.logger.error(f"保存阶段性统计失败: {str(e)}")
 
 def simulate():
+    ACTIVE_JOBS.inc()
     try:
         cleanup_progress()
         cleanup_old_stats()
         initial_memory = get_memory_usage()
         start_time = datetime.now()
         last_interval_save = start_time
-        last_progress_save = start_time
+        # 阶段性统计按模拟批次分组汇总
+        run_id = start_time.strftime("%Y%m%d_%H%M%S_%f")
         
         data = request.get_json()
         total_rounds = int(data.get('rounds', 1000))
@@ -902,17 +810,20 @@ def simulate():
                 'last_update': start_time.strftime("%Y-%m-%d %H:%M:%S")
             }
         }
-        save_progress(progress)
+        publish_progress(progress, force=True)
         
         # 创建线程池
         with ThreadPoolExecutor(max_workers=1) as executor:
             for start in range(0, total_rounds, batch_size):
                 end = min(start + batch_size, total_rounds)
                 batch_rounds = end - start
+                # 包括当前批次在内尚未完成的批次数
+                QUEUE_DEPTH.set(-(-(total_rounds - start) // batch_size))
                 
                 # 在新线程中执行批次模拟
                 future = executor.submit(run_simulation_batch, batch_rounds)
                 batch_results = future.result()
+                record_rounds(batch_rounds, int(round(batch_results['total_bets'] / BET_AMOUNT)))
                 
                 # 验证和更新进度
                 if not update_progress(progress, batch_results, batch_size, start_time):
@@ -979,11 +890,9 @@ def simulate():
                         progress['stats']['total_payouts'] / progress['stats']['total_bets'] * 100
                     )
                 
-                # 每秒保存一次进度
+                # 更新进度，推送和写文件的频率由progress_store限制
+                publish_progress(progress)
                 current_time = datetime.now()
-                if (current_time - last_progress_save).total_seconds() >= 1:
-                    save_progress(progress)
-                    last_progress_save = current_time
                 
                 # 每10秒保存一次统计数据
                 if (current_time - last_interval_save).total_seconds() >= 10:
@@ -1005,7 +914,7 @@ def simulate():
                             'elapsed_time': progress['stats']['elapsed_time']
                         }
                     }
-                    save_interval_stats(interval_stats, current_time)
+                    save_interval_stats(interval_stats, current_time, run_id)
                     last_interval_save = current_time
                 
                 # 执行内存清理
@@ -1025,10 +934,16 @@ def simulate():
             'completion_percentage': 100,
             'stats': progress['stats']
         }
-        save_interval_stats(final_stats, final_time)
+        save_interval_stats(final_stats, final_time, run_id)
+        publish_progress(progress, status='completed', force=True)
         
         # 计算总投注数
         total_bets = progress['stats']['total_bets'] / BET_AMOUNT  # 转换为注数
+        # 各奖级返奖率（%）
+        prize_rtps = [
+            progress['stats']['prize_counts'][str(level)] * PRIZE_TABLE[level] / progress['stats']['total_bets'] * 100
+            for level in range(1, 5)
+        ]
 
         # 构建图表数据
         charts_data = {
@@ -1053,20 +968,10 @@ def simulate():
             "rtp_dist": {
                 "data": [{
                     "x": ["一等奖", "二等奖", "三等奖", "四等奖"],
-                    "y": [
-                        progress['stats']['prize_counts']['1'] * PRIZE_TABLE[1] / progress['stats']['total_bets'] * 100,
-                        progress['stats']['prize_counts']['2'] * PRIZE_TABLE[2] / progress['stats']['total_bets'] * 100,
-                        progress['stats']['prize_counts']['3'] * PRIZE_TABLE[3] / progress['stats']['total_bets'] * 100,
-                        progress['stats']['prize_counts']['4'] * PRIZE_TABLE[4] / progress['stats']['total_bets'] * 100
-                    ],
+                    "y": prize_rtps,
                     "type": "bar",
                     "name": "返奖率",
-                    "text": [
-                        f"{progress['stats']['prize_counts']['1'] * PRIZE_TABLE[1] / progress['stats']['total_bets'] * 100:.1f}%",
-                        f"{progress['stats']['prize_counts']['2'] * PRIZE_TABLE[2] / progress['stats']['total_bets'] * 100:.1f}%",
-                        f"{progress['stats']['prize_counts']['3'] * PRIZE_TABLE[3] / progress['stats']['total_bets'] * 100:.1f}%",
-                        f"{progress['stats']['prize_counts']['4'] * PRIZE_TABLE[4] / progress['stats']['total_bets'] * 100:.1f}%"
-                    ],
+                    "text": [f"{rtp:.1f}%" for rtp in prize_rtps],
                     "textposition": 'auto'
                 }],
                 "layout": {
@@ -1078,12 +983,7 @@ def simulate():
                     "yaxis": {
                         "title": "返奖率",
                         "tickformat": ".1%",
-                        "range": [0, Math.max(...[
-                            progress['stats']['prize_counts']['1'] * PRIZE_TABLE[1] / progress['stats']['total_bets'] * 100,
-                            progress['stats']['prize_counts']['2'] * PRIZE_TABLE[2] / progress['stats']['total_bets'] * 100,
-                            progress['stats']['prize_counts']['3'] * PRIZE_TABLE[3] / progress['stats']['total_bets'] * 100,
-                            progress['stats']['prize_counts']['4'] * PRIZE_TABLE[4] / progress['stats']['total_bets'] * 100
-                        ]) * 1.1]
+                        "range": [0, max(prize_rtps) * 1.1]
                     },
                     "margin": {
                         "l": 80,
@@ -1091,15 +991,15 @@ def simulate():
                         "t": 50,
                         "b": 50
                     },
-                    "autosize": true,
-                    "showlegend": false,
+                    "autosize": True,
+                    "showlegend": False,
                     "bargap": 0.3
                 }
             },
             "jackpot_trend": {
                 "data": [{
-                    "x": list(range(total_rounds + 1)),  # 包含初始0点
-                    "y": progress['jackpot_history'],    # 使用累计历史数据
+                    "x": typed_array(np.arange(total_rounds + 1)),  # 包含初始0点
+                    "y": typed_array(progress['jackpot_history']),  # 使用累计历史数据，编码为类型数组
                     "type": "line",
                     "name": "头奖中出累计次数"
                 }],
@@ -1137,8 +1037,8 @@ def simulate():
                         "t": 50,
                         "b": 50
                     },
-                    "autosize": true,
-                    "showlegend": false,
+                    "autosize": True,
+                    "showlegend": False,
                     "bargap": 0.3
                 }
             }
@@ -1177,7 +1077,11 @@ def simulate():
         
     except Exception as e:
         current_app.logger.error(f"模拟过程出错: {str(e)}")
+        progress_store.update(force=True, status='error', message=str(e))
         return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        ACTIVE_JOBS.dec()
+        QUEUE_DEPTH.set(0)
 
 
 # 備註：
@@ -1,107 +1,212 @@
 from flask import Flask, render_template, request, jsonify
-import numpy as np
-from lottery_simulator import LotterySimulator
-from report_generator import generate_report
+from metrics import init_app as init_metrics
+from simulation_jobs import JobRegistry, JobQueueFull, FAILED, FINISHED, RUNNING
+from progress_stream import ProgressBroadcaster, sse_response
+from report_generator import zoom_chart
+from serialization import arrow_response, init_app as init_json
 import pandas as pd
-import json
-# 存储当前运行的模拟器实例
-current_simulator = None
-
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super().default(obj)
+# 全部模拟任务的登记表，任务进度同时发布到progress_broadcaster
+progress_broadcaster = ProgressBroadcaster()
+job_registry = JobRegistry(broadcaster=progress_broadcaster)
 
 app = Flask(__name__)
-app.config['JSON_ENCODER'] = CustomJSONEncoder
+init_json(app)
+init_metrics(app)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def parse_simulation_params(data):
+    """从请求数据读取模拟参数，取值不合法时抛出ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('请求体应为JSON对象')
+    rounds = int(data.get('total_rounds', 1000))
+    players = (int(data.get('min_players', 1000)), int(data.get('max_players', 5000)))
+    cards = (int(data.get('cards_min', 1)), int(data.get('cards_max', 5)))
+    ticket_price = float(data.get('ticket_price', 2.0))
+    if rounds <= 0:
+        raise ValueError(f'模拟轮数必须为正整数，实际为{rounds}')
+    if players[0] <= 0 or players[0] > players[1]:
+        raise ValueError(f'玩家数范围不合法: {players[0]}-{players[1]}，应满足0 < 最小值 <= 最大值')
+    if cards[0] <= 0 or cards[0] > cards[1]:
+        raise ValueError(f'每人注数范围不合法: {cards[0]}-{cards[1]}，应满足0 < 最小值 <= 最大值')
+    if not ticket_price > 0:
+        raise ValueError(f'每注价格必须为正数，实际为{ticket_price}')
+    return {
+        'num_rounds': rounds,
+        'players_range': players,
+        'cards_range': cards,
+        'ticket_price': ticket_price
+    }
+
 @app.route('/simulate', methods=['POST'])
 def simulate():
+    """提交模拟任务，立即返回任务ID，模拟在后台执行；参数不合法时返回400"""
     try:
-        # 获取JSON数据
-        data = request.json
-        
-        # 设置默认值和参数映射
-        rounds = int(data.get('total_rounds', 1000))
-        players = {
-            'min': int(data.get('min_players', 1000)),
-            'max': int(data.get('max_players', 5000))
-        }
-        cards = {
-            'min': int(data.get('cards_min', 1)),
-            'max': int(data.get('cards_max', 5))
-        }
-        ticket_price = float(data.get('ticket_price', 2.0))
-
-        # 创建模拟器实例
-        simulator = LotterySimulator(
-            num_rounds=rounds,
-            players_range=(players['min'], players['max']),
-            cards_range=(cards['min'], cards['max']),
-            ticket_price=ticket_price
-        )
-        global current_simulator
-        current_simulator = simulator
-
-        # 运行模拟
-        summary_df, detail_df, jackpot_df = simulator.run_simulation()
-
-        # 生成报告数据
-        report_data = generate_report(summary_df, detail_df, jackpot_df)
+        try:
+            params = parse_simulation_params(request.get_json(silent=True))
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'参数错误: {e}'
+            }), 400
+
+        job = job_registry.submit(params)
 
         return jsonify({
-            'status': 'success',
-            'summary_stats': report_data['summary_stats'],
-            'charts': report_data['charts'],
-            'tables': report_data['tables']
-        })
+            'status': 'accepted',
+            'job_id': job.id,
+            'status_url': f'/jobs/{job.id}',
+            'progress_url': f'/jobs/{job.id}/progress',
+            'events_url': f'/jobs/{job.id}/events',
+            'result_url': f'/jobs/{job.id}/result'
+        }), 202
 
+    except JobQueueFull as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 429
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
 
+def job_not_found(job_id):
+    return jsonify({
+        'status': 'error',
+        'message': f'任务不存在: {job_id}'
+    }), 404
+
+@app.route('/jobs')
+def list_jobs():
+    """列出全部任务，可用?status=running等按状态筛选"""
+    jobs = job_registry.list(request.args.get('status'))
+    return jsonify({
+        'jobs': [job.to_dict() for job in jobs],
+        'max_workers': job_registry.max_workers
+    })
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_registry.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/progress')
+def get_job_progress(job_id):
+    job = job_registry.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify(job.progress())
+
+@app.route('/jobs/<job_id>/events')
+def stream_job_progress(job_id):
+    """以Server-Sent Events推送任务进度：先推送完整快照，之后只推送变化的字段"""
+    job = job_registry.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return sse_response(progress_broadcaster, job_id)
+
+@app.route('/jobs/<job_id>/result')
+def get_job_result(job_id):
+    job = job_registry.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job.status == FAILED:
+        return jsonify({
+            'status': 'error',
+            'message': job.error
+        }), 500
+    if job.status != FINISHED:
+        # 任务尚未完成
+        return jsonify({
+            'status': job.status,
+            'job_id': job.id
+        }), 202
+
+    report_data = job.report
+    return jsonify({
+        'status': 'success',
+        'job_id': job.id,
+        'summary_stats': report_data['summary_stats'],
+        'charts': report_data['charts'],
+        'tables': report_data['tables'],
+        'timings': report_data['timings'],
+        'chart_resolution': report_data['chart_resolution'],
+        'series_url': f'/jobs/{job.id}/series.arrow'
+    })
+
+@app.route('/jobs/<job_id>/charts/<chart>')
+def zoom_job_chart(job_id, chart):
+    """
+    趋势图在轮次范围内的全分辨率数据，用于放大查看
+    
+    参数: start_round/end_round为轮次范围（含两端），points为每条曲线的点数上限（默认不限）
+    """
+    job = job_registry.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job.status != FINISHED:
+        return jsonify({
+            'status': job.status,
+            'job_id': job.id
+        }), 202
+    try:
+        data = zoom_chart(job.chart_data, chart,
+                          start_round=request.args.get('start_round', type=int),
+                          end_round=request.args.get('end_round', type=int),
+                          points=request.args.get('points', type=int))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(data)
+
+@app.route('/jobs/<job_id>/series.arrow')
+def get_job_series(job_id):
+    """趋势图各列的全分辨率数据（Arrow IPC流），可用start_round/end_round限定轮次范围"""
+    job = job_registry.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job.status != FINISHED:
+        return jsonify({
+            'status': job.status,
+            'job_id': job.id
+        }), 202
+    df = job.chart_data
+    start_round = request.args.get('start_round', type=int)
+    end_round = request.args.get('end_round', type=int)
+    if start_round is not None:
+        df = df[df['round'] >= start_round]
+    if end_round is not None:
+        df = df[df['round'] <= end_round]
+    try:
+        return arrow_response(df, filename=f'{job.id}_series.arrow')
+    except ImportError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 501
+
 @app.route('/progress')
 def get_progress():
-    if current_simulator is None:
+    """指定job_id时返回该任务的进度，否则返回全部运行中任务的进度"""
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = job_registry.get(job_id)
+        if job is None:
+            return job_not_found(job_id)
+        return jsonify(job.progress())
+
+    running = job_registry.list(RUNNING)
+    if not running:
         return jsonify({
             'status': 'not_running',
             'message': '没有正在运行的模拟'
         })
-
-    progress = current_simulator.get_progress()
-    if progress is None:
-        return jsonify({
-            'status': 'running',
-            'message': '模拟正在运行，但尚未有进度数据'
-        })
-
-    # 确保所有数值都转换为Python原生类型
-    stats = {
+    return jsonify({
         'status': 'running',
-        'data': {
-            'progress': float(progress.get('progress', 0)),
-            'current_round': int(progress.get('current_round', 0)),
-            'total_rounds': int(progress.get('total_rounds', 0)),
-            'player_count': int(progress.get('player_count', 0)),
-            'total_bets': float(progress.get('total_bets', 0)),
-            'total_tickets': int(progress.get('total_tickets', 0)),
-            'jackpot_amount': float(progress.get('jackpot_amount', 0)),
-            'total_payouts': float(progress.get('total_payouts', 0)),
-            'payout_ratio': float(progress.get('payout_ratio', 0))
-        }
-    }
-    return jsonify(stats)
+        'jobs': [job.progress() for job in running]
+    })
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
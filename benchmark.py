@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+各模拟引擎在四档规模下的性能基准
+
+规模档位与lotto_scripts_analysis.md一致：19-21万、49-51万、99-101万、199-201万玩家，
+每位玩家购买9-11注。每个(引擎, 档位)在独立的子进程中以固定种子运行固定轮数，
+记录每秒注数、每轮耗时、峰值RSS以及构建DataFrame的耗时，结果保存为JSON，
+可与之前保存的基准结果对比。
+
+用法：
+    python benchmark.py --rounds 3 --output bench.json
+    python benchmark.py --engines simulation.numpy lottery_simulator_new.sharded --tiers 19-21万
+    python benchmark.py --baseline bench.json --output bench_new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，改用psutil
+    resource = None
+
+TIERS = {
+    "19-21万": (190000, 210000),
+    "49-51万": (490000, 510000),
+    "99-101万": (990000, 1010000),
+    "199-201万": (1990000, 2010000),
+}
+
+ENGINES = (
+    "simulation.python",
+    "simulation.numpy",
+    "lottery_simulator",
+    "lottery_simulator.counts_only",
+    "lottery_simulator_new.python",
+    "lottery_simulator_new.sharded",
+    "lottery_simulator_new.counts_only",
+    "cf.simulate_lottery",
+    "cf.simulate_batch",
+)
+
+CARDS_RANGE = (9, 11)
+DEFAULT_SEED = 20240101
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB）"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS以字节为单位，Linux以KB为单位
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    import psutil
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / 1024 / 1024
+
+
+@contextmanager
+def dataframe_build_timer(timings: Dict[str, float]):
+    """累计期间所有pandas.DataFrame构造调用的耗时"""
+    original_init = pd.DataFrame.__init__
+    depth = [0]
+
+    def timed_init(self, *args, **kwargs):
+        depth[0] += 1
+        start = time.perf_counter()
+        try:
+            original_init(self, *args, **kwargs)
+        finally:
+            depth[0] -= 1
+            # 嵌套构造只计最外层
+            if depth[0] == 0:
+                timings["dataframe_build_time"] += time.perf_counter() - start
+
+    pd.DataFrame.__init__ = timed_init
+    try:
+        yield timings
+    finally:
+        pd.DataFrame.__init__ = original_init
+
+
+def run_engine(engine: str, players_range: tuple, rounds: int, seed: int) -> int:
+    """运行一次模拟，返回总注数"""
+    if engine.startswith("simulation."):
+        from simulation import simulate_lottery
+        summary_df, _, _ = simulate_lottery(num_rounds=rounds, players_range=players_range,
+                                            cards_per_player_range=CARDS_RANGE,
+                                            engine=engine.split(".")[1], seed=seed)
+        return int(summary_df["total_cards"].sum())
+    if engine.startswith("lottery_simulator_new."):
+        from lottery_simulator_new import LotterySimulator
+        mode = engine.split(".")[1]
+        simulator = LotterySimulator(num_rounds=rounds, players_range=players_range,
+                                     cards_per_player_range=CARDS_RANGE, seed=seed,
+                                     counts_only=mode == "counts_only",
+                                     engine="sharded" if mode == "sharded" else "python")
+        summary_df, _, _ = simulator.run_simulation()
+        return int(summary_df["total_cards"].sum())
+    if engine.startswith("lottery_simulator"):
+        from lottery_simulator import LotterySimulator
+        simulator = LotterySimulator(rounds, players_range, CARDS_RANGE, 20.0,
+                                     counts_only=engine.endswith(".counts_only"), seed=seed)
+        summary_df, _, _ = simulator.run_simulation()
+        return int(summary_df["total_cards"].sum())
+    if engine == "cf.simulate_lottery":
+        from CF_lotto_c42_6_simulation_v1 import simulate_lottery
+        summary_df, _, _ = simulate_lottery(rounds, players_range, CARDS_RANGE, seed=seed)
+        return int(summary_df["total_cards"].sum())
+    if engine == "cf.simulate_batch":
+        from CF_lotto_c42_6_simulation_v1 import app, simulate_batch, BET_AMOUNT
+        with app.app_context():
+            batch_results = simulate_batch(rounds, rounds, 0, seed=seed, players_range=players_range)
+        return int(round(batch_results["total_bets"] / BET_AMOUNT))
+    raise ValueError(f"未知的模拟引擎: {engine}")
+
+
+def measure(engine: str, tier: str, rounds: int, seed: int) -> Dict[str, Any]:
+    """在当前进程中测量一个(引擎, 档位)"""
+    players_range = TIERS[tier]
+    timings = {"dataframe_build_time": 0.0}
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    with dataframe_build_timer(timings):
+        tickets = run_engine(engine, players_range, rounds, seed)
+    wall_time = time.perf_counter() - start
+    return {
+        "engine": engine,
+        "tier": tier,
+        "players_range": list(players_range),
+        "rounds": rounds,
+        "status": "ok",
+        "tickets": tickets,
+        "wall_time": wall_time,
+        "cpu_time": time.process_time() - cpu_start,
+        "wall_time_per_round": wall_time / rounds,
+        "tickets_per_sec": tickets / wall_time if wall_time > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "dataframe_build_time": timings["dataframe_build_time"],
+    }
+
+
+def measure_in_subprocess(engine: str, tier: str, rounds: int, seed: int,
+                          timeout: Optional[float] = None) -> Dict[str, Any]:
+    """在独立子进程中测量，使峰值RSS只反映该引擎本身"""
+    command = [sys.executable, os.path.abspath(__file__), "--run-one", engine, tier,
+               "--rounds", str(rounds), "--seed", str(seed)]
+    failed = {"engine": engine, "tier": tier, "players_range": list(TIERS[tier]), "rounds": rounds}
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except subprocess.TimeoutExpired:
+        return {**failed, "status": "timeout"}
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    error = completed.stderr.strip().splitlines()
+    return {**failed, "status": "error", "error": error[-1] if error else f"exit code {completed.returncode}"}
+
+
+def environment_info() -> Dict[str, Any]:
+    """记录基准运行环境，便于对比时判断结果是否可比"""
+    from kernels import KERNEL_BACKEND
+    import numpy as np
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "kernel_backend": KERNEL_BACKEND,
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    与基准结果对比每秒注数
+
+    Returns:
+        每个(引擎, 档位)的对比结果，ratio为当前/基准，低于1 - threshold时标记为regression
+    """
+    previous = {(r["engine"], r["tier"]): r for r in baseline.get("results", []) if r.get("status") == "ok"}
+    rows = []
+    for result in results:
+        base = previous.get((result["engine"], result["tier"]))
+        if result.get("status") != "ok" or base is None or not base.get("tickets_per_sec"):
+            continue
+        ratio = result["tickets_per_sec"] / base["tickets_per_sec"]
+        rows.append({
+            "engine": result["engine"],
+            "tier": result["tier"],
+            "tickets_per_sec": result["tickets_per_sec"],
+            "baseline_tickets_per_sec": base["tickets_per_sec"],
+            "ratio": ratio,
+            "peak_rss_mb": result["peak_rss_mb"],
+            "baseline_peak_rss_mb": base["peak_rss_mb"],
+            "regression": ratio < 1 - threshold,
+        })
+    return rows
+
+
+def run_benchmarks(engines=ENGINES, tiers=tuple(TIERS), rounds: int = 3, seed: int = DEFAULT_SEED,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+    """依次测量全部(引擎, 档位)组合"""
+    report = {**environment_info(), "rounds": rounds, "seed": seed, "results": []}
+    for engine in engines:
+        for tier in tiers:
+            result = measure_in_subprocess(engine, tier, rounds, seed, timeout)
+            report["results"].append(result)
+            if result["status"] == "ok":
+                print(f"{engine:36s} {tier:10s} {result['tickets_per_sec']:>14,.0f} 注/秒 "
+                      f"{result['wall_time_per_round']:8.2f} 秒/轮 {result['peak_rss_mb']:8.1f} MB "
+                      f"DataFrame {result['dataframe_build_time']:.2f} 秒")
+            else:
+                print(f"{engine:36s} {tier:10s} {result['status']} {result.get('error', '')}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模拟引擎性能基准")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--tiers", nargs="+", choices=list(TIERS), default=list(TIERS))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--timeout", type=float, default=None, help="单个组合的超时时间（秒）")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="之前保存的基准结果JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="每秒注数下降超过该比例视为退化")
+    parser.add_argument("--run-one", nargs=2, metavar=("ENGINE", "TIER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        result = measure(args.run_one[0], args.run_one[1], args.rounds, args.seed)
+        print(RESULT_MARKER + json.dumps(result))
+        sys.exit(0)
+
+    report = run_benchmarks(args.engines, args.tiers, args.rounds, args.seed, args.timeout)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(report["results"], json.load(f), args.threshold)
+        for row in report["comparison"]:
+            flag = "  <-- 退化" if row["regression"] else ""
+            print(f"{row['engine']:36s} {row['tier']:10s} {row['ratio']:6.2f}x{flag}")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+图表序列降采样
+
+10万轮的模拟每条曲线有10万个点，序列化慢，Plotly在浏览器中绘制也会卡顿。
+图表数据按每条曲线的目标点数降采样：一般曲线用LTTB（Largest-Triangle-Three-Buckets）
+保留形状；奖池、资金池缺口这类会突然归零或骤变的曲线用最小/最大包络，
+每个分段保留最小值和最大值两个点，尖峰和归零不会被平滑掉。
+需要细节时按轮次范围重新取全分辨率的数据。
+
+每条曲线的目标点数默认2000，可通过环境变量LOTTO_CHART_POINTS设置。
+"""
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 每条曲线的目标点数
+CHART_POINTS = int(os.environ.get("LOTTO_CHART_POINTS", "2000"))
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    LTTB降采样保留的点的下标
+
+    首末两点固定保留，其余点均分为threshold-2段，每段保留与前一个保留点、
+    下一段平均点所成三角形面积最大的点。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 各段的边界，段i为[bounds[i], bounds[i+1])
+    bounds = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_end = bounds[i + 2] if i + 2 < len(bounds) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """最小/最大包络保留的点的下标：每段的最小值和最大值，以及首末两点"""
+    n = len(y)
+    if buckets * 2 + 2 >= n or buckets < 1:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    bounds = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = [0, n - 1]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        segment = y[start:end]
+        keep.append(start + int(np.argmin(segment)))
+        keep.append(start + int(np.argmax(segment)))
+    return np.unique(keep)
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, points: Optional[int] = CHART_POINTS,
+                       method: str = "lttb") -> np.ndarray:
+    """
+    降采样保留的点的下标，x需按升序排列
+
+    Args:
+        points: 目标点数，None或不少于序列长度时保留全部点
+        method: "lttb"或"minmax"（最小/最大包络）
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"未知的降采样方法: {method}")
+    n = len(y)
+    if points is None or n <= points:
+        return np.arange(n)
+    if method == "minmax":
+        # 每段保留两个点
+        return minmax_indices(y, max((points - 2) // 2, 1))
+    return lttb_indices(x, y, points)
+
+
+def downsample_series(x: Sequence, y: Sequence, points: Optional[int] = CHART_POINTS,
+                      method: str = "lttb") -> Tuple[List, List]:
+    """降采样后的(x, y)列表，可直接作为Plotly曲线的x和y"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    indices = downsample_indices(x, y, points, method)
+    return x[indices].tolist(), y[indices].tolist()
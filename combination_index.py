@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+6选42号码组合的序号索引与投注热度直方图
+
+任意一注号码按组合数系统（colex序）映射为 [0, C(42,6)) 内的唯一序号：
+升序号码 c1 < c2 < ... < c6 的序号为 Σ C(ci - 1, i)。
+
+一轮的全部投注可以压缩为长度固定为C(42,6)的注数直方图，开奖时只需枚举
+与中奖号码恰好匹配k个的组合并查表求和，耗时和内存都与投注人数无关。
+热门组合（如偏好生日数字的选号）重复越多，压缩效果越明显。
+"""
+from itertools import combinations
+from math import comb
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from ticket_mask import MAX_NUMBER, PICK_COUNT, masks_to_array
+
+TOTAL_COMBINATIONS = comb(MAX_NUMBER, PICK_COUNT)  # 5,245,786
+
+# _COMB_TABLE[a, i] = C(a, i)，a取0..42，i取0..6
+_COMB_TABLE = np.array([[comb(a, i) for i in range(PICK_COUNT + 1)]
+                        for a in range(MAX_NUMBER + 1)], dtype=np.int64)
+_COMB_ROWS = _COMB_TABLE.T.tolist()  # 纯Python查表用，_COMB_ROWS[i][a] = C(a, i)
+
+# 直方图累积投注时的缓冲注数
+HISTOGRAM_CHUNK_SIZE = 1 << 16
+
+
+def rank_numbers(numbers: Iterable[int]) -> int:
+    """计算一注号码的组合序号"""
+    return sum(_COMB_ROWS[i][number - 1] for i, number in enumerate(sorted(numbers), 1))
+
+
+def unrank_numbers(rank: int) -> List[int]:
+    """由组合序号还原升序号码列表"""
+    if not 0 <= rank < TOTAL_COMBINATIONS:
+        raise ValueError(f"组合序号超出范围: {rank}")
+    numbers = []
+    for i in range(PICK_COUNT, 0, -1):
+        a = i - 1
+        while _COMB_ROWS[i][a + 1] <= rank:
+            a += 1
+        rank -= _COMB_ROWS[i][a]
+        numbers.append(a + 1)
+    return numbers[::-1]
+
+
+def _rank_sorted(tickets: np.ndarray) -> np.ndarray:
+    """计算每行已升序的(n, 6)号码数组的组合序号"""
+    ranks = np.zeros(tickets.shape[0], dtype=np.int64)
+    for i in range(PICK_COUNT):
+        ranks += _COMB_TABLE[tickets[:, i].astype(np.intp) - 1, i + 1]
+    return ranks
+
+
+def rank_tickets(tickets: np.ndarray) -> np.ndarray:
+    """批量计算(n, 6)号码数组的组合序号"""
+    return _rank_sorted(np.sort(np.asarray(tickets), axis=1))
+
+
+def rank_masks(masks: np.ndarray) -> np.ndarray:
+    """批量计算位掩码数组的组合序号"""
+    return _rank_sorted(masks_to_array(masks))
+
+
+def unrank_tickets(ranks: np.ndarray) -> np.ndarray:
+    """由组合序号数组批量还原(n, 6)升序号码数组"""
+    remaining = np.asarray(ranks, dtype=np.int64).copy()
+    tickets = np.empty((remaining.size, PICK_COUNT), dtype=np.uint8)
+    for i in range(PICK_COUNT, 0, -1):
+        a = np.searchsorted(_COMB_TABLE[:, i], remaining, side='right') - 1
+        remaining -= _COMB_TABLE[a, i]
+        tickets[:, i - 1] = a + 1
+    return tickets
+
+
+def _combination_array(items: Iterable[int], k: int) -> np.ndarray:
+    """items中取k个的全部组合，返回(C(n, k), k)数组"""
+    rows = list(combinations(items, k))
+    return np.array(rows, dtype=np.intp).reshape(len(rows), k)
+
+
+def _matching_combinations(winning_numbers: List[int], matches: int) -> np.ndarray:
+    """枚举与中奖号码恰好匹配matches个号码的全部组合，返回(n, 6)号码数组"""
+    winning = sorted(winning_numbers)
+    others = np.array([n for n in range(1, MAX_NUMBER + 1) if n not in set(winning)], dtype=np.uint8)
+    winning_part = _combination_array(winning, matches).astype(np.uint8)
+    other_part = others[_combination_array(range(others.size), PICK_COUNT - matches)]
+    return np.hstack([
+        np.repeat(winning_part, len(other_part), axis=0),
+        np.tile(other_part, (len(winning_part), 1)),
+    ])
+
+
+class TicketHistogram:
+    """
+    一轮投注的号码热度直方图
+
+    counts[r]为组合序号r被投注的注数。内存占用固定为C(42,6)个int32（约21MB），
+    与投注人数无关。逐注加入的号码先缓冲，每HISTOGRAM_CHUNK_SIZE注批量计入。
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(TOTAL_COMBINATIONS, dtype=np.int32)
+        self.total_tickets = 0
+        self._pending: List[int] = []
+
+    def clear(self) -> None:
+        """清空直方图，开始新一轮"""
+        self.counts.fill(0)
+        self.total_tickets = 0
+        self._pending.clear()
+
+    def add_numbers(self, numbers: Iterable[int]) -> None:
+        """加入一注号码"""
+        self._pending.append(rank_numbers(numbers))
+        if len(self._pending) >= HISTOGRAM_CHUNK_SIZE:
+            self.flush()
+
+    def add_ranks(self, ranks: np.ndarray) -> None:
+        """批量加入组合序号"""
+        ranks = np.asarray(ranks, dtype=np.int64)
+        self.counts += np.bincount(ranks, minlength=TOTAL_COMBINATIONS).astype(np.int32, copy=False)
+        self.total_tickets += int(ranks.size)
+
+    def add_tickets(self, tickets: np.ndarray) -> None:
+        """批量加入(n, 6)号码数组"""
+        self.add_ranks(rank_tickets(tickets))
+
+    def add_masks(self, masks: np.ndarray) -> None:
+        """批量加入位掩码数组"""
+        self.add_ranks(rank_masks(masks))
+
+    def flush(self) -> None:
+        """把缓冲中的逐注号码计入直方图"""
+        if self._pending:
+            self.add_ranks(np.array(self._pending, dtype=np.int64))
+            self._pending.clear()
+
+    def match_counts(self, winning_numbers: List[int]) -> np.ndarray:
+        """
+        统计本轮投注中匹配0-6个中奖号码的注数
+
+        只枚举匹配2个及以上的组合（约104万个）查表求和，
+        匹配0或1个的注数由总注数扣减得到，合并记为匹配0个。
+        """
+        self.flush()
+        counts = np.zeros(PICK_COUNT + 1, dtype=np.int64)
+        for matches in range(2, PICK_COUNT + 1):
+            ranks = rank_tickets(_matching_combinations(winning_numbers, matches))
+            counts[matches] = int(self.counts[ranks].sum(dtype=np.int64))
+        counts[0] = self.total_tickets - counts[2:].sum()
+        return counts
+
+    def most_common(self, n: int = 10) -> List[Tuple[List[int], int]]:
+        """投注最多的n个号码组合及其注数"""
+        self.flush()
+        top = np.argpartition(self.counts, -n)[-n:] if n < TOTAL_COMBINATIONS else np.arange(TOTAL_COMBINATIONS)
+        top = top[np.argsort(self.counts[top])[::-1]]
+        return [(unrank_numbers(int(rank)), int(self.counts[rank])) for rank in top]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的逐注明细记录
+
+每注明细存为结构化数组中的一行（约28字节），取代每注一个九键字典：
+号码以uint64位掩码存放，卡号由玩家编号和卡序号组成，中奖号码每轮只记一次。
+卡号、号码等字符串只在生成DataFrame时才渲染，不占用模拟热循环的时间。
+"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from ticket_mask import masks_to_strings, mask_to_str
+
+DETAIL_DTYPE = np.dtype([
+    ("round", np.uint32),
+    ("player_id", np.uint32),
+    ("card_idx", np.uint16),
+    ("ticket", np.uint64),
+    ("matches", np.uint8),
+    ("prize_tier", np.int8),  # -1表示未中奖
+    ("prize", np.float64),
+])
+
+# 导出DataFrame的列顺序，与原先逐注字典的键一致
+DETAIL_COLUMNS = ["round", "player_id", "card_id", "ticket_numbers", "winning_numbers",
+                  "bet_amount", "matches", "prize_tier", "prize_amount"]
+
+
+class DetailRecords:
+    """预分配的逐注明细环形缓冲，只保留最后maxlen注"""
+
+    def __init__(self, maxlen: int = 10_000):
+        self.records = np.zeros(maxlen, dtype=DETAIL_DTYPE)
+        self.maxlen = maxlen
+        self.size = 0
+        self._next = 0
+        # 轮次 -> 中奖号码位掩码
+        self.winning_masks: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def set_winning(self, round_no: int, winning_mask: int) -> None:
+        """记录一轮的中奖号码，同时删除投注已全部移出缓冲的轮次，字典大小不随轮数增长"""
+        buffered = set(np.unique(self.records["round"][:self.size]).tolist())
+        for stale in [r for r in self.winning_masks if r not in buffered]:
+            del self.winning_masks[stale]
+        self.winning_masks[round_no] = winning_mask
+
+    def append(self, round_no: int, player_id: int, card_idx: int, ticket_mask: int,
+               matches: int, prize_tier: int = -1, prize: float = 0.0) -> None:
+        """追加一注，缓冲已满时覆盖最早的一注"""
+        if self.maxlen == 0:
+            return
+        self.records[self._next] = (round_no, player_id, card_idx, ticket_mask, matches, prize_tier, prize)
+        self._next = (self._next + 1) % self.maxlen
+        self.size = min(self.size + 1, self.maxlen)
+
+    def extend(self, round_no: int, player_ids: np.ndarray, card_idx: np.ndarray, ticket_masks: np.ndarray,
+               matches: np.ndarray, prize_tiers: np.ndarray, prizes: np.ndarray) -> None:
+        """批量追加连续的若干注，只保留最后maxlen注"""
+        n = len(ticket_masks)
+        take = min(n, self.maxlen)
+        if take == 0:
+            return
+        rows = np.empty(take, dtype=DETAIL_DTYPE)
+        rows["round"] = round_no
+        rows["player_id"] = np.asarray(player_ids)[n - take:]
+        rows["card_idx"] = np.asarray(card_idx)[n - take:]
+        rows["ticket"] = np.asarray(ticket_masks)[n - take:]
+        rows["matches"] = np.asarray(matches)[n - take:]
+        rows["prize_tier"] = np.asarray(prize_tiers)[n - take:]
+        rows["prize"] = np.asarray(prizes)[n - take:]
+        positions = (self._next + np.arange(take)) % self.maxlen
+        self.records[positions] = rows
+        self._next = (self._next + take) % self.maxlen
+        self.size = min(self.size + take, self.maxlen)
+
+    def ordered(self) -> np.ndarray:
+        """按写入顺序返回缓冲中的记录"""
+        if self.size < self.maxlen:
+            return self.records[:self.size]
+        return np.concatenate([self.records[self._next:], self.records[:self._next]])
+
+    def set_jackpot_prize(self, round_no: int, share: float) -> None:
+        """头奖结算后回填该轮头奖注的奖级和奖金"""
+        hit = (self.records["round"] == round_no) & (self.records["matches"] == 6)
+        hit[self.size:] = False
+        self.records["prize_tier"][hit] = 6
+        self.records["prize"][hit] = share
+
+    def clear(self) -> None:
+        """清空缓冲"""
+        self.size = 0
+        self._next = 0
+        self.winning_masks.clear()
+
+    def to_dataframe(self, bet_amount: float) -> pd.DataFrame:
+        """渲染为DataFrame，此时才生成卡号和号码字符串"""
+        rows = self.ordered()
+        if rows.size == 0:
+            return pd.DataFrame()
+        rounds = rows["round"].astype(np.int64)
+        winning_strs = {round_no: mask_to_str(mask) for round_no, mask in self.winning_masks.items()}
+        prize_tier = pd.Series(rows["prize_tier"], dtype="float64")
+        prize_tier[prize_tier < 0] = np.nan
+        return pd.DataFrame({
+            "round": rounds,
+            "player_id": rows["player_id"].astype(np.int64),
+            "card_id": [f"P{p:04d}_C{c:04d}" for p, c in
+                        zip(rows["player_id"].tolist(), rows["card_idx"].tolist())],
+            "ticket_numbers": masks_to_strings(rows["ticket"]),
+            "winning_numbers": [winning_strs.get(r, "") for r in rounds.tolist()],
+            "bet_amount": bet_amount,
+            "matches": rows["matches"].astype(np.int64),
+            "prize_tier": prize_tier,
+            "prize_amount": rows["prize"],
+        }, columns=DETAIL_COLUMNS)
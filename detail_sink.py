@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+逐注明细的列式流式写出
+
+审计需要选定轮次的全部投注（每轮约500万注），无法放进内存中的明细缓冲。
+DetailSink在模拟进行中按块把逐注记录写入Parquet或Arrow IPC文件，
+内存占用只取决于块大小。号码和中奖号码以uint64位掩码（整数编码）存放，
+卡号由玩家编号和卡序号组成，不写字符串；Parquet对轮次、中奖号码、
+匹配数等重复值多的列使用字典编码，文件大小远小于等价的CSV。
+
+依赖pyarrow，未安装时只有在创建DetailSink时才报错。
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ticket_mask import masks_to_strings
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = None
+
+# 每块写出的注数
+DETAIL_CHUNK_SIZE = 1 << 20
+# 逐注接口的缓冲注数，满后转换为一段列数组
+TICKET_BUFFER_SIZE = 1 << 16
+
+DETAIL_FORMATS = ("parquet", "arrow")
+
+# 逐注接口的预分配缓冲，字段与明细文件的列一一对应
+TICKET_DTYPE = np.dtype([
+    ("round", np.uint32),
+    ("player_id", np.uint32),
+    ("card_idx", np.uint16),
+    ("ticket_mask", np.uint64),
+    ("winning_mask", np.uint64),
+    ("matches", np.uint8),
+    ("prize_amount", np.float64),
+])
+
+
+def _detail_schema():
+    return pa.schema([
+        ("round", pa.uint32()),
+        ("player_id", pa.uint32()),
+        ("card_idx", pa.uint16()),
+        ("ticket_mask", pa.uint64()),
+        ("winning_mask", pa.uint64()),
+        ("matches", pa.uint8()),
+        ("prize_amount", pa.float64()),
+    ])
+
+
+class DetailSink:
+    """
+    按块流式写出逐注明细
+
+    奖金由调用方按模拟器的奖金表传入。头奖奖金要到本轮结算时才确定，头奖注先留在内存中
+    （每轮至多几注），set_jackpot_prize回填每注分得的奖金后再写出，因此在文件中排在
+    本轮其他投注之后；直到关闭仍未结算的头奖注，奖金记为NaN。
+    """
+
+    def __init__(self, path: str, format: str = "parquet", rounds: Optional[Iterable[int]] = None,
+                 chunk_size: int = DETAIL_CHUNK_SIZE, compression: str = "zstd"):
+        """
+        Args:
+            path: 输出文件路径
+            format: "parquet"或"arrow"（Arrow IPC文件）
+            rounds: 需要记录明细的轮次，未指定时记录全部轮次
+            chunk_size: 每块写出的注数
+            compression: 压缩算法
+        """
+        if pa is None:
+            raise ImportError("写出逐注明细需要安装pyarrow")
+        if format not in DETAIL_FORMATS:
+            raise ValueError(f"未知的明细文件格式: {format}")
+        self.path = path
+        self.format = format
+        self.rounds = set(rounds) if rounds is not None else None
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self.schema = _detail_schema()
+        if format == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema, compression=compression, use_dictionary=True)
+        else:
+            options = pa_ipc.IpcWriteOptions(compression=compression)
+            self._writer = pa_ipc.new_file(path, self.schema, options=options)
+        self._pending: List[Dict[str, np.ndarray]] = []
+        self._pending_rows = 0
+        # 轮次 -> 等待结算的头奖注
+        self._jackpots: Dict[int, List[Dict[str, np.ndarray]]] = {}
+        # 逐注接口的缓冲
+        self._tickets = np.zeros(min(TICKET_BUFFER_SIZE, chunk_size), dtype=TICKET_DTYPE)
+        self._ticket_count = 0
+
+    def wants(self, round_no: int) -> bool:
+        """该轮是否需要记录明细"""
+        return self.rounds is None or round_no in self.rounds
+
+    def add_ticket(self, round_no: int, player_id: int, card_idx: int, ticket_mask: int,
+                   winning_mask: int, matches: int, prize: float = 0.0) -> None:
+        """逐注加入一条记录，供逐注引擎使用"""
+        self._tickets[self._ticket_count] = (round_no, player_id, card_idx, ticket_mask,
+                                             winning_mask, matches, prize)
+        self._ticket_count += 1
+        if self._ticket_count == len(self._tickets):
+            self._flush_tickets()
+
+    def add_tickets(self, round_no: int, player_ids: np.ndarray, card_idx: np.ndarray,
+                    ticket_masks: np.ndarray, winning_mask: int, matches: np.ndarray,
+                    prizes: np.ndarray) -> None:
+        """批量加入一轮中一段连续的投注"""
+        self._flush_tickets()
+        n = len(ticket_masks)
+        if n == 0:
+            return
+        self._add_columns({
+            "round": np.full(n, round_no, dtype=np.uint32),
+            "player_id": np.asarray(player_ids, dtype=np.uint32),
+            "card_idx": np.asarray(card_idx, dtype=np.uint16),
+            "ticket_mask": np.asarray(ticket_masks, dtype=np.uint64),
+            "winning_mask": np.full(n, winning_mask, dtype=np.uint64),
+            "matches": np.asarray(matches, dtype=np.uint8),
+            "prize_amount": np.asarray(prizes, dtype=np.float64),
+        })
+
+    def set_jackpot_prize(self, round_no: int, share: float) -> None:
+        """头奖结算后回填该轮头奖注的奖金，并排入待写出的记录"""
+        self._flush_tickets()
+        for columns in self._jackpots.pop(round_no, []):
+            columns["prize_amount"][:] = share
+            self._append_pending(columns)
+
+    def _add_columns(self, columns: Dict[str, np.ndarray]) -> None:
+        """加入一段列数组，头奖注留待结算"""
+        jackpot = columns["matches"] == 6
+        if jackpot.any():
+            held = {name: values[jackpot] for name, values in columns.items()}
+            for round_no in np.unique(held["round"]).tolist():
+                same_round = held["round"] == round_no
+                self._jackpots.setdefault(round_no, []).append(
+                    {name: values[same_round] for name, values in held.items()})
+            columns = {name: values[~jackpot] for name, values in columns.items()}
+        self._append_pending(columns)
+
+    def _append_pending(self, columns: Dict[str, np.ndarray]) -> None:
+        if len(columns["round"]) == 0:
+            return
+        self._pending.append(columns)
+        self._pending_rows += len(columns["round"])
+        if self._pending_rows >= self.chunk_size:
+            self.flush()
+
+    def _flush_tickets(self) -> None:
+        """把逐注缓冲转换为列数组"""
+        if self._ticket_count == 0:
+            return
+        rows = self._tickets[:self._ticket_count]
+        self._ticket_count = 0
+        self._add_columns({name: rows[name].copy() for name in TICKET_DTYPE.names})
+
+    def flush(self) -> None:
+        """把缓冲中的记录作为一个记录批写出（等待结算的头奖注除外）"""
+        self._flush_tickets()
+        if not self._pending:
+            return
+        columns = {name: np.concatenate([chunk[name] for chunk in self._pending])
+                   for name in self.schema.names}
+        self._pending = []
+        self._pending_rows = 0
+        batch = pa.RecordBatch.from_arrays([pa.array(columns[name], type=self.schema.field(name).type)
+                                            for name in self.schema.names], schema=self.schema)
+        self._writer.write_batch(batch)
+        self.rows_written += batch.num_rows
+
+    def close(self) -> None:
+        """写出剩余记录并关闭文件"""
+        if self._writer is None:
+            return
+        self._flush_tickets()
+        # 未结算的头奖注（如模拟中途出错）奖金记为NaN
+        for round_no in list(self._jackpots):
+            self.set_jackpot_prize(round_no, np.nan)
+        self.flush()
+        self._writer.close()
+        self._writer = None
+
+    def __enter__(self) -> 'DetailSink':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def read_detail(path: str, rounds: Optional[Iterable[int]] = None, render: bool = True) -> pd.DataFrame:
+    """
+    读取DetailSink写出的明细文件
+
+    Args:
+        path: 文件路径，按扩展名.arrow/.feather识别Arrow IPC，否则按Parquet读取
+        rounds: 只读取这些轮次
+        render: 是否把位掩码还原为号码字符串，并生成card_id列
+    """
+    if pa is None:
+        raise ImportError("读取逐注明细需要安装pyarrow")
+    if path.endswith((".arrow", ".feather")):
+        with pa.memory_map(path) as source:
+            table = pa_ipc.open_file(source).read_all()
+    else:
+        filters = [("round", "in", list(rounds))] if rounds is not None else None
+        table = pq.read_table(path, filters=filters)
+    df = table.to_pandas()
+    if rounds is not None:
+        df = df[df["round"].isin(list(rounds))].reset_index(drop=True)
+    if render and not df.empty:
+        df.insert(3, "card_id", [f"P{p:04d}_C{c:04d}" for p, c in
+                                 zip(df["player_id"].tolist(), df["card_idx"].tolist())])
+        df["ticket_numbers"] = masks_to_strings(df.pop("ticket_mask").to_numpy())
+        df["winning_numbers"] = masks_to_strings(df.pop("winning_mask").to_numpy())
+    return df
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+流式导出
+
+把按批产生的数据（DataFrame切片或数据库游标）逐批编码为CSV、JSONL或Parquet，
+可选gzip或zstd压缩，边编码边输出字节块。HTTP端点用export_response返回生成器响应，
+第一批数据编码完成即开始发送；写文件时用write_export逐块写入。
+内存占用只取决于每批的行数，与导出的总行数无关。
+
+Parquet依赖pyarrow，zstd压缩依赖zstandard，均为可选依赖，未安装时只有在
+使用对应格式时才报错。Parquet文件使用自身的列压缩，不再整体压缩。
+"""
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+EXPORT_COMPRESSIONS = ("gzip", "zstd")
+# 每批转换的行数
+EXPORT_BATCH_ROWS = 10_000
+
+MIMETYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+COMPRESSION_MIMETYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Excel按BOM识别UTF-8编码的CSV
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def check_options(fmt: str, compression: Optional[str]) -> None:
+    """检查导出格式和压缩算法，所需的可选依赖未安装时报错"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未知的导出格式: {fmt}，可选{EXPORT_FORMATS}")
+    if compression is not None and compression not in EXPORT_COMPRESSIONS:
+        raise ValueError(f"未知的压缩算法: {compression}，可选{EXPORT_COMPRESSIONS}")
+    if fmt == "parquet" and pa is None:
+        raise ImportError("导出Parquet需要安装pyarrow")
+    if compression == "zstd" and fmt != "parquet" and zstandard is None:
+        raise ImportError("zstd压缩需要安装zstandard")
+
+
+def select_columns(available: Sequence[str], requested: Optional[Iterable[str]]) -> List[str]:
+    """
+    按请求筛选列
+
+    Args:
+        available: 可导出的列，按输出顺序排列
+        requested: 请求的列（逗号分隔的字符串或列名序列），None或空表示全部列
+    """
+    if isinstance(requested, str):
+        requested = [name.strip() for name in requested.split(",") if name.strip()]
+    if not requested:
+        return list(available)
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ValueError(f"未知的列: {', '.join(unknown)}，可选{', '.join(available)}")
+    return list(requested)
+
+
+def frame_batches(df: pd.DataFrame, columns: Optional[Sequence[str]] = None,
+                  batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """按batch_rows行切分DataFrame"""
+    if columns is not None:
+        df = df[list(columns)]
+    for start in range(0, len(df), batch_rows):
+        yield df.iloc[start:start + batch_rows]
+    if len(df) == 0:
+        yield df
+
+
+def record_batches(records: Iterable[Any], columns: Sequence[str],
+                   batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """把逐行产生的记录（字典或sqlite3.Row）按batch_rows行组成DataFrame"""
+    columns = list(columns)
+    batch: List[tuple] = []
+    for record in records:
+        batch.append(tuple(record[name] for name in columns))
+        if len(batch) >= batch_rows:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch, columns=columns)
+
+
+class _Compressor:
+    """按块压缩；每批结束时刷新，客户端可以边接收边解压"""
+
+    def __init__(self, compression: Optional[str]):
+        self.compression = compression
+        if compression == "gzip":
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif compression == "zstd":
+            self._obj = zstandard.ZstdCompressor().compressobj()
+        else:
+            self._obj = None
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) if self._obj is not None else data
+
+    def flush_block(self) -> bytes:
+        if self.compression == "gzip":
+            return self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.compression == "zstd":
+            return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return b""
+
+    def finish(self) -> bytes:
+        return self._obj.flush() if self._obj is not None else b""
+
+
+class _ChunkSink:
+    """ParquetWriter的输出对象，收集写入的字节块供生成器取走"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _iter_parquet(batches: Iterable[pd.DataFrame], compression: Optional[str], schema) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            if schema is None:
+                schema = pa.Schema.from_pandas(batch, preserve_index=False)
+            writer = pq.ParquetWriter(sink, schema, compression=compression or "snappy")
+        writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+def stream_export(batches: Iterable[pd.DataFrame], fmt: str = "csv", compression: Optional[str] = None,
+                  schema=None, csv_bom: bool = False) -> Iterator[bytes]:
+    """
+    逐批编码并压缩，产生输出文件的字节块
+
+    Args:
+        batches: 列相同的DataFrame序列
+        fmt: "csv"、"jsonl"或"parquet"
+        compression: None、"gzip"或"zstd"；Parquet用作列压缩算法
+        schema: Parquet的pyarrow.Schema，未指定时按第一批推断
+        csv_bom: CSV开头写入UTF-8 BOM，便于Excel打开
+    """
+    check_options(fmt, compression)
+    if fmt == "parquet":
+        for chunk in _iter_parquet(batches, compression, schema):
+            if chunk:
+                yield chunk
+        return
+    compressor = _Compressor(compression)
+    first = True
+    for batch in batches:
+        if fmt == "csv":
+            text = batch.to_csv(index=False, header=first)
+            data = (UTF8_BOM if first and csv_bom else b"") + text.encode("utf-8")
+        else:
+            data = b""
+            if len(batch):
+                text = batch.to_json(orient="records", lines=True, force_ascii=False, date_format="iso")
+                data = text.rstrip("\n").encode("utf-8") + b"\n"
+        first = False
+        chunk = compressor.compress(data) + compressor.flush_block()
+        if chunk:
+            yield chunk
+    tail = compressor.finish()
+    if tail:
+        yield tail
+
+
+def export_filename(stem: str, fmt: str, compression: Optional[str] = None) -> str:
+    """导出文件名，如stats_export.csv.gz"""
+    name = f"{stem}.{fmt}"
+    if compression is not None and fmt != "parquet":
+        name += COMPRESSION_SUFFIXES[compression]
+    return name
+
+
+def parse_path(path: str) -> Tuple[str, Optional[str]]:
+    """按扩展名识别导出格式和压缩算法，如summary.csv.gz -> ("csv", "gzip")"""
+    compression = None
+    for name, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            compression = name
+            path = path[:-len(suffix)]
+    fmt = path.rsplit(".", 1)[-1].lower() if "." in path else "csv"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"无法从文件名识别导出格式: {path}")
+    return fmt, compression
+
+
+def write_export(path: str, batches: Iterable[pd.DataFrame], fmt: Optional[str] = None,
+                 compression: Optional[str] = None, **options) -> int:
+    """
+    逐块写出导出文件，返回写入的字节数
+
+    fmt为None时按扩展名识别格式和压缩算法
+    """
+    if fmt is None:
+        fmt, compression = parse_path(path)
+    written = 0
+    with open(path, "wb") as f:
+        for chunk in stream_export(batches, fmt, compression, **options):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def export_response(batches: Iterable[pd.DataFrame], stem: str, fmt: str = "csv",
+                    compression: Optional[str] = None, **options):
+    """Flask流式下载响应，第一批数据编码完成即开始发送"""
+    from flask import Response, stream_with_context
+
+    check_options(fmt, compression)
+    filename = export_filename(f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}", fmt, compression)
+    mimetype = MIMETYPES[fmt]
+    if compression is not None and fmt != "parquet":
+        mimetype = COMPRESSION_MIMETYPES[compression]
+    chunks = stream_export(batches, fmt, compression, **options)
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"',
+                             "X-Accel-Buffering": "no"})
+
+
+def arrow_schema(types: Dict[str, str], columns: Sequence[str]):
+    """按列名->pyarrow类型名（如"int64"）构造Parquet的schema"""
+    return pa.schema([(name, pa.type_for_alias(types[name])) for name in columns])
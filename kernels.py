@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+逐注模拟的计算内核
+
+逐个玩家、逐注生成号码并兑奖的循环是逐注引擎的主要耗时。本模块在导入时选择内核后端：
+安装了numba时使用JIT编译的内核（编译结果缓存在磁盘上，进程池中的子进程直接加载，
+无需各自重新编译）；否则使用纯Python实现，其抽样顺序与原先的逐注循环完全相同。
+设置环境变量LOTTO_KERNEL_BACKEND=python可强制使用纯Python后端。
+
+两种后端的随机数流不同：JIT内核从传入的random实例取一个种子后使用numba自己的生成器，
+因此同一种子在两种后端下的结果各自可复现，但彼此不相同。实际使用的后端记录在
+KERNEL_BACKEND中，各模拟入口会把它写入结果的元数据。
+"""
+import os
+import random
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from ticket_mask import MAX_NUMBER, PICK_COUNT, numbers_to_mask
+
+try:
+    from numba import njit
+except ImportError:  # 可选依赖
+    njit = None
+
+# 一轮的结果：(总注数, 匹配0-6个的注数, 头奖注(玩家序号, 卡序号, 位掩码)数组, 逐注明细或None)
+# 玩家序号和卡序号均从0开始；逐注明细为(玩家序号, 卡序号, 位掩码, 匹配数)四个数组
+RoundResult = Tuple[int, np.ndarray, np.ndarray, Optional[Tuple[np.ndarray, ...]]]
+
+# 需要报告轮内进度时，每处理这么多玩家报告一次
+PROGRESS_CHUNK_PLAYERS = 100_000
+
+
+def _popcount(x):
+    """整数的置位数（只用于号码位掩码，最多42位）"""
+    count = 0
+    while x:
+        x &= x - 1
+        count += 1
+    return count
+
+
+def _grow(array, size):
+    """把数组扩容到至少size行"""
+    grown = np.empty((max(size, 2 * array.shape[0]),) + array.shape[1:], dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+def _play_round_kernel(num_players, cards_lo, cards_hi, winning_mask, seed, record):
+    """JIT内核：模拟一轮的全部投注，号码均匀随机"""
+    np.random.seed(seed)
+    capacity = num_players * cards_hi if record else 0
+    detail = np.empty((capacity, 4), dtype=np.int64)
+    jackpots = np.empty((4, 3), dtype=np.int64)
+    n_jackpots = 0
+    counts = np.zeros(7, dtype=np.int64)
+    total_cards = 0
+    for player_id in range(num_players):
+        num_cards = np.random.randint(cards_lo, cards_hi + 1)
+        for card_idx in range(num_cards):
+            mask = 0
+            picked = 0
+            while picked < 6:
+                bit = 1 << np.random.randint(1, 43)
+                if mask & bit == 0:
+                    mask |= bit
+                    picked += 1
+            matches = _popcount(mask & winning_mask)
+            counts[matches] += 1
+            if matches == 6:
+                if n_jackpots == jackpots.shape[0]:
+                    jackpots = _grow(jackpots, n_jackpots + 1)
+                jackpots[n_jackpots, 0] = player_id
+                jackpots[n_jackpots, 1] = card_idx
+                jackpots[n_jackpots, 2] = mask
+                n_jackpots += 1
+            if record:
+                row = total_cards + card_idx
+                detail[row, 0] = player_id
+                detail[row, 1] = card_idx
+                detail[row, 2] = mask
+                detail[row, 3] = matches
+        total_cards += num_cards
+    return total_cards, counts, jackpots[:n_jackpots], detail[:total_cards]
+
+
+def _play_batch_round_kernel(num_players, winning_mask, seed, biased_share):
+    """JIT内核：simulate_batch的投注模型，返回总注数和匹配0-6个的注数"""
+    np.random.seed(seed)
+    counts = np.zeros(7, dtype=np.int64)
+    total_tickets = 0
+    for _ in range(num_players):
+        if np.random.random() < 0.8:
+            num_tickets = np.random.randint(1, 3)
+        else:
+            num_tickets = np.random.randint(3, 11)
+        for _ in range(num_tickets):
+            biased = np.random.random() < biased_share
+            mask = 0
+            picked = 0
+            while picked < 6:
+                if not biased:
+                    number = np.random.randint(1, 43)
+                elif np.random.random() < 0.7:
+                    number = np.random.randint(1, 32)  # 偏向于1-31（月份和日期范围）
+                else:
+                    number = np.random.randint(32, 43)
+                bit = 1 << number
+                if mask & bit == 0:
+                    mask |= bit
+                    picked += 1
+            counts[_popcount(mask & winning_mask)] += 1
+        total_tickets += num_tickets
+    return total_tickets, counts
+
+
+def _play_round_python(num_players: int, cards_range: Tuple[int, int], winning_mask: int,
+                       rnd, record: bool) -> RoundResult:
+    """纯Python后端，抽样顺序与原先的逐注循环一致"""
+    counts = [0] * (PICK_COUNT + 1)
+    jackpots = []
+    detail = [] if record else None
+    total_cards = 0
+    numbers = range(1, MAX_NUMBER + 1)
+    for player_id in range(num_players):
+        num_cards = rnd.randint(*cards_range)
+        total_cards += num_cards
+        for card_idx in range(num_cards):
+            mask = numbers_to_mask(rnd.sample(numbers, PICK_COUNT))
+            matches = (mask & winning_mask).bit_count()
+            counts[matches] += 1
+            if matches == 6:
+                jackpots.append((player_id, card_idx, mask))
+            if detail is not None:
+                detail.append((player_id, card_idx, mask, matches))
+    return (total_cards, np.array(counts, dtype=np.int64),
+            np.array(jackpots, dtype=np.int64).reshape(-1, 3),
+            _detail_columns(np.array(detail, dtype=np.int64).reshape(-1, 4)) if record else None)
+
+
+def _detail_columns(detail: np.ndarray) -> Tuple[np.ndarray, ...]:
+    return detail[:, 0], detail[:, 1], detail[:, 2].astype(np.uint64), detail[:, 3].astype(np.uint8)
+
+
+def _select_backend() -> str:
+    """选择内核后端，JIT可用时在导入阶段完成编译（或从磁盘缓存加载）"""
+    global _play_round_jit, _play_batch_round_jit, _popcount, _grow
+    if njit is None or os.environ.get("LOTTO_KERNEL_BACKEND", "").lower() == "python":
+        return "python"
+    try:
+        _popcount = njit(cache=True)(_popcount)
+        _grow = njit(cache=True)(_grow)
+        _play_round_jit = njit(cache=True)(_play_round_kernel)
+        _play_batch_round_jit = njit(cache=True)(_play_batch_round_kernel)
+        _play_round_jit(1, 1, 1, 0, 0, True)
+        _play_batch_round_jit(1, 0, 0, 0.3)
+    except Exception:
+        return "python"
+    return "numba"
+
+
+_play_round_jit = None
+_play_batch_round_jit = None
+KERNEL_BACKEND = _select_backend()
+
+
+def play_round(num_players: int, cards_range: Tuple[int, int], winning_mask: int,
+               rnd=random, record: bool = False, progress: Optional[Callable[[int, int], None]] = None,
+               chunk_players: int = PROGRESS_CHUNK_PLAYERS) -> RoundResult:
+    """
+    逐注模拟一轮：每个玩家在cards_range内随机购买若干注均匀随机号码并兑奖
+
+    Args:
+        num_players: 玩家数
+        cards_range: 每个玩家购买注数的范围（含两端）
+        winning_mask: 中奖号码位掩码
+        rnd: random模块或random.Random实例
+        record: 是否返回逐注明细
+        progress: 轮内进度回调，参数为(已处理玩家数, 已处理注数)。玩家数超过chunk_players时
+            按块模拟并在每块之后回调；JIT后端每块从rnd取一个种子，因此分块后的结果与
+            不分块时不同，但同一种子下仍可复现
+        chunk_players: 每块的玩家数
+
+    Returns:
+        (总注数, 匹配0-6个的注数, 头奖注数组, 逐注明细或None)，见RoundResult
+    """
+    if progress is None or num_players <= chunk_players:
+        result = _play_round_block(num_players, cards_range, winning_mask, rnd, record)
+        if progress is not None:
+            progress(num_players, result[0])
+        return result
+
+    total_cards = 0
+    counts = np.zeros(PICK_COUNT + 1, dtype=np.int64)
+    jackpots = []
+    details = []
+    for start in range(0, num_players, chunk_players):
+        block_cards, block_counts, block_jackpots, block_detail = _play_round_block(
+            min(chunk_players, num_players - start), cards_range, winning_mask, rnd, record)
+        total_cards += block_cards
+        counts += block_counts
+        # 块内的玩家序号从0开始，换算为本轮的玩家序号
+        if len(block_jackpots):
+            block_jackpots = block_jackpots.copy()
+            block_jackpots[:, 0] += start
+            jackpots.append(block_jackpots)
+        if record:
+            details.append((block_detail[0] + start,) + tuple(block_detail[1:]))
+        progress(start + min(chunk_players, num_players - start), total_cards)
+    jackpots = np.concatenate(jackpots) if jackpots else np.empty((0, 3), dtype=np.int64)
+    detail = tuple(np.concatenate([block[i] for block in details]) for i in range(4)) if record else None
+    return total_cards, counts, jackpots, detail
+
+
+def _play_round_block(num_players: int, cards_range: Tuple[int, int], winning_mask: int,
+                      rnd, record: bool) -> RoundResult:
+    """用选定的后端模拟一块玩家"""
+    if KERNEL_BACKEND == "python":
+        return _play_round_python(num_players, cards_range, winning_mask, rnd, record)
+    total_cards, counts, jackpots, detail = _play_round_jit(
+        num_players, cards_range[0], cards_range[1], winning_mask, rnd.getrandbits(32), record)
+    return int(total_cards), counts, jackpots, _detail_columns(detail) if record else None
+
+
+def play_batch_round(num_players: int, winning_mask: int, rnd=random,
+                     biased_share: float = 0.3) -> Optional[Tuple[int, np.ndarray]]:
+    """
+    按simulate_batch的投注模型模拟一轮：80%的玩家买1-2注，其余买3-10注，
+    每注以biased_share的概率偏向1-31的小号码
+
+    Returns:
+        (总注数, 匹配0-6个的注数)；纯Python后端返回None，由调用方执行原有的逐注循环
+    """
+    if KERNEL_BACKEND == "python":
+        return None
+    total_tickets, counts = _play_batch_round_jit(num_players, winning_mask, rnd.getrandbits(32), biased_share)
+    return int(total_tickets), counts
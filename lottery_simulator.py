@@ -1,11 +1,20 @@
 import numpy as np
 import pandas as pd
-from typing import Tuple, List
+from typing import Callable, Tuple, List, Optional
 import random
 import time
+from ticket_mask import numbers_to_mask, mask_to_numbers, match_count
+from match_distribution import sample_total_cards, sample_match_counts
+from rng_streams import RNGStreams
+from kernels import KERNEL_BACKEND, play_round
+from phase_timer import PhaseTimer
+
 class LotterySimulator:
     def __init__(self, num_rounds: int, players_range: Tuple[int, int], 
-                 cards_range: Tuple[int, int], ticket_price: float):
+                 cards_range: Tuple[int, int], ticket_price: float,
+                 counts_only: bool = False, seed: Optional[int] = None,
+                 on_round: Optional[Callable[[int, int], None]] = None,
+                 on_tick: Optional[Callable[[dict], None]] = None):
         """
         初始化彩票模拟器
         
@@ -14,13 +23,38 @@ class LotterySimulator:
             players_range: 玩家数量范围(最小值, 最大值)
             cards_range: 每人购买注数范围(最小值, 最大值)
             ticket_price: 单注金额
+            counts_only: 只统计注数模式，按多项分布直接抽样每轮的总注数和各奖级注数，
+                不生成逐注号码，也不产生明细数据
+            seed: 随机种子。每轮使用由(种子, 轮次)确定的独立随机数流，
+                可通过simulate_round单独重新模拟任意一轮；
+                逐注模式未指定时沿用全局random模块
+            on_round: 每轮结束时的回调，参数为(轮次, 本轮总注数)
+            on_tick: 逐注模式下轮内进度的回调，每处理kernels.PROGRESS_CHUNK_PLAYERS个玩家
+                调用一次，参数为round_progress字典
         """
         self.num_rounds = num_rounds
         self.players_range = players_range
         self.cards_range = cards_range
         self.ticket_price = ticket_price
+        self.counts_only = counts_only
+        self.seed = seed
+        self.streams = RNGStreams(seed)
+        self.on_round = on_round
+        self.on_tick = on_tick
+        # 当前轮的轮内进度：已处理/预计注数、每秒注数和预计剩余时间
+        self.round_progress: Optional[dict] = None
+        self.run_start: Optional[float] = None
+        self._round_start = 0.0
         self.last_update_time = time.time()
         self.interim_results = []
+        # 逐轮累加的汇总，中间摘要只读取这些值，与已完成轮数无关
+        self.rounds_done = 0
+        self.total_players = 0
+        self.total_tickets = 0
+        self.total_bet_amount = 0.0
+        self.total_payout = 0.0
+        # 分阶段计时，run_simulation结束后也记录在summary_df.attrs['timings']中
+        self.timer = PhaseTimer()
         
         # 奖金设置
         self.prize_pool = 0
@@ -35,17 +69,17 @@ class LotterySimulator:
         # 初始化奖池
         self.jackpot = 10_000_000  # 初始奖池1000万
         
-    def generate_winning_numbers(self) -> List[int]:
+    def generate_winning_numbers(self, rnd=random) -> List[int]:
         """生成中奖号码"""
-        return random.sample(range(1, 43), 6)
+        return rnd.sample(range(1, 43), 6)
     
-    def generate_player_numbers(self) -> List[int]:
+    def generate_player_numbers(self, rnd=random) -> List[int]:
         """生成玩家选号"""
-        return random.sample(range(1, 43), 6)
+        return rnd.sample(range(1, 43), 6)
     
     def check_matches(self, player_numbers: List[int], winning_numbers: List[int]) -> int:
         """检查匹配数量"""
-        return len(set(player_numbers) & set(winning_numbers))
+        return match_count(numbers_to_mask(player_numbers), numbers_to_mask(winning_numbers))
     
     def calculate_prize(self, matches: int, total_winners: dict) -> float:
         """计算奖金"""
@@ -72,38 +106,14 @@ class LotterySimulator:
         summary_data = []
         jackpot_data = []
         last_round_detail = []
+        self.run_start = time.perf_counter()
         
         for i, round_num in enumerate(range(1, self.num_rounds + 1)):
-            # 生成本轮参数
-            num_players = random.randint(*self.players_range)
-            
-            # 生成中奖号码
-            winning_numbers = self.generate_winning_numbers()
-            
-            # 初始化统计数据
-            total_cards = 0
-            winners_count = {i: 0 for i in range(7)}
+            with self.timer.phase('sampling' if self.counts_only else 'tickets'):
+                num_players, total_cards, winners_count = self.simulate_round(
+                    round_num, last_round_detail if round_num == self.num_rounds else None)
             winners_amount = {i: 0.0 for i in range(7)}
             
-            # 模拟每个玩家
-            for player_id in range(num_players):
-                num_cards = random.randint(*self.cards_range)
-                total_cards += num_cards
-                
-                # 生成该玩家所有投注
-                for _ in range(num_cards):
-                    player_numbers = self.generate_player_numbers()
-                    matches = self.check_matches(player_numbers, winning_numbers)
-                    winners_count[matches] += 1
-                    
-                    # 记录最后一轮的详细数据
-                    if round_num == self.num_rounds:
-                        last_round_detail.append({
-                            'player_id': player_id,
-                            'numbers': player_numbers,
-                            'matches': matches
-                        })
-            
             # 计算奖金
             total_payout = 0
             for matches in range(2, 7):
@@ -149,33 +159,146 @@ class LotterySimulator:
                 '5th_amount': winners_amount[2]
             })
             
+            self.rounds_done += 1
+            self.total_players += num_players
+            self.total_tickets += total_cards
+            self.total_bet_amount += total_bet_amount
+            self.total_payout += total_payout
+            
+            if self.on_round is not None:
+                self.on_round(round_num, total_cards)
+            
             # 检查是否需要更新进度（每5分钟）
             current_time = time.time()
             if current_time - self.last_update_time >= 60:  # 60秒 = 1分钟
-                interim_summary = self.generate_interim_summary(summary_data)
+                self.timer.sample_memory()
+                with self.timer.phase('interim_summary'):
+                    interim_summary = self.generate_interim_summary()
                 self.interim_results.append(interim_summary)
                 self.last_update_time = current_time
         
         # 转换为DataFrame
-        summary_df = pd.DataFrame(summary_data)
-        detail_df = pd.DataFrame(last_round_detail)
-        jackpot_df = pd.DataFrame(jackpot_data)
+        self.timer.sample_memory()
+        with self.timer.phase('dataframe_build'):
+            summary_df = pd.DataFrame(summary_data)
+            detail_df = pd.DataFrame(last_round_detail)
+            if not detail_df.empty:
+                detail_df.insert(1, 'numbers', [mask_to_numbers(mask) for mask in detail_df.pop('ticket_mask')])
+            jackpot_df = pd.DataFrame(jackpot_data)
+        summary_df.attrs['kernel_backend'] = 'multinomial' if self.counts_only else KERNEL_BACKEND
+        summary_df.attrs['timings'] = self.timer.to_dict()
         
         return summary_df, detail_df, jackpot_df
         
-    def generate_interim_summary(self, results):
-        """生成中间结果摘要"""
-        df = pd.DataFrame(results)
-        total_bet_amount = df['total_bet_amount'].sum()
-        total_payout = df['total_payout'].sum()
+    def simulate_round(self, round_num: int, detail: Optional[list] = None) -> Tuple[int, int, dict]:
+        """
+        模拟第round_num轮的投注与兑奖
+        
+        指定seed时每轮的随机数流只由(种子, 轮次)决定，
+        因此可以单独调用本方法重新模拟任意一轮，结果与完整运行中的该轮一致。
+        
+        Returns:
+            玩家数、总注数、各匹配数的中奖注数
+        """
+        if self.counts_only:
+            return self.sample_round_counts(self.streams.round_generator(round_num))
+        rnd = self.streams.python_random(round_num) if self.seed is not None else random
+        return self.simulate_round_tickets(detail, rnd, round_num)
+    
+    def simulate_round_tickets(self, detail: Optional[list] = None, rnd=random,
+                               round_num: int = 0) -> Tuple[int, int, dict]:
+        """
+        逐注模拟一轮投注
+        
+        Args:
+            detail: 需要记录本轮明细时传入的列表
+            rnd: random模块或random.Random实例
+            round_num: 轮次，只用于轮内进度
+            
+        Returns:
+            玩家数、总注数、各匹配数的中奖注数
+        """
+        # 生成本轮参数
+        num_players = rnd.randint(*self.players_range)
+        
+        # 生成中奖号码
+        winning_numbers = self.generate_winning_numbers(rnd)
+        winning_mask = numbers_to_mask(winning_numbers)
+        
+        # 逐注模拟全部玩家的投注，循环在kernels中执行（JIT或纯Python后端），按块报告轮内进度
+        self._start_round_progress(round_num, num_players)
+        total_cards, match_counts, _, tickets = play_round(
+            num_players, self.cards_range, winning_mask, rnd, record=detail is not None,
+            progress=self._tick)
+        winners_count = {i: int(match_counts[i]) for i in range(7)}
+        
+        # 记录明细数据，号码以位掩码暂存
+        if detail is not None:
+            player_ids, _, ticket_masks, ticket_matches = tickets
+            detail.extend({'player_id': player_id, 'ticket_mask': ticket_mask, 'matches': matches}
+                          for player_id, ticket_mask, matches in zip(player_ids.tolist(), ticket_masks.tolist(),
+                                                                     ticket_matches.tolist()))
+        
+        return num_players, total_cards, winners_count
+    
+    def _start_round_progress(self, round_num: int, num_players: int) -> None:
+        self._round_start = time.perf_counter()
+        self.round_progress = {
+            'round': round_num,
+            'num_players': num_players,
+            'players_done': 0,
+            'tickets_done': 0,
+            'tickets_expected': int(num_players * sum(self.cards_range) / 2),
+            'round_progress': 0.0,
+            'tickets_per_sec': None,
+            'eta_seconds': None
+        }
+    
+    def _tick(self, players_done: int, tickets_done: int) -> None:
+        """轮内进度回调，按本轮和整次运行的实测速度估算每秒注数和剩余时间"""
+        now = time.perf_counter()
+        progress = dict(self.round_progress)
+        progress['players_done'] = players_done
+        progress['tickets_done'] = tickets_done
+        progress['round_progress'] = players_done / progress['num_players'] * 100 if progress['num_players'] else 100.0
+        round_elapsed = now - self._round_start
+        progress['tickets_per_sec'] = tickets_done / round_elapsed if round_elapsed > 0 else None
+        
+        # 剩余注数：本轮未处理的部分加上之后各轮的预计注数
+        run_elapsed = now - (self.run_start if self.run_start is not None else self._round_start)
+        run_tickets = self.total_tickets + tickets_done
+        mean_tickets = sum(self.players_range) / 2 * sum(self.cards_range) / 2
+        remaining = (max(progress['tickets_expected'] - tickets_done, 0)
+                     + max(self.num_rounds - progress['round'], 0) * mean_tickets)
+        progress['eta_seconds'] = remaining / (run_tickets / run_elapsed) if run_tickets and run_elapsed > 0 else None
+        self.round_progress = progress
+        if self.on_tick is not None:
+            self.on_tick(progress)
+    
+    def sample_round_counts(self, rng: np.random.Generator) -> Tuple[int, int, dict]:
+        """
+        按多项分布直接抽样一轮的玩家数、总注数和各匹配数的中奖注数
+        
+        玩家均匀随机选号时与逐注模拟同分布，耗时与玩家数量无关。
+        """
+        num_players = int(rng.integers(self.players_range[0], self.players_range[1] + 1))
+        total_cards = sample_total_cards(num_players, self.cards_range, rng)
+        match_counts = sample_match_counts(total_cards, rng)
+        winners_count = {i: int(match_counts[i]) for i in range(7)}
+        return num_players, total_cards, winners_count
+    
+    def generate_interim_summary(self) -> dict:
+        """由逐轮累加的汇总生成中间结果摘要，耗时与已完成轮数无关"""
+        total_bet_amount = self.total_bet_amount
+        total_payout = self.total_payout
         
         summary = {
-            'progress': (len(df) / self.num_rounds) * 100,
-            'current_round': len(df),
+            'progress': (self.rounds_done / self.num_rounds) * 100,
+            'current_round': self.rounds_done,
             'total_rounds': self.num_rounds,
-            'player_count': int(df['num_players'].mean()),
+            'player_count': int(self.total_players / self.rounds_done) if self.rounds_done else 0,
             'total_bets': float(total_bet_amount),
-            'total_tickets': int(df['total_cards'].sum()),
+            'total_tickets': int(self.total_tickets),
             'jackpot_amount': float(self.jackpot),
             'total_payouts': float(total_payout),
             'payout_ratio': float((total_payout / total_bet_amount) * 100) if total_bet_amount > 0 else 0
@@ -183,7 +306,9 @@ class LotterySimulator:
         return summary
 
     def get_progress(self):
-        """获取当前进度"""
-        if not self.interim_results:
+        """获取当前进度，逐注模式下包含当前轮的轮内进度（round_progress）"""
+        if not self.interim_results and self.round_progress is None:
             return None
-        return self.interim_results[-1]
\ No newline at end of file
+        summary = self.generate_interim_summary()
+        summary['round_progress'] = self.round_progress
+        return summary
\ No newline at end of file
@@ -1,10 +1,80 @@
 # -*- coding: utf-8 -*-
 import random
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from collections import deque
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional
 import json
+from concurrent.futures import ProcessPoolExecutor
+from ticket_mask import numbers_to_mask, match_count, masks_to_strings, random_ticket_masks, count_matches
+from match_distribution import sample_total_cards, sample_match_counts, sample_winning_numbers
+from rng_streams import RNGStreams
+from pool_accounting import PoolAccount
+from detail_sink import DetailSink
+from detail_records import DetailRecords
+from phase_timer import PhaseTimer
+from report_generator import chart_series
+from export_stream import EXPORT_COMPRESSIONS, EXPORT_FORMATS, check_options, export_filename, frame_batches, write_export
+
+# 分片引擎每个分片包含的玩家数；固定不变，保证结果与进程数无关
+SHARD_PLAYERS = 65_536
+
+# 匹配数对应的概要列名次
+PRIZE_NAMES = {6: "1st", 5: "2nd", 4: "3rd", 3: "4th", 2: "5th"}
+
+
+def simulate_shard(task: tuple) -> Dict[str, Any]:
+    """
+    分片引擎第一阶段：生成一个分片内全部玩家的投注并兑奖
+    
+    分片之间没有依赖，可在进程池中并行执行。分片的随机数流只由
+    (种子, 轮次, 分片序号)决定，与进程数和执行顺序无关。
+    
+    Args:
+        task: (streams, round_no, shard_idx, player_start, player_end,
+               cards_range, winning_mask, detail_limit, full_detail)，玩家编号从1开始，
+               player_end不含；detail_limit为需要返回的末尾明细注数，
+               full_detail为True时返回本分片全部投注（写出逐注明细时使用）
+    
+    Returns:
+        本分片的总注数、各匹配数注数、头奖注以及末尾明细
+    """
+    (streams, round_no, shard_idx, player_start, player_end, cards_range, winning_mask,
+     detail_limit, full_detail) = task
+    rng = streams.shard_generator(round_no, shard_idx)
+    
+    cards = rng.integers(cards_range[0], cards_range[1] + 1, size=player_end - player_start)
+    card_ends = np.cumsum(cards)
+    total_cards = int(card_ends[-1]) if cards.size else 0
+    masks = random_ticket_masks(total_cards, rng)
+    matches = count_matches(masks, winning_mask)
+    
+    def locate(ticket_idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """由分片内的注序号还原玩家编号和卡号（均从1开始）"""
+        owner = np.searchsorted(card_ends, ticket_idx, side='right')
+        return player_start + owner, ticket_idx - (card_ends[owner] - cards[owner]) + 1
+    
+    jackpot_idx = np.flatnonzero(matches == 6)
+    jackpot_players, jackpot_cards = locate(jackpot_idx)
+    tail_idx = np.arange(max(total_cards - detail_limit, 0), total_cards)
+    tail_players, tail_cards = locate(tail_idx)
+    
+    shard = {
+        "total_cards": total_cards,
+        "match_counts": np.bincount(matches, minlength=7),
+        "jackpot_player_ids": jackpot_players,
+        "jackpot_card_idx": jackpot_cards,
+        "jackpot_masks": masks[jackpot_idx],
+        "tail_player_ids": tail_players,
+        "tail_card_idx": tail_cards,
+        "tail_masks": masks[tail_idx],
+        "tail_matches": matches[tail_idx],
+    }
+    if full_detail:
+        all_players, all_cards = locate(np.arange(total_cards))
+        shard["all"] = (all_players, all_cards, masks, matches)
+    return shard
+
 
 class LotterySimulator:
     def __init__(
@@ -15,8 +85,31 @@ class LotterySimulator:
         ticket_price: float = 20.0,
         initial_jackpot: float = 30_000_000.0,
         pool_insert: float = 0.43,
-        return_pool: float = 0.9
+        return_pool: float = 0.9,
+        counts_only: bool = False,
+        seed: Optional[int] = None,
+        engine: str = "python",
+        workers: int = 1,
+        detail_sink: Optional[DetailSink] = None
     ):
+        """
+        counts_only为True时不逐注模拟，而是按多项分布直接抽样每轮的总注数和
+        各奖级注数（玩家均匀随机选号时与逐注模拟同分布），不产生投注明细。
+        
+        engine为"sharded"时使用两阶段分片引擎：第一阶段按玩家区间分片生成投注并兑奖，
+        workers大于1时在进程池中并行；第二阶段按分片顺序依次进行奖池结算。
+        相同seed下结果与workers无关，逐位一致。
+        
+        seed为随机种子，未指定时随机生成并记录在self.seed中。每轮（及每个分片）使用
+        由(种子, 轮次, 分片)确定的独立随机数流，可通过process_round单独重新模拟任意一轮。
+        
+        detail_sink用于把选定轮次的全部逐注明细流式写入列式文件（只统计注数模式不支持），
+        明细缓冲仍只保留最后10000注。
+        """
+        if engine not in ("python", "sharded"):
+            raise ValueError(f"未知的模拟引擎: {engine}")
+        if counts_only and detail_sink is not None:
+            raise ValueError("只统计注数模式不生成逐注号码，无法写出逐注明细")
         self.num_rounds = num_rounds
         self.players_range = players_range
         self.cards_per_player_range = cards_per_player_range
@@ -24,34 +117,48 @@ class LotterySimulator:
         self.initial_jackpot = initial_jackpot
         self.pool_insert = pool_insert
         self.return_pool = return_pool
+        self.counts_only = counts_only
+        self.engine = engine
+        self.workers = workers
+        self.detail_sink = detail_sink
+        # 分阶段计时，run_simulation结束后也记录在summary_df.attrs['timings']中
+        self.timer = PhaseTimer()
+        self.streams = RNGStreams(seed)
+        self.seed = self.streams.seed
+        self._map_shards = map
         
-        # 奖池初始化
-        self.jackpot_pool = initial_jackpot
-        self.funding_pool = -initial_jackpot
+        # 奖池初始化，以分记账
+        self.pools = PoolAccount(ticket_price, pool_insert, return_pool, initial_jackpot)
+        # 资金池欠款还清时的(轮次, 该轮注序号)
+        self.funding_cleared_at: Optional[Tuple[int, int]] = None
         
         # 奖金设置
         self.prize_map = {6: None, 5: 50_000, 4: 1_500, 3: 60, 2: 20}
+        # 按匹配数查表的固定奖级和奖金，头奖在结算时回填
+        self._prize_tiers = np.array([-1, -1, 2, 3, 4, 5, -1], dtype=np.int8)
+        self._prize_amounts = np.array([0.0, 0.0] + [float(self.prize_map[t]) for t in range(2, 6)] + [0.0])
         
         # 数据存储
         self.summary_records = []
-        self.detail_buffer = deque(maxlen=10_000)  # 限制详细记录数量
+        self.detail_buffer = DetailRecords(maxlen=10_000)  # 限制详细记录数量，按结构化数组紧凑存放
         self.jackpot_list = []
 
-    def generate_winning_numbers(self) -> set:
+    def generate_winning_numbers(self, rnd=random) -> set:
         """生成中奖号码"""
-        return set(random.sample(range(1, 43), 6))
+        return set(rnd.sample(range(1, 43), 6))
 
-    def generate_ticket_numbers(self) -> set:
+    def generate_ticket_numbers(self, rnd=random) -> set:
         """生成投注号码"""
-        return set(random.sample(range(1, 43), 6))
+        return set(rnd.sample(range(1, 43), 6))
 
-    def process_ticket(self, round_no: int, player_id: int, card_idx: int, 
-                      winning_nums: set, winning_str: str) -> dict:
-        """处理单张彩票"""
-        ticket_nums = self.generate_ticket_numbers()
-        ticket_str = ",".join(map(str, sorted(ticket_nums)))
-        matches = len(ticket_nums & winning_nums)
-        
+    def process_ticket(self, winning_mask: int, rnd=random) -> Tuple[int, int]:
+        """处理单张彩票，返回号码位掩码和匹配数量"""
+        ticket_mask = numbers_to_mask(self.generate_ticket_numbers(rnd))
+        return ticket_mask, match_count(ticket_mask, winning_mask)
+
+    def bet_record(self, round_no: int, player_id: int, card_idx: int,
+                   ticket_mask: int, winning_str: str, matches: int) -> dict:
+        """构造单注投注记录"""
         prize = 0.0
         prize_tier = None
         if 2 <= matches < 6:
@@ -62,7 +169,7 @@ class LotterySimulator:
             "round": round_no,
             "player_id": player_id,
             "card_id": f"P{player_id:04d}_C{card_idx:04d}",
-            "ticket_numbers": ticket_str,
+            "ticket_mask": ticket_mask,
             "winning_numbers": winning_str,
             "bet_amount": self.ticket_price,
             "matches": matches,
@@ -72,49 +179,199 @@ class LotterySimulator:
 
     def process_round(self, round_no: int) -> Dict[str, Any]:
         """处理单轮游戏"""
-        num_players = random.randint(*self.players_range)
+        if self.counts_only:
+            return self.process_round_counts(round_no)
+        if self.engine == "sharded":
+            return self.process_round_sharded(round_no)
+        
+        rnd = self.streams.python_random(round_no)
+        num_players = rnd.randint(*self.players_range)
         total_cards = 0
-        winning_nums = self.generate_winning_numbers()
+        winning_nums = self.generate_winning_numbers(rnd)
+        winning_mask = numbers_to_mask(winning_nums)
         winning_str = ",".join(map(str, sorted(winning_nums)))
+        self.detail_buffer.set_winning(round_no, winning_mask)
         
         tier_counts = {tier: 0 for tier in self.prize_map}
         tier_totals = {tier: 0.0 for tier in self.prize_map}
-        total_bet_amount = 0.0
         current_jackpots = []
+        sink = self.detail_sink if self.detail_sink is not None and self.detail_sink.wants(round_no) else None
 
-        # 处理每个玩家的投注
-        for player_id in range(1, num_players + 1):
-            num_cards = random.randint(*self.cards_per_player_range)
-            total_cards += num_cards
-            
-            for card_idx in range(1, num_cards + 1):
-                total_bet_amount += self.ticket_price
+        # 处理每个玩家的投注（逐注生成、兑奖和记录明细交织在一起，整体计为tickets阶段）
+        with self.timer.phase("tickets"):
+            for player_id in range(1, num_players + 1):
+                num_cards = rnd.randint(*self.cards_per_player_range)
+                total_cards += num_cards
                 
-                # 资金分配
-                if self.funding_pool < 0:
-                    total_insert = self.ticket_price * self.pool_insert
-                    max_repay = -self.funding_pool
-                    repay_amount = min(total_insert * self.return_pool, max_repay)
-                    jackpot_contrib = total_insert - repay_amount
+                for card_idx in range(1, num_cards + 1):
+                    # 处理彩票
+                    ticket_mask, matches = self.process_ticket(winning_mask, rnd)
+                    prize_tier = -1
+                    prize = 0.0
+                    
+                    if matches >= 2:
+                        tier_counts[matches] += 1
+                        if matches < 6:
+                            prize_tier = matches
+                            prize = self.prize_map[matches]
+                            tier_totals[matches] += prize
+                        else:
+                            current_jackpots.append(self.bet_record(round_no, player_id, card_idx,
+                                                                    ticket_mask, winning_str, matches))
                     
-                    self.funding_pool += repay_amount
-                    self.jackpot_pool += jackpot_contrib
-                else:
-                    self.jackpot_pool += self.ticket_price * self.pool_insert
+                    self.detail_buffer.append(round_no, player_id, card_idx, ticket_mask, matches, prize_tier, prize)
+                    if sink is not None:
+                        sink.add_ticket(round_no, player_id, card_idx, ticket_mask, winning_mask, matches, prize)
 
-                # 处理彩票
-                bet = self.process_ticket(round_no, player_id, card_idx, winning_nums, winning_str)
-                
-                if bet["matches"] >= 2:
-                    tier_counts[bet["matches"]] += 1
-                    if bet["matches"] < 6:
-                        tier_totals[bet["matches"]] += bet["prize_amount"]
-                
-                if bet["matches"] == 6:
-                    current_jackpots.append(bet)
-                
-                self.detail_buffer.append(bet)
+        # 资金分配只与注数有关，批量计入
+        total_bet_amount = self.apply_contributions(round_no, total_cards)
+        return self.settle_round(round_no, winning_str, num_players, total_cards, total_bet_amount,
+                                 tier_counts, tier_totals, current_jackpots)
 
+    def process_round_counts(self, round_no: int) -> Dict[str, Any]:
+        """只统计注数模式下处理单轮游戏：直接抽样总注数和各奖级注数"""
+        with self.timer.phase("sampling"):
+            rng = self.streams.round_generator(round_no)
+            num_players = int(rng.integers(self.players_range[0], self.players_range[1] + 1))
+            total_cards = sample_total_cards(num_players, self.cards_per_player_range, rng)
+            winning_nums = sample_winning_numbers(rng)
+            winning_mask = numbers_to_mask(winning_nums)
+            winning_str = ",".join(map(str, winning_nums))
+            match_counts = sample_match_counts(total_cards, rng)
+        
+        tier_counts = {tier: 0 for tier in self.prize_map}
+        tier_totals = {tier: 0.0 for tier in self.prize_map}
+        for tier in range(2, 6):
+            tier_counts[tier] = int(match_counts[tier])
+            tier_totals[tier] = tier_counts[tier] * float(self.prize_map[tier])
+        
+        # 资金分配只与注数有关，批量计入
+        total_bet_amount = self.apply_contributions(round_no, total_cards)
+        
+        # 头奖注的号码必然等于中奖号码，玩家信息在该模式下不可知
+        current_jackpots = [{
+            "round": round_no,
+            "player_id": None,
+            "card_id": None,
+            "ticket_mask": winning_mask,
+            "winning_numbers": winning_str,
+            "bet_amount": self.ticket_price,
+            "matches": 6,
+            "prize_tier": None,
+            "prize_amount": 0.0,
+        } for _ in range(int(match_counts[6]))]
+        
+        return self.settle_round(round_no, winning_str, num_players, total_cards, total_bet_amount,
+                                 tier_counts, tier_totals, current_jackpots)
+
+    def process_round_sharded(self, round_no: int) -> Dict[str, Any]:
+        """分片引擎处理单轮游戏：并行生成兑奖，再顺序结算奖池"""
+        round_rng = self.streams.round_generator(round_no)
+        num_players = int(round_rng.integers(self.players_range[0], self.players_range[1] + 1))
+        winning_nums = sample_winning_numbers(round_rng)
+        winning_mask = numbers_to_mask(winning_nums)
+        winning_str = ",".join(map(str, winning_nums))
+        self.detail_buffer.set_winning(round_no, winning_mask)
+        
+        # 第一阶段：各分片独立生成投注并兑奖；写出逐注明细时按分片顺序逐个写出后即释放
+        sink = self.detail_sink if self.detail_sink is not None and self.detail_sink.wants(round_no) else None
+        shards = []
+        shard_results = iter(self._map_shards(simulate_shard,
+                                              self.shard_tasks(round_no, num_players, winning_mask, sink is not None)))
+        while True:
+            with self.timer.phase("shards"):
+                shard = next(shard_results, None)
+            if shard is None:
+                break
+            if sink is not None:
+                with self.timer.phase("detail_sink"):
+                    player_ids, card_idx, masks, matches = shard.pop("all")
+                    sink.add_tickets(round_no, player_ids, card_idx, masks, winning_mask, matches,
+                                      self._prize_amounts[matches])
+            shards.append(shard)
+        
+        # 第二阶段：按分片顺序汇总并结算
+        total_cards = sum(shard["total_cards"] for shard in shards)
+        match_counts = np.zeros(7, dtype=np.int64)
+        for shard in shards:
+            match_counts += shard["match_counts"]
+        tier_counts = {tier: 0 for tier in self.prize_map}
+        tier_totals = {tier: 0.0 for tier in self.prize_map}
+        for tier in range(2, 6):
+            tier_counts[tier] = int(match_counts[tier])
+            tier_totals[tier] = tier_counts[tier] * float(self.prize_map[tier])
+        
+        total_bet_amount = self.apply_contributions(round_no, total_cards)
+        
+        current_jackpots = []
+        for shard in shards:
+            for player_id, card_idx, ticket_mask in zip(shard["jackpot_player_ids"].tolist(),
+                                                         shard["jackpot_card_idx"].tolist(),
+                                                         shard["jackpot_masks"].tolist()):
+                current_jackpots.append(self.bet_record(round_no, player_id, card_idx,
+                                                        ticket_mask, winning_str, 6))
+        
+        # 明细缓冲只保留最后maxlen注，只需从末尾的分片取
+        needed = self.detail_buffer.maxlen
+        tails = []
+        for shard in reversed(shards):
+            if needed <= 0:
+                break
+            take = min(needed, shard["tail_masks"].size)
+            tails.append((shard, take))
+            needed -= take
+        with self.timer.phase("detail_recording"):
+            for shard, take in reversed(tails):
+                if take == 0:
+                    continue
+                matches = shard["tail_matches"][-take:]
+                self.detail_buffer.extend(round_no, shard["tail_player_ids"][-take:], shard["tail_card_idx"][-take:],
+                                          shard["tail_masks"][-take:], matches,
+                                          self._prize_tiers[matches], self._prize_amounts[matches])
+        
+        return self.settle_round(round_no, winning_str, num_players, total_cards, total_bet_amount,
+                                 tier_counts, tier_totals, current_jackpots)
+
+    def shard_tasks(self, round_no: int, num_players: int, winning_mask: int,
+                    full_detail: bool = False) -> List[tuple]:
+        """按SHARD_PLAYERS划分玩家区间，生成各分片的任务参数"""
+        starts = list(range(1, num_players + 1, SHARD_PLAYERS))
+        # 只有末尾若干分片的投注可能进入明细缓冲
+        detail_limits = [0] * len(starts)
+        min_tickets_after = 0
+        for shard_idx in range(len(starts) - 1, -1, -1):
+            if min_tickets_after >= self.detail_buffer.maxlen:
+                break
+            detail_limits[shard_idx] = self.detail_buffer.maxlen
+            shard_players = min(SHARD_PLAYERS, num_players + 1 - starts[shard_idx])
+            min_tickets_after += shard_players * self.cards_per_player_range[0]
+        
+        return [
+            (self.streams, round_no, shard_idx, start, min(start + SHARD_PLAYERS, num_players + 1),
+             self.cards_per_player_range, winning_mask, detail_limits[shard_idx], full_detail)
+            for shard_idx, start in enumerate(starts)
+        ]
+
+    @property
+    def jackpot_pool(self) -> float:
+        return self.pools.jackpot_pool
+
+    @property
+    def funding_pool(self) -> float:
+        return self.pools.funding_pool
+
+    def apply_contributions(self, round_no: int, num_tickets: int) -> float:
+        """批量计入一轮num_tickets注的资金分配，返回总投注额"""
+        with self.timer.phase("pool_accounting"):
+            payoff_ticket = self.pools.contribute(num_tickets)
+        if payoff_ticket is not None and self.funding_cleared_at is None:
+            self.funding_cleared_at = (round_no, payoff_ticket)
+        return self.pools.bet_amount(num_tickets)
+
+    def settle_round(self, round_no: int, winning_str: str, num_players: int, total_cards: int,
+                     total_bet_amount: float, tier_counts: Dict[int, int], tier_totals: Dict[int, float],
+                     current_jackpots: List[dict]) -> Dict[str, Any]:
+        """派发头奖、重置奖池并记录本轮摘要"""
         # 处理头奖
         jackpot_after = self.jackpot_pool
         funding_shortfall = self.funding_pool
@@ -125,13 +382,15 @@ class LotterySimulator:
                 bet["prize_amount"] = share
                 bet["prize_tier"] = 6
                 self.jackpot_list.append(bet)
+            self.detail_buffer.set_jackpot_prize(round_no, share)
+            if self.detail_sink is not None:
+                self.detail_sink.set_jackpot_prize(round_no, share)
             
             tier_counts[6] = len(current_jackpots)
             tier_totals[6] = jackpot_after
             
             # 重置奖池
-            self.jackpot_pool = self.initial_jackpot
-            self.funding_pool -= self.initial_jackpot
+            self.pools.reset_jackpot()
 
         # 计算总派彩和返奖率
         total_payout = sum(tier_totals.values())
@@ -161,6 +420,7 @@ class LotterySimulator:
         }
         
         self.summary_records.append(round_summary)
+        self.timer.sample_memory()
         return round_summary
 
     def run_simulation(self) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
@@ -168,22 +428,43 @@ class LotterySimulator:
         start_time = datetime.now()
         print(f"开始模拟: {start_time}")
         
-        for round_no in range(1, self.num_rounds + 1):
-            self.process_round(round_no)
-            if round_no % 10 == 0:
-                print(f"已完成 {round_no} 轮模拟")
+        # 分片引擎的第一阶段在进程池中执行
+        executor = None
+        if self.engine == "sharded" and not self.counts_only and self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._map_shards = executor.map
+        try:
+            for round_no in range(1, self.num_rounds + 1):
+                self.process_round(round_no)
+                if round_no % 10 == 0:
+                    print(f"已完成 {round_no} 轮模拟")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+                self._map_shards = map
         
         end_time = datetime.now()
         print(f"模拟结束: {end_time}")
         print(f"总耗时: {end_time - start_time}")
         
         # 转换为DataFrame
-        summary_df = pd.DataFrame(self.summary_records)
-        detail_df = pd.DataFrame(list(self.detail_buffer))
-        jackpot_df = pd.DataFrame(self.jackpot_list)
+        with self.timer.phase("dataframe_build"):
+            summary_df = pd.DataFrame(self.summary_records)
+            detail_df = self.detail_buffer.to_dataframe(self.ticket_price)
+            jackpot_df = self.bets_to_dataframe(self.jackpot_list)
+        summary_df.attrs["timings"] = self.timer.to_dict()
         
         return summary_df, detail_df, jackpot_df
 
+    @staticmethod
+    def bets_to_dataframe(bets) -> pd.DataFrame:
+        """把投注记录转换为DataFrame，此时才把号码位掩码还原为字符串"""
+        df = pd.DataFrame(list(bets))
+        if df.empty:
+            return df
+        df["ticket_mask"] = masks_to_strings(df["ticket_mask"].to_numpy(dtype=np.uint64))
+        return df.rename(columns={"ticket_mask": "ticket_numbers"})
+
     def get_simulation_results(self) -> dict:
         """获取模拟结果的JSON格式"""
         if not self.summary_records:
@@ -198,8 +479,10 @@ class LotterySimulator:
         # 计算每个奖级的统计数据
         prize_stats = []
         for tier in range(2, 7):
-            count_col = f"{tier}st_count" if tier == 1 else f"{tier}nd_count" if tier == 2 else f"{tier}rd_count" if tier == 3 else f"{tier}th_count"
-            amount_col = f"{tier}st_amount" if tier == 1 else f"{tier}nd_amount" if tier == 2 else f"{tier}rd_amount" if tier == 3 else f"{tier}th_amount"
+            # 奖级按匹配数编号，概要列按名次命名：匹配6个为一等奖（1st），匹配2个为五等奖（5th）
+            prize_name = PRIZE_NAMES[tier]
+            count_col = f"{prize_name}_count"
+            amount_col = f"{prize_name}_amount"
             
             total_winners = summary_df[count_col].sum()
             total_prize_amount = summary_df[amount_col].sum()
@@ -212,19 +495,17 @@ class LotterySimulator:
                 "avg_winners_per_round": float(avg_winners)
             })
         
-        # 准备图表数据
+        # 准备图表数据，每条曲线降采样到最多CHART_POINTS个点
         charts = {
             "money_comparison": {
                 "data": [
                     {
                         "name": "投注金额",
-                        "x": summary_df['round'].tolist(),
-                        "y": summary_df['total_bet_amount'].tolist()
+                        **chart_series(summary_df, 'total_bet_amount')
                     },
                     {
                         "name": "派彩金额",
-                        "x": summary_df['round'].tolist(),
-                        "y": summary_df['total_payout'].tolist()
+                        **chart_series(summary_df, 'total_payout')
                     }
                 ]
             },
@@ -232,8 +513,7 @@ class LotterySimulator:
                 "data": [
                     {
                         "name": "奖池金额",
-                        "x": summary_df['round'].tolist(),
-                        "y": summary_df['jackpot_after'].tolist()
+                        **chart_series(summary_df, 'jackpot_after')
                     }
                 ]
             },
@@ -241,8 +521,7 @@ class LotterySimulator:
                 "data": [
                     {
                         "name": "玩家数量",
-                        "x": summary_df['round'].tolist(),
-                        "y": summary_df['num_players'].tolist()
+                        **chart_series(summary_df, 'num_players')
                     }
                 ]
             }
@@ -265,21 +544,50 @@ class LotterySimulator:
         }
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="彩票模拟")
+    parser.add_argument("--audit-rounds", type=int, nargs="*", default=None,
+                        help="把这些轮次的全部逐注明细写入--audit-file；不带轮次时写出全部轮次")
+    parser.add_argument("--audit-file", default="bets.parquet",
+                        help="逐注明细文件，扩展名为.arrow时写Arrow IPC，否则写Parquet")
+    parser.add_argument("--output-format", choices=EXPORT_FORMATS, default="csv",
+                        help="summary、last_bets、jackpot_bets结果文件的格式")
+    parser.add_argument("--compression", choices=EXPORT_COMPRESSIONS, default=None,
+                        help="结果文件的压缩算法；Parquet用作列压缩")
+    args = parser.parse_args()
+    # 模拟前检查导出所需的可选依赖，避免模拟结束后才在保存时出错
+    try:
+        check_options(args.output_format, args.compression)
+    except ImportError as e:
+        parser.error(str(e))
+    
+    detail_sink = None
+    if args.audit_rounds is not None:
+        detail_sink = DetailSink(args.audit_file,
+                                 format="arrow" if args.audit_file.endswith(".arrow") else "parquet",
+                                 rounds=args.audit_rounds or None)
+    
     # 设置模拟参数
     simulator = LotterySimulator(
         num_rounds=100,
         players_range=(490000, 510000),
         cards_per_player_range=(9, 11),
-        ticket_price=20.0
+        ticket_price=20.0,
+        detail_sink=detail_sink
     )
     
     # 运行模拟
-    summary_df, detail_df, jackpot_df = simulator.run_simulation()
+    try:
+        summary_df, detail_df, jackpot_df = simulator.run_simulation()
+    finally:
+        if detail_sink is not None:
+            detail_sink.close()
     
-    # 保存结果
-    summary_df.to_csv("summary.csv", index=False)
-    detail_df.to_csv("last_bets.csv", index=False)
-    jackpot_df.to_csv("jackpot_bets.csv", index=False)
+    # 保存结果，逐批编码写出
+    for stem, df in (("summary", summary_df), ("last_bets", detail_df), ("jackpot_bets", jackpot_df)):
+        write_export(export_filename(stem, args.output_format, args.compression), frame_batches(df),
+                     args.output_format, args.compression)
     
     # 获取JSON格式的结果
     results = simulator.get_simulation_results()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+玩家均匀随机选号时的匹配数分布
+
+每注匹配k个号码的概率服从超几何分布 C(6,k)·C(36,6-k) / C(42,6)，
+各注相互独立，因此一轮中各匹配数的注数服从多项分布。
+在不需要逐注明细时，可直接按该分布抽样得到每轮的奖级注数。
+"""
+from math import comb
+from typing import Tuple
+
+import numpy as np
+
+from ticket_mask import MAX_NUMBER, PICK_COUNT
+
+TOTAL_COMBINATIONS = comb(MAX_NUMBER, PICK_COUNT)  # 5,245,786
+
+# MATCH_PROBABILITIES[k]: 一注号码恰好匹配k个中奖号码的精确概率
+MATCH_PROBABILITIES = np.array([
+    comb(PICK_COUNT, k) * comb(MAX_NUMBER - PICK_COUNT, PICK_COUNT - k) / TOTAL_COMBINATIONS
+    for k in range(PICK_COUNT + 1)
+])
+
+
+def sample_total_cards(num_players: int, cards_range: Tuple[int, int],
+                       rng: np.random.Generator) -> int:
+    """
+    抽样num_players个玩家的总购买注数
+
+    每个玩家的注数在cards_range内均匀分布，各注数对应的玩家人数服从多项分布，
+    因此无需逐个玩家抽样，耗时与玩家数量无关。
+    """
+    card_values = np.arange(cards_range[0], cards_range[1] + 1)
+    players_per_value = rng.multinomial(num_players, np.full(card_values.size, 1 / card_values.size))
+    return int(players_per_value @ card_values)
+
+
+def sample_match_counts(n_tickets: int, rng: np.random.Generator) -> np.ndarray:
+    """抽样n_tickets注均匀随机号码中匹配0-6个号码的注数，返回长度为7的数组"""
+    return rng.multinomial(n_tickets, MATCH_PROBABILITIES)
+
+
+def sample_winning_numbers(rng: np.random.Generator) -> list:
+    """抽取一组升序中奖号码"""
+    return sorted(rng.choice(np.arange(1, MAX_NUMBER + 1), PICK_COUNT, replace=False).tolist())
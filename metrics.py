@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus文本格式的监控指标
+
+两个Flask模拟服务（app.py和CF_lotto_c42_6_simulation_v1.py）通过init_app注册
+/metrics端点，输出运行中的任务数、排队深度、每秒轮数、每秒注数、进程RSS、
+各模拟阶段的延迟直方图以及各路由的请求延迟直方图，供现有的抓取程序直接监控吞吐量，
+无需轮询和解析progress.json。
+
+不依赖prometheus_client，按文本暴露格式0.0.4自行输出。各指标用锁保护，
+可在多线程的Flask服务中使用；每个进程维护自己的指标。
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from phase_timer import add_observer, rss_mb
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 模拟阶段延迟的桶（秒），从单轮的抽样到整段DataFrame构建
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# 请求延迟的桶（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# 计算每秒轮数和每秒注数的滑动窗口（秒）
+THROUGHPUT_WINDOW = 60.0
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    """带标签的指标基类"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标{self.name}的标签应为{self.labelnames}，实际为{tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(指标名后缀, 标签串, 值)列表"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}"
+                     for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值，也可以在抓取时由函数计算"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+        self._function = function
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [("", "", float(value))]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """按桶累计观测值的直方图"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> (各桶计数（不累计）, 总和, 次数)
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                samples.append(("_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """按注册顺序输出全部指标"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已注册: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              function: Optional[Callable[[], Optional[float]]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = REQUEST_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """文本暴露格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ThroughputMeter:
+    """滑动窗口内的每秒轮数和每秒注数"""
+
+    def __init__(self, window: float = THROUGHPUT_WINDOW):
+        self.window = window
+        self._events: deque = deque()
+        self._lock = threading.Lock()
+
+    def record(self, rounds: int, tickets: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, rounds, tickets))
+            self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def rates(self) -> Tuple[float, float]:
+        """(每秒轮数, 每秒注数)"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            rounds = sum(event[1] for event in self._events)
+            tickets = sum(event[2] for event in self._events)
+        return rounds / self.window, tickets / self.window
+
+
+REGISTRY = MetricsRegistry()
+THROUGHPUT = ThroughputMeter()
+
+ACTIVE_JOBS = REGISTRY.gauge("lotto_active_jobs", "正在运行的模拟任务数")
+QUEUE_DEPTH = REGISTRY.gauge("lotto_queue_depth", "等待执行的模拟任务（批次）数")
+ROUNDS_TOTAL = REGISTRY.counter("lotto_rounds_total", "已完成的模拟轮数")
+TICKETS_TOTAL = REGISTRY.counter("lotto_tickets_total", "已模拟的注数")
+ROUNDS_PER_SECOND = REGISTRY.gauge("lotto_rounds_per_second", f"最近{THROUGHPUT_WINDOW:.0f}秒内的每秒轮数",
+                                   function=lambda: THROUGHPUT.rates()[0])
+TICKETS_PER_SECOND = REGISTRY.gauge("lotto_tickets_per_second", f"最近{THROUGHPUT_WINDOW:.0f}秒内的每秒注数",
+                                    function=lambda: THROUGHPUT.rates()[1])
+
+
+def _rss_bytes() -> Optional[float]:
+    memory = rss_mb()
+    return None if memory is None else memory * 1024 * 1024
+
+
+PROCESS_RSS = REGISTRY.gauge("lotto_process_resident_memory_bytes", "进程常驻内存（字节）", function=_rss_bytes)
+PHASE_SECONDS = REGISTRY.histogram("lotto_phase_duration_seconds", "模拟各阶段每次计时的耗时（秒）",
+                                   ("phase",), PHASE_BUCKETS)
+REQUEST_SECONDS = REGISTRY.histogram("lotto_http_request_duration_seconds", "各路由的请求耗时（秒）",
+                                     ("route", "method", "status"), REQUEST_BUCKETS)
+
+
+def record_rounds(rounds: int = 1, tickets: int = 0) -> None:
+    """记录完成的轮数和注数"""
+    ROUNDS_TOTAL.inc(rounds)
+    TICKETS_TOTAL.inc(tickets)
+    THROUGHPUT.record(rounds, tickets)
+
+
+@contextmanager
+def track_job():
+    """任务运行期间计入lotto_active_jobs"""
+    ACTIVE_JOBS.inc()
+    try:
+        yield
+    finally:
+        ACTIVE_JOBS.dec()
+
+
+def _observe_phase(name: str, wall: float) -> None:
+    PHASE_SECONDS.observe(wall, phase=name)
+
+
+add_observer(_observe_phase)
+
+
+def init_app(app) -> None:
+    """为Flask应用注册/metrics端点，并统计各路由的请求耗时"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            # 按路由模板分组，避免把路径参数变成高基数标签
+            route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route=route,
+                                    method=request.method, status=str(response.status_code))
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
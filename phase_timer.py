@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+按阶段累计耗时的轻量计时器
+
+模拟的每一轮按阶段（生成投注、兑奖、奖池结算、明细记录、构建DataFrame、
+报告JSON转换等）累计墙钟时间和CPU时间，同时记录内存占用。计时只包在
+整段循环或整块数组运算外面，不进入逐注循环，开销远小于1%。
+
+CPU时间只统计当前进程，进程池中子进程的耗时只体现在墙钟时间里。
+通过add_observer注册的回调在每次阶段计时结束时收到(阶段名, 墙钟时间)，
+供监控指标统计各阶段的延迟分布。
+"""
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:  # 可选依赖
+    psutil = None
+
+
+def rss_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB），没有psutil时返回None"""
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+# 阶段计时结束时的回调
+_observers: List[Callable[[str, float], None]] = []
+
+
+def add_observer(observer: Callable[[str, float], None]) -> None:
+    """注册阶段计时回调，参数为(阶段名, 墙钟时间秒)"""
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def remove_observer(observer: Callable[[str, float], None]) -> None:
+    """注销阶段计时回调"""
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+class _Phase:
+    """一次阶段计时"""
+    __slots__ = ("timer", "name", "wall", "cpu")
+
+    def __init__(self, timer: 'PhaseTimer', name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self) -> '_Phase':
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        wall = time.perf_counter() - self.wall
+        self.timer.add(self.name, wall, time.process_time() - self.cpu)
+        for observer in _observers:
+            observer(self.name, wall)
+
+
+class _NullPhase:
+    """禁用计时时使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullPhase':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class PhaseTimer:
+    """
+    按阶段累计墙钟时间、CPU时间和调用次数
+
+    用法：
+        timer = PhaseTimer()
+        with timer.phase("matching"):
+            ...
+        timer.sample_memory()
+        timer.to_dict()
+    """
+
+    def __init__(self, enabled: bool = True, memory_probe: Optional[Callable[[], Optional[float]]] = rss_mb):
+        """
+        Args:
+            enabled: 为False时phase()不计时，to_dict()只返回空结果
+            memory_probe: 返回当前内存占用（MB）的函数
+        """
+        self.enabled = enabled
+        self.memory_probe = memory_probe
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.memory_mb: Optional[float] = None
+        self.peak_memory_mb: Optional[float] = None
+
+    def phase(self, name: str):
+        """计时一个阶段的上下文管理器"""
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def add(self, name: str, wall: float, cpu: float = 0.0, calls: int = 1) -> None:
+        """累计一个阶段的耗时"""
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = {"wall": 0.0, "cpu": 0.0, "calls": 0}
+        stats["wall"] += wall
+        stats["cpu"] += cpu
+        stats["calls"] += calls
+
+    def sample_memory(self) -> Optional[float]:
+        """记录一次内存占用，返回当前值（MB）"""
+        if not self.enabled or self.memory_probe is None:
+            return None
+        self.memory_mb = self.memory_probe()
+        if self.memory_mb is not None:
+            self.peak_memory_mb = max(self.peak_memory_mb or 0.0, self.memory_mb)
+        return self.memory_mb
+
+    def merge(self, other: 'PhaseTimer') -> None:
+        """合并另一个计时器的结果"""
+        for name, stats in other.phases.items():
+            self.add(name, stats["wall"], stats["cpu"], stats["calls"])
+        if other.peak_memory_mb is not None:
+            self.peak_memory_mb = max(self.peak_memory_mb or 0.0, other.peak_memory_mb)
+            self.memory_mb = other.memory_mb
+
+    def total_wall(self) -> float:
+        return sum(stats["wall"] for stats in self.phases.values())
+
+    def to_dict(self) -> dict:
+        """各阶段的耗时以及内存占用，可直接序列化为JSON"""
+        return {
+            "phases": {name: dict(stats) for name, stats in self.phases.items()},
+            "memory_mb": self.memory_mb,
+            "peak_memory_mb": self.peak_memory_mb,
+        }
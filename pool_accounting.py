@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+奖池与资金池的批量记账
+
+每注投注额的pool_insert比例进入奖池：资金池有欠款（为负）时，其中return_pool比例
+先用于还款，还清后全部进入奖池。一轮内每注的分配只取决于当时的欠款，
+因此整轮的结果可以由注数直接算出，无需逐注累加。
+
+金额一律以分为单位的整数记账，不会产生浮点误差累积。逐注投入额和还款额先四舍五入
+到分（如价格2.0、比例0.387时每注0.774记为77分），结果等于按取整后的逐注金额
+逐注分配；比例与价格之积不是整分时，与不取整的逐注浮点累加略有差异。
+"""
+from typing import Optional
+
+
+def to_cents(amount: float) -> int:
+    """把金额换算为整数分"""
+    return int(round(amount * 100))
+
+
+def from_cents(cents: int) -> float:
+    """把整数分换算为金额"""
+    return cents / 100
+
+
+class PoolAccount:
+    """以分记账的奖池和资金池"""
+
+    def __init__(self, ticket_price: float, pool_insert: float, return_pool: float,
+                 initial_jackpot: float):
+        """
+        Args:
+            ticket_price: 每注价格
+            pool_insert: 每注投入奖池（含还款）的比例
+            return_pool: 资金池有欠款时投入中用于还款的比例
+            initial_jackpot: 初始奖池，同时作为资金池的初始欠款
+        """
+        self.price_cents = to_cents(ticket_price)
+        self.insert_cents = to_cents(ticket_price * pool_insert)
+        self.repay_cents = to_cents(ticket_price * pool_insert * return_pool)
+        self.initial_jackpot_cents = to_cents(initial_jackpot)
+        self.jackpot_cents = self.initial_jackpot_cents
+        self.funding_cents = -self.initial_jackpot_cents
+
+    @property
+    def jackpot_pool(self) -> float:
+        return from_cents(self.jackpot_cents)
+
+    @property
+    def funding_pool(self) -> float:
+        return from_cents(self.funding_cents)
+
+    def bet_amount(self, num_tickets: int) -> float:
+        """num_tickets注的总投注额"""
+        return from_cents(num_tickets * self.price_cents)
+
+    def contribute(self, num_tickets: int) -> Optional[int]:
+        """
+        计入num_tickets注的资金分配，耗时与注数无关
+
+        Returns:
+            本批中还清资金池欠款的那一注的序号（从1开始）；本批没有还清欠款时为None
+        """
+        if num_tickets <= 0:
+            return None
+        if self.funding_cents >= 0 or self.repay_cents <= 0:
+            self.jackpot_cents += num_tickets * self.insert_cents
+            return None
+
+        debt = -self.funding_cents
+        # 足额还款的注数，以及还清欠款所需的注数
+        full_repays = min(num_tickets, debt // self.repay_cents)
+        payoff_ticket = -(-debt // self.repay_cents)
+        if payoff_ticket > num_tickets:
+            # 本批全部足额还款，欠款仍未还清
+            self.funding_cents += num_tickets * self.repay_cents
+            self.jackpot_cents += num_tickets * (self.insert_cents - self.repay_cents)
+            return None
+
+        # 前full_repays注足额还款，第payoff_ticket注还清余款，其后的投入全部进入奖池
+        last_repay = debt - full_repays * self.repay_cents
+        self.funding_cents = 0
+        self.jackpot_cents += (num_tickets * self.insert_cents
+                               - full_repays * self.repay_cents - last_repay)
+        return payoff_ticket
+
+    def reset_jackpot(self) -> None:
+        """头奖派出后重置奖池，注入的初始奖池计为资金池欠款"""
+        self.jackpot_cents = self.initial_jackpot_cents
+        self.funding_cents -= self.initial_jackpot_cents
+
+    def __repr__(self) -> str:
+        return f"PoolAccount(jackpot_pool={self.jackpot_pool:.2f}, funding_pool={self.funding_pool:.2f})"
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+进程内的模拟进度存储
+
+只保存固定数量的计数器（轮次、玩家数、投注额、派奖额、各奖级注数等），
+不保存图表和逐轮详细数据，更新和读取都是O(1)，与模拟已运行多久无关。
+可选地把进度写入JSON文件：按最小间隔限速，先写临时文件再原子替换，
+读取方不会读到写了一半的文件。
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from progress_stream import ProgressBroadcaster
+
+PRIZE_LEVELS = ("1", "2", "3", "4")
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _initial_state() -> Dict[str, Any]:
+    return {
+        "status": "idle",
+        "current_round": 0,
+        "total_rounds": 0,
+        "total_players": 0,
+        "total_bets": 0.0,
+        "total_payouts": 0.0,
+        "jackpot_hits": 0,
+        "prize_counts": {level: 0 for level in PRIZE_LEVELS},
+        "rtp": 0.0,
+        "memory_usage": 0.0,
+        "elapsed_time": "0:00:00",
+        "start_time": None,
+        "last_update": _now(),
+        "message": None,
+    }
+
+
+class ProgressStore:
+    """线程安全的固定大小进度状态"""
+
+    def __init__(self, persist_path: Optional[str] = None, persist_interval: float = 5.0,
+                 broadcaster: Optional[ProgressBroadcaster] = None, channel: str = "simulation"):
+        """
+        Args:
+            persist_path: 进度文件路径，None表示不写磁盘
+            persist_interval: 两次写文件之间的最小间隔（秒）
+            broadcaster: 每次更新后把进度发布到该推送频道
+            channel: 推送频道名
+        """
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval
+        self.broadcaster = broadcaster
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._state = _initial_state()
+        self._last_persist = 0.0
+
+    def reset(self) -> None:
+        """清空进度，并删除进度文件"""
+        with self._lock:
+            self._state = _initial_state()
+        if self.persist_path and os.path.exists(self.persist_path):
+            os.remove(self.persist_path)
+
+    def update(self, force: bool = False, **fields) -> None:
+        """
+        更新若干字段
+
+        Args:
+            force: 立即推送并写文件（不受限速影响），用于开始、结束等状态变化
+            fields: 要更新的字段，prize_counts可只包含部分奖级
+        """
+        with self._lock:
+            prize_counts = fields.pop("prize_counts", None)
+            if prize_counts is not None:
+                self._state["prize_counts"].update({str(k): int(v) for k, v in prize_counts.items()})
+            self._state.update(fields)
+            self._state["last_update"] = _now()
+            state = self._snapshot()
+        if self.broadcaster is not None:
+            self.broadcaster.publish(self.channel, state, force)
+        self.maybe_persist(force)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        state = dict(self._state)
+        state["prize_counts"] = dict(state["prize_counts"])
+        total_rounds = state["total_rounds"]
+        state["completion_percentage"] = state["current_round"] / total_rounds * 100 if total_rounds > 0 else 0
+        return state
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前进度的副本（一层字典，prize_counts除外）"""
+        with self._lock:
+            return self._snapshot()
+
+    def maybe_persist(self, force: bool = False) -> bool:
+        """距上次写文件超过persist_interval（或force）时写入进度文件，返回是否写入"""
+        if not self.persist_path:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_persist < self.persist_interval:
+                return False
+            self._last_persist = now
+            state = self._snapshot()
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".progress_", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self.persist_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+用Server-Sent Events推送模拟进度
+
+模拟循环调用ProgressBroadcaster.publish更新某个频道（任务ID或服务名）的进度状态，
+每个订阅的浏览器连接由sse_response生成的事件流在内存中读取状态，
+先收到一次完整快照（snapshot），之后只收到变化的字段（progress），
+任务结束时收到done事件。推送频率由min_interval限制，与订阅数量无关，
+订阅再多也不会增加磁盘读取或模拟循环的开销。
+
+推送间隔默认1秒，可通过环境变量LOTTO_PROGRESS_INTERVAL设置。
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from serialization import dumps
+
+# 两次推送之间的最小间隔（秒）
+STREAM_INTERVAL = float(os.environ.get("LOTTO_PROGRESS_INTERVAL", "1.0"))
+# 没有新进度时发送注释行保持连接的间隔（秒）
+HEARTBEAT_INTERVAL = 15.0
+# 表示任务已结束的状态
+DONE_STATUSES = ("finished", "failed", "completed", "error")
+
+
+def _format_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+def state_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """current中与previous不同的字段"""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+class ProgressBroadcaster:
+    """按频道保存最新进度，并限速通知订阅者"""
+
+    def __init__(self, min_interval: float = STREAM_INTERVAL):
+        """
+        Args:
+            min_interval: 两次推送之间的最小间隔（秒）
+        """
+        self.min_interval = min_interval
+        self._states: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._condition = threading.Condition()
+        self._last_notify = 0.0
+
+    def publish(self, channel: str, state: Dict[str, Any], force: bool = False) -> None:
+        """
+        更新频道的进度状态（一层字典，值需可序列化为JSON）
+
+        距上次通知不足min_interval时只更新状态，订阅者在下一个间隔到来时读取；
+        force=True时立即通知，用于开始、结束等状态变化。
+        """
+        with self._condition:
+            version = self._states.get(channel, (0, None))[0] + 1
+            self._states[channel] = (version, dict(state))
+            now = time.monotonic()
+            if force or now - self._last_notify >= self.min_interval:
+                self._last_notify = now
+                self._condition.notify_all()
+
+    def get(self, channel: str) -> Optional[Dict[str, Any]]:
+        """频道的最新状态"""
+        with self._condition:
+            entry = self._states.get(channel)
+        return dict(entry[1]) if entry else None
+
+    def discard(self, channel: str) -> None:
+        """移除频道"""
+        with self._condition:
+            self._states.pop(channel, None)
+            self._condition.notify_all()
+
+    def subscribe(self, channel: str, heartbeat: float = HEARTBEAT_INTERVAL) -> Iterator[str]:
+        """
+        频道的SSE事件流
+
+        依次产生snapshot事件（完整状态）、progress事件（变化的字段）和done事件，
+        较长时间没有变化时产生注释行作为心跳。
+        """
+        sent_version = 0
+        sent_state: Dict[str, Any] = {}
+        last_sent = 0.0
+        last_output = time.monotonic()
+        while True:
+            with self._condition:
+                entry = self._states.get(channel)
+                if entry is None or entry[0] == sent_version:
+                    wait = self.min_interval
+                else:
+                    # 有新状态但距上次推送不足min_interval
+                    wait = last_sent + self.min_interval - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(timeout=wait)
+                    entry = self._states.get(channel)
+            now = time.monotonic()
+            if entry is not None and entry[0] != sent_version and now - last_sent >= self.min_interval:
+                version, state = entry
+                if not sent_state:
+                    yield _format_event("snapshot", state)
+                else:
+                    delta = state_delta(sent_state, state)
+                    if delta:
+                        yield _format_event("progress", delta)
+                sent_version, sent_state, last_sent = version, state, now
+                last_output = now
+                if state.get("status") in DONE_STATUSES:
+                    yield _format_event("done", {"status": state["status"]})
+                    return
+            elif now - last_output >= heartbeat:
+                last_output = now
+                yield ": keep-alive\n\n"
+
+
+def sse_response(broadcaster: ProgressBroadcaster, channel: str):
+    """Flask流式响应，推送频道的进度事件"""
+    from flask import Response, stream_with_context
+
+    return Response(stream_with_context(broadcaster.subscribe(channel)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+蒙特卡洛重复模拟
+
+同一组参数以R个不同的随机种子独立运行，在进程池中并行执行，每完成一次即合并结果，
+给出各指标逐轮以及整体的均值、标准差和95%置信区间，用于评估RTP、头奖中出次数、
+资金池缺口等指标的随机波动。
+"""
+import argparse
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from math import sqrt
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ENTRY_POINTS = ("simulation", "lottery_simulator", "lottery_simulator_new", "cf")
+
+# 双侧95%置信区间的t分布临界值，自由度超过30时使用正态近似
+_T_CRITICAL_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+def t_critical_95(dof: int) -> float:
+    """自由度为dof的t分布双侧95%临界值"""
+    if dof < 1:
+        return float('nan')
+    return _T_CRITICAL_95[dof - 1] if dof <= len(_T_CRITICAL_95) else 1.96
+
+
+def run_entry_point(entry_point: str, seed: int, params: Dict[str, Any]) -> pd.DataFrame:
+    """以指定种子运行一次模拟，返回每轮概要数据"""
+    # 各入口按(种子, 轮次)生成随机数流；未接入种子的代码路径仍使用全局random模块
+    random.seed(seed)
+    if entry_point == "simulation":
+        from simulation import simulate_lottery
+        summary_df, _, _ = simulate_lottery(seed=seed, **params)
+    elif entry_point == "lottery_simulator":
+        from lottery_simulator import LotterySimulator
+        summary_df, _, _ = LotterySimulator(seed=seed, **params).run_simulation()
+    elif entry_point == "lottery_simulator_new":
+        from lottery_simulator_new import LotterySimulator
+        summary_df, _, _ = LotterySimulator(seed=seed, **params).run_simulation()
+    elif entry_point == "cf":
+        from CF_lotto_c42_6_simulation_v1 import simulate_lottery
+        summary_df, _, _ = simulate_lottery(seed=seed, **params)
+    else:
+        raise ValueError(f"未知的模拟入口: {entry_point}")
+    return summary_df
+
+
+def extract_metrics(summary_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    从各引擎的每轮概要数据中提取统一的指标
+
+    Returns:
+        以轮次为索引，包含rtp、jackpot_hits、jackpot_after、total_bet_amount、
+        total_payout以及（如有）funding_pool_shortfall列的DataFrame
+    """
+    jackpot_col = '1st_count' if '1st_count' in summary_df else '1th_count'
+    metrics = pd.DataFrame({
+        'rtp': summary_df['total_payout'] / summary_df['total_bet_amount'],
+        'jackpot_hits': summary_df[jackpot_col],
+        'jackpot_after': summary_df['jackpot_after'],
+        'total_bet_amount': summary_df['total_bet_amount'],
+        'total_payout': summary_df['total_payout'],
+    })
+    if 'funding_pool_shortfall' in summary_df:
+        metrics['funding_pool_shortfall'] = summary_df['funding_pool_shortfall']
+    metrics.index = summary_df['round'].to_numpy()
+    metrics.index.name = 'round'
+    return metrics.astype(float)
+
+
+def overall_metrics(metrics: pd.DataFrame) -> Dict[str, float]:
+    """单次运行的整体指标"""
+    overall = {
+        'rtp': metrics['total_payout'].sum() / metrics['total_bet_amount'].sum(),
+        'jackpot_hits': metrics['jackpot_hits'].sum(),
+        'final_jackpot': metrics['jackpot_after'].iloc[-1],
+        'total_bet_amount': metrics['total_bet_amount'].sum(),
+        'total_payout': metrics['total_payout'].sum(),
+    }
+    if 'funding_pool_shortfall' in metrics:
+        overall['min_funding_pool_shortfall'] = metrics['funding_pool_shortfall'].min()
+        overall['final_funding_pool_shortfall'] = metrics['funding_pool_shortfall'].iloc[-1]
+    return {key: float(value) for key, value in overall.items()}
+
+
+def _summarize(count: int, mean: np.ndarray, m2: np.ndarray) -> Dict[str, np.ndarray]:
+    """由Welford累积量计算均值、标准差和95%置信区间"""
+    std = np.sqrt(m2 / (count - 1)) if count > 1 else np.full_like(mean, np.nan)
+    half_width = t_critical_95(count - 1) * std / sqrt(count)
+    return {'mean': mean, 'std': std, 'ci_low': mean - half_width, 'ci_high': mean + half_width}
+
+
+class ReplicationAggregate:
+    """以Welford算法逐次合并多次运行的结果，内存占用与运行次数无关"""
+
+    def __init__(self):
+        self.count = 0
+        self.columns: List[str] = []
+        self.rounds: Optional[np.ndarray] = None
+        self._round_mean = None
+        self._round_m2 = None
+        self._overall_keys: List[str] = []
+        self._overall_mean = None
+        self._overall_m2 = None
+
+    def add(self, metrics: pd.DataFrame) -> None:
+        """合并一次运行的逐轮指标"""
+        overall = overall_metrics(metrics)
+        if self.count == 0:
+            self.columns = list(metrics.columns)
+            self.rounds = metrics.index.to_numpy()
+            self._round_mean = np.zeros((len(metrics), len(self.columns)))
+            self._round_m2 = np.zeros_like(self._round_mean)
+            self._overall_keys = list(overall)
+            self._overall_mean = np.zeros(len(self._overall_keys))
+            self._overall_m2 = np.zeros_like(self._overall_mean)
+        elif len(metrics) != len(self.rounds):
+            raise ValueError("各次运行的轮数必须一致")
+
+        self.count += 1
+        values = metrics[self.columns].to_numpy(dtype=float)
+        delta = values - self._round_mean
+        self._round_mean += delta / self.count
+        self._round_m2 += delta * (values - self._round_mean)
+
+        values = np.array([overall[key] for key in self._overall_keys])
+        delta = values - self._overall_mean
+        self._overall_mean += delta / self.count
+        self._overall_m2 += delta * (values - self._overall_mean)
+
+    def per_round(self) -> pd.DataFrame:
+        """逐轮统计，列名形如rtp_mean、rtp_std、rtp_ci_low、rtp_ci_high"""
+        if self.count == 0:
+            return pd.DataFrame()
+        stats = _summarize(self.count, self._round_mean, self._round_m2)
+        data = {'round': self.rounds}
+        for i, column in enumerate(self.columns):
+            for name, values in stats.items():
+                data[f'{column}_{name}'] = values[:, i]
+        return pd.DataFrame(data)
+
+    def overall(self) -> pd.DataFrame:
+        """整体统计，每个指标一行"""
+        if self.count == 0:
+            return pd.DataFrame()
+        stats = _summarize(self.count, self._overall_mean, self._overall_m2)
+        df = pd.DataFrame(stats, index=self._overall_keys)
+        df.index.name = 'metric'
+        df['n'] = self.count
+        return df
+
+
+def replication_seeds(n_replications: int, base_seed: Optional[int] = None) -> List[int]:
+    """由基础种子派生各次运行互不相关的种子"""
+    children = np.random.SeedSequence(base_seed).spawn(n_replications)
+    return [int(child.generate_state(1, dtype=np.uint32)[0]) for child in children]
+
+
+def _run_replication(entry_point: str, seed: int, params: Dict[str, Any]) -> pd.DataFrame:
+    """进程池任务：运行一次模拟并提取指标"""
+    return extract_metrics(run_entry_point(entry_point, seed, params))
+
+
+def iter_replications(entry_point: str, n_replications: int, params: Optional[Dict[str, Any]] = None,
+                      base_seed: Optional[int] = None,
+                      workers: Optional[int] = None) -> Iterator[Tuple[int, pd.DataFrame, ReplicationAggregate]]:
+    """
+    并行执行n_replications次独立模拟，每完成一次即产出合并后的结果
+
+    Args:
+        entry_point: 模拟入口，取值见ENTRY_POINTS
+        n_replications: 运行次数R
+        params: 传给模拟入口的参数（不含seed）
+        base_seed: 基础种子，相同时各次运行的种子相同
+        workers: 进程数，默认为CPU核数；为1时在当前进程中依次执行
+
+    Yields:
+        (运行序号, 该次运行的逐轮指标, 截至目前的合并结果)
+    """
+    if entry_point not in ENTRY_POINTS:
+        raise ValueError(f"未知的模拟入口: {entry_point}")
+    params = params or {}
+    seeds = replication_seeds(n_replications, base_seed)
+    aggregate = ReplicationAggregate()
+
+    if workers == 1:
+        for index, seed in enumerate(seeds):
+            metrics = _run_replication(entry_point, seed, params)
+            aggregate.add(metrics)
+            yield index, metrics, aggregate
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_run_replication, entry_point, seed, params): index
+                   for index, seed in enumerate(seeds)}
+        for future in as_completed(futures):
+            metrics = future.result()
+            aggregate.add(metrics)
+            yield futures[future], metrics, aggregate
+
+
+def run_replications(entry_point: str, n_replications: int, params: Optional[Dict[str, Any]] = None,
+                     base_seed: Optional[int] = None, workers: Optional[int] = None) -> ReplicationAggregate:
+    """执行全部重复模拟并返回合并结果"""
+    aggregate = ReplicationAggregate()
+    for _, _, aggregate in iter_replications(entry_point, n_replications, params, base_seed, workers):
+        pass
+    return aggregate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="蒙特卡洛重复模拟")
+    parser.add_argument("entry_point", choices=ENTRY_POINTS)
+    parser.add_argument("-R", "--replications", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--players", type=int, nargs=2, default=(190000, 210000))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    players_range = tuple(args.players)
+    params = {
+        "simulation": {"num_rounds": args.rounds, "players_range": players_range, "engine": "numpy"},
+        "lottery_simulator": {"num_rounds": args.rounds, "players_range": players_range,
+                              "cards_range": (9, 11), "ticket_price": 20.0, "counts_only": True},
+        "lottery_simulator_new": {"num_rounds": args.rounds, "players_range": players_range,
+                                  "engine": "sharded"},
+        "cf": {"num_rounds": args.rounds, "players_range": players_range,
+               "cards_per_player_range": (9, 11)},
+    }[args.entry_point]
+
+    for index, _, aggregate in iter_replications(args.entry_point, args.replications, params,
+                                                 args.seed, args.workers):
+        print(f"已完成第 {aggregate.count}/{args.replications} 次运行（序号 {index}）")
+    print(aggregate.overall().to_string())
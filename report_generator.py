@@ -1,7 +1,72 @@
 import pandas as pd
 import numpy as np
+from typing import Optional
+from phase_timer import PhaseTimer
+from chart_downsample import CHART_POINTS, downsample_indices
+from serialization import typed_array
 
-def generate_report(summary_df: pd.DataFrame, detail_df: pd.DataFrame, jackpot_df: pd.DataFrame) -> dict:
+# 奖池和资金池缺口在头奖派发时骤变，降采样用最小/最大包络保留尖峰，其余曲线用LTTB
+ENVELOPE_COLUMNS = ('jackpot_after', 'funding_pool_shortfall')
+
+# 各轮次趋势图的曲线对应的summary_df列，按曲线顺序排列
+CHART_COLUMNS = {
+    'jackpot_trend': ('jackpot_after',),
+    'money_comparison': ('total_bet_amount', 'total_payout'),
+    'players_trend': ('num_players',),
+}
+
+def chart_series(summary_df: pd.DataFrame, column: str, points: Optional[int] = CHART_POINTS) -> dict:
+    """
+    按轮次的曲线数据{'x': 轮次, 'y': 列值}，x和y编码为类型数组（serialization.typed_array）
+    
+    Args:
+        summary_df: 每轮概要数据
+        column: 曲线对应的列
+        points: 目标点数，None表示全分辨率
+    """
+    method = 'minmax' if column in ENVELOPE_COLUMNS else 'lttb'
+    x = summary_df['round'].to_numpy()
+    y = summary_df[column].to_numpy()
+    indices = downsample_indices(x, y, points, method)
+    return {'x': typed_array(x[indices]), 'y': typed_array(y[indices])}
+
+def chart_source(summary_df: pd.DataFrame) -> pd.DataFrame:
+    """缩放查询所需的列：轮次和各趋势图曲线对应的列"""
+    columns = ['round'] + [column for columns in CHART_COLUMNS.values() for column in columns
+                           if column in summary_df] + [column for column in ENVELOPE_COLUMNS if column in summary_df]
+    return summary_df[list(dict.fromkeys(columns))].copy()
+
+def zoom_chart(summary_df: pd.DataFrame, chart: str, start_round: Optional[int] = None,
+               end_round: Optional[int] = None, points: Optional[int] = None) -> dict:
+    """
+    某个趋势图在轮次范围内的曲线数据，默认全分辨率
+    
+    Args:
+        summary_df: 每轮概要数据（至少包含chart_source的列）
+        chart: CHART_COLUMNS中的图表名
+        start_round, end_round: 轮次范围（含两端），None表示不限
+        points: 每条曲线的目标点数，None表示全分辨率
+        
+    Returns:
+        {'chart', 'start_round', 'end_round', 'data': [{'x', 'y'}, ...]}，曲线顺序与报告中的图表一致
+    """
+    if chart not in CHART_COLUMNS:
+        raise ValueError(f"未知的图表: {chart}，可选{', '.join(CHART_COLUMNS)}")
+    mask = np.ones(len(summary_df), dtype=bool)
+    if start_round is not None:
+        mask &= summary_df['round'].to_numpy() >= start_round
+    if end_round is not None:
+        mask &= summary_df['round'].to_numpy() <= end_round
+    selected = summary_df[mask]
+    return {
+        'chart': chart,
+        'start_round': start_round,
+        'end_round': end_round,
+        'data': [chart_series(selected, column, points) for column in CHART_COLUMNS[chart]]
+    }
+
+def generate_report(summary_df: pd.DataFrame, detail_df: pd.DataFrame, jackpot_df: pd.DataFrame,
+                    timer: Optional[PhaseTimer] = None) -> dict:
     """
     生成模拟报告数据
     
@@ -9,83 +74,87 @@ def generate_report(summary_df: pd.DataFrame, detail_df: pd.DataFrame, jackpot_d
         summary_df: 每轮概要数据
         detail_df: 最后一轮详细数据
         jackpot_df: 一等奖记录
+        timer: 分阶段计时器，传入模拟器的计时器时报告各阶段耗时与模拟阶段合并
         
     Returns:
-        包含统计数据、图表数据和表格数据的字典
+        包含统计数据、图表数据、表格数据以及各阶段耗时（timings）的字典；
+        每条曲线最多CHART_POINTS个点，全分辨率数据通过zoom_chart按轮次范围获取
     """
-    # 计算基础统计数据
-    summary_stats = {
-        'total_rounds': len(summary_df),
-        'avg_players': summary_df['num_players'].mean(),
-        'avg_cards': summary_df['total_cards'].mean() / summary_df['num_players'].mean(),
-        'total_bet_amount': summary_df['total_bet_amount'].sum(),
-        'total_payout': summary_df['total_payout'].sum(),
-        'jackpot_hits': summary_df['1st_count'].sum(),
-        'average_rtp': (summary_df['total_payout'].sum() / summary_df['total_bet_amount'].sum()) * 100
-    }
+    timer = timer if timer is not None else PhaseTimer()
     
-    # 生成奖池变化趋势图数据
-    jackpot_trend = {
-        'data': [{
-            'x': summary_df['round'].tolist(),
-            'y': summary_df['jackpot_after'].tolist(),
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': '奖池金额',
-            'line': {'color': 'rgb(55, 83, 109)'}
-        }],
-        'layout': {
-            'title': '奖池金额变化趋势',
-            'xaxis': {'title': '轮次'},
-            'yaxis': {'title': '金额（元）'},
-            'showlegend': True
+    # 计算基础统计数据
+    with timer.phase('report_stats'):
+        summary_stats = {
+            'total_rounds': len(summary_df),
+            'avg_players': float(summary_df['num_players'].mean()),
+            'avg_cards': float(summary_df['total_cards'].mean() / summary_df['num_players'].mean()),
+            'total_bet_amount': float(summary_df['total_bet_amount'].sum()),
+            'total_payout': float(summary_df['total_payout'].sum()),
+            'jackpot_hits': int(summary_df['1st_count'].sum()),
+            'average_rtp': float(summary_df['total_payout'].sum() / summary_df['total_bet_amount'].sum() * 100)
         }
-    }
     
-    # 生成投注和派奖金额对比图数据
-    money_comparison = {
-        'data': [
-            {
-                'x': summary_df['round'].tolist(),
-                'y': summary_df['total_bet_amount'].tolist(),
-                'type': 'scatter',
-                'mode': 'lines',
-                'name': '总投注金额',
-                'line': {'color': 'rgb(26, 118, 255)'}
-            },
-            {
-                'x': summary_df['round'].tolist(),
-                'y': summary_df['total_payout'].tolist(),
+    # 生成奖池变化趋势图数据
+    with timer.phase('report_charts'):
+        jackpot_trend = {
+            'data': [{
+                **chart_series(summary_df, 'jackpot_after'),
                 'type': 'scatter',
                 'mode': 'lines',
-                'name': '总派奖金额',
-                'line': {'color': 'rgb(219, 64, 82)'}
+                'name': '奖池金额',
+                'line': {'color': 'rgb(55, 83, 109)'}
+            }],
+            'layout': {
+                'title': '奖池金额变化趋势',
+                'xaxis': {'title': '轮次'},
+                'yaxis': {'title': '金额（元）'},
+                'showlegend': True
+            }
+        }
+    
+        # 生成投注和派奖金额对比图数据
+        money_comparison = {
+            'data': [
+                {
+                    **chart_series(summary_df, 'total_bet_amount'),
+                    'type': 'scatter',
+                    'mode': 'lines',
+                    'name': '总投注金额',
+                    'line': {'color': 'rgb(26, 118, 255)'}
+                },
+                {
+                    **chart_series(summary_df, 'total_payout'),
+                    'type': 'scatter',
+                    'mode': 'lines',
+                    'name': '总派奖金额',
+                    'line': {'color': 'rgb(219, 64, 82)'}
+                }
+            ],
+            'layout': {
+                'title': '投注和派奖金额对比',
+                'xaxis': {'title': '轮次'},
+                'yaxis': {'title': '金额（元）'},
+                'showlegend': True
             }
-        ],
-        'layout': {
-            'title': '投注和派奖金额对比',
-            'xaxis': {'title': '轮次'},
-            'yaxis': {'title': '金额（元）'},
-            'showlegend': True
         }
-    }
     
     # 计算各奖级统计数据
-    prize_stats = []
-    for i, prize_level in enumerate(['1st', '2nd', '3rd', '4th', '5th'], 1):
-        count_col = f'{prize_level}_count'
-        amount_col = f'{prize_level}_amount'
-        total_winners = summary_df[count_col].sum()
-        total_amount = summary_df[amount_col].sum()
+    with timer.phase('report_stats'):
+        prize_stats = []
+        for i, prize_level in enumerate(['1st', '2nd', '3rd', '4th', '5th'], 1):
+            count_col = f'{prize_level}_count'
+            amount_col = f'{prize_level}_amount'
+            total_winners = summary_df[count_col].sum()
+            total_amount = summary_df[amount_col].sum()
         
-        prize_stats.append({
-            'prize_level': i,
-            'total_winners': int(total_winners),
-            'total_amount': float(total_amount),
-            'avg_winners_per_round': float(total_winners / len(summary_df)),
-            'probability': float(total_winners / summary_df['total_cards'].sum()),
-            'rtp': float(total_amount / summary_df['total_bet_amount'].sum() * 100)
-        })
+            prize_stats.append({
+                'prize_level': i,
+                'total_winners': int(total_winners),
+                'total_amount': float(total_amount),
+                'avg_winners_per_round': float(total_winners / len(summary_df)),
+                'probability': float(total_winners / summary_df['total_cards'].sum()),
+                'rtp': float(total_amount / summary_df['total_bet_amount'].sum() * 100)
+            })
     
     # 整合所有数据
     report_data = {
@@ -96,22 +165,13 @@ def generate_report(summary_df: pd.DataFrame, detail_df: pd.DataFrame, jackpot_d
         },
         'tables': {
             'prize_stats': prize_stats
+        },
+        'chart_resolution': {
+            'total_rounds': len(summary_df),
+            'points_per_trace': CHART_POINTS
         }
     }
     
-    # 确保所有数值都是Python原生类型
-    def convert_to_native_types(obj):
-        if isinstance(obj, (np.int64, np.int32, np.int16, np.int8)):
-            return int(obj)
-        if isinstance(obj, (np.float64, np.float32)):
-            return float(obj)
-        if isinstance(obj, dict):
-            return {key: convert_to_native_types(value) for key, value in obj.items()}
-        if isinstance(obj, list):
-            return [convert_to_native_types(item) for item in obj]
-        return obj
-
-    # 转换所有数据为Python原生类型
-    report_data = convert_to_native_types(report_data)
+    report_data['timings'] = timer.to_dict()
     
     return report_data
\ No newline at end of file
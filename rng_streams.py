@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+按(种子, 轮次, 分片)直接定位的随机数流
+
+基于计数器型生成器Philox：密钥由运行种子确定，计数器的高两个字写入分片号和轮次，
+每个(轮次, 分片)因此对应一段互不重叠的独立随机数流（每段可用2**128个块）。
+任意一轮都可以直接重建其随机数流单独重新模拟，无需重放之前的轮次；
+轮次和分片在多个进程之间如何划分也不影响结果。
+"""
+import random
+from typing import Optional
+
+import numpy as np
+
+# 每轮公共随机数（玩家数、中奖号码等）使用的分片号，分片i使用i + 1
+ROUND_STREAM = 0
+
+
+class RNGStreams:
+    """一次模拟运行的全部随机数流"""
+
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Args:
+            seed: 运行种子，未指定时随机生成；记录在self.seed中，可用于复现整次运行
+        """
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.key = np.random.SeedSequence(self.seed).generate_state(2, dtype=np.uint64)
+
+    def generator(self, round_no: int, stream: int = ROUND_STREAM) -> np.random.Generator:
+        """(轮次, 流编号)对应的numpy随机数生成器"""
+        counter = np.array([0, 0, stream, round_no], dtype=np.uint64)
+        return np.random.Generator(np.random.Philox(counter=counter, key=self.key))
+
+    def round_generator(self, round_no: int) -> np.random.Generator:
+        """一轮公共随机数的生成器"""
+        return self.generator(round_no, ROUND_STREAM)
+
+    def shard_generator(self, round_no: int, shard_idx: int) -> np.random.Generator:
+        """一轮中第shard_idx个分片的生成器"""
+        return self.generator(round_no, shard_idx + 1)
+
+    def python_random(self, round_no: int, stream: int = ROUND_STREAM) -> random.Random:
+        """供逐注引擎使用的random.Random实例，种子取自(轮次, 流编号)对应的流"""
+        return random.Random(int(self.generator(round_no, stream).integers(2 ** 63)))
+
+    def __repr__(self) -> str:
+        return f"RNGStreams(seed={self.seed})"
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+结果序列化
+
+- 数值序列（图表曲线等）编码为类型数组：{"dtype": "f8", "bdata": 小端字节的base64}，
+  与Plotly.js的类型数组格式相同。10万个float64约1.1MB，编码只需一次内存拷贝，
+  浏览器用atob和TypedArray直接还原，不用逐个数字解析。
+- JSON只用于摘要等较小的标量数据。FastJSONProvider直接编码NumPy标量、数组、
+  pandas对象和日期时间，不再预先递归遍历整个结果字典转换类型；无法识别的类型报错，
+  不静默转为字符串。安装了orjson时用orjson编码。
+- 需要整张表的全分辨率数据时，用arrow_response以Arrow IPC流返回（依赖pyarrow）。
+"""
+import base64
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # 可选依赖
+    pa = None
+
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+# 类型数组的dtype代码，与Plotly.js和JavaScript的TypedArray对应（没有64位整数）
+TYPED_ARRAY_CODES = {
+    np.dtype("float64"): "f8",
+    np.dtype("float32"): "f4",
+    np.dtype("int32"): "i4",
+    np.dtype("uint32"): "u4",
+    np.dtype("int16"): "i2",
+    np.dtype("uint16"): "u2",
+    np.dtype("int8"): "i1",
+    np.dtype("uint8"): "u1",
+}
+_CODE_DTYPES = {code: dtype for dtype, code in TYPED_ARRAY_CODES.items()}
+
+_INT32 = np.iinfo(np.int32)
+
+
+def _typed_dtype(arr: np.ndarray) -> np.dtype:
+    """JavaScript能表示的最接近的dtype"""
+    if arr.dtype in TYPED_ARRAY_CODES:
+        return arr.dtype
+    if arr.dtype.kind == "b":
+        return np.dtype("uint8")
+    if arr.dtype.kind in "iu":
+        # 64位整数：数值在int32范围内时用int32，否则用float64
+        if arr.size == 0 or (arr.min() >= _INT32.min and arr.max() <= _INT32.max):
+            return np.dtype("int32")
+        return np.dtype("float64")
+    if arr.dtype.kind == "f":
+        return np.dtype("float64")
+    raise ValueError(f"无法编码为类型数组的dtype: {arr.dtype}")
+
+
+def typed_array(values) -> Dict[str, str]:
+    """把一维数值序列编码为{"dtype", "bdata"}"""
+    arr = np.asarray(values)
+    if arr.ndim != 1:
+        raise ValueError(f"类型数组只支持一维数据，实际为{arr.ndim}维")
+    dtype = _typed_dtype(arr)
+    arr = np.ascontiguousarray(arr, dtype=dtype.newbyteorder("<"))
+    return {"dtype": TYPED_ARRAY_CODES[dtype], "bdata": base64.b64encode(arr.tobytes()).decode("ascii")}
+
+
+def decode_typed_array(value: Dict[str, str]) -> np.ndarray:
+    """typed_array的逆变换"""
+    dtype = _CODE_DTYPES[value["dtype"]].newbyteorder("<")
+    return np.frombuffer(base64.b64decode(value["bdata"]), dtype=dtype)
+
+
+def json_default(obj: Any) -> Any:
+    """JSON编码器的default钩子，处理标准库json无法编码的常见类型"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, (datetime, date, timedelta)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"无法序列化为JSON的类型: {type(obj).__name__}")
+
+
+def dumps(obj: Any, indent: Optional[int] = None) -> str:
+    """
+    编码为JSON字符串，字典的非字符串键转为字符串
+
+    Args:
+        indent: None时输出紧凑格式，2时缩进两个空格（orjson只支持这两种）
+    """
+    if orjson is not None:
+        if indent not in (None, 2):
+            raise ValueError(f"orjson只支持缩进2个空格，实际为{indent}")
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=json_default, option=option).decode("utf-8")
+    import json
+    separators = (",", ":") if indent is None else None
+    return json.dumps(obj, default=json_default, ensure_ascii=False, indent=indent, separators=separators)
+
+
+def _json_provider_class():
+    from flask.json.provider import DefaultJSONProvider
+
+    class FastJSONProvider(DefaultJSONProvider):
+        """直接编码NumPy、pandas和日期时间类型的Flask JSON提供者"""
+        default = staticmethod(json_default)
+        ensure_ascii = False
+        sort_keys = False
+
+        def dumps(self, obj: Any, **kwargs) -> str:
+            # jsonify总会传入紧凑格式的separators，调试模式下改为indent=2；
+            # 这两种情况走dumps，其他参数交给标准库json
+            options = dict(kwargs)
+            indent = options.pop("indent", None)
+            separators = options.pop("separators", None)
+            if not options and indent in (None, 2) and (separators is None or tuple(separators) == (",", ":")):
+                return dumps(obj, indent=indent)
+            return super().dumps(obj, **kwargs)
+
+    return FastJSONProvider
+
+
+def init_app(app) -> None:
+    """让Flask应用的jsonify使用FastJSONProvider"""
+    app.json = _json_provider_class()(app)
+
+
+def arrow_response(df: pd.DataFrame, filename: Optional[str] = None):
+    """把DataFrame以Arrow IPC流格式返回"""
+    from flask import Response
+
+    if pa is None:
+        raise ImportError("返回Arrow IPC数据需要安装pyarrow")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa_ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'} if filename else {}
+    return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_MIMETYPE, headers=headers)
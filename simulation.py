@@ -2,15 +2,24 @@
 import random
 import pandas as pd
 import numpy as np
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
+from ticket_mask import (numbers_to_mask, match_count, random_ticket_masks,
+                         count_matches, masks_to_array, mask_to_numbers)
+from match_distribution import sample_winning_numbers
+from rng_streams import RNGStreams
+from kernels import KERNEL_BACKEND, play_round
+from phase_timer import PhaseTimer
 
-def generate_random_numbers() -> List[int]:
-    """生成一组6个不重复的随机数（1-42）"""
-    return random.sample(range(1, 43), 6)
+# numpy引擎每次批量生成的彩票数量上限，用于限制单轮的内存峰值
+TICKET_CHUNK_SIZE = 1_000_000
+
+def generate_random_numbers(rnd=random) -> List[int]:
+    """生成一组6个不重复的随机数（1-42），rnd为random模块或random.Random实例"""
+    return rnd.sample(range(1, 43), 6)
 
 def calculate_matches(ticket: List[int], winning_numbers: List[int]) -> int:
     """计算匹配的数字数量"""
-    return len(set(ticket) & set(winning_numbers))
+    return match_count(numbers_to_mask(ticket), numbers_to_mask(winning_numbers))
 
 def calculate_prize(matches: int, jackpot: float, total_cards: int) -> float:
     """根据匹配数计算奖金"""
@@ -35,7 +44,11 @@ def simulate_lottery(num_rounds: int = 100,
                     players_range: Tuple[int, int] = (490000, 510000),
                     cards_per_player_range: Tuple[int, int] = (9, 11),
                     ticket_price: float = 20.0,
-                    initial_jackpot: float = 10000000.0) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+                    initial_jackpot: float = 10000000.0,
+                    engine: str = 'python',
+                    seed: Optional[int] = None,
+                    first_round: int = 1,
+                    timer: Optional[PhaseTimer] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     模拟多轮彩票开奖
     
@@ -45,6 +58,13 @@ def simulate_lottery(num_rounds: int = 100,
         cards_per_player_range: 每个玩家购买彩票数量范围
         ticket_price: 每张彩票价格
         initial_jackpot: 初始奖池金额
+        engine: 模拟引擎，'python'逐注模拟（循环由kernels模块的JIT或纯Python后端执行），
+            'numpy'按轮批量向量化模拟。实际使用的后端记录在summary_df.attrs['kernel_backend']中
+        seed: 随机种子。指定后每轮使用由(种子, 轮次)确定的独立随机数流，结果可复现；
+            python引擎未指定时沿用全局random模块
+        first_round: 起始轮次编号。配合seed和该轮的initial_jackpot，
+            可以单独重新模拟任意一轮而无需重放之前的轮次
+        timer: 分阶段计时器，未指定时新建；各阶段耗时记录在summary_df.attrs['timings']中
     
     Returns:
         Tuple[DataFrame, DataFrame, DataFrame]: 
@@ -52,14 +72,27 @@ def simulate_lottery(num_rounds: int = 100,
             - 最后一轮详细投注数据
             - 中头奖记录
     """
+    timer = timer if timer is not None else PhaseTimer()
+    if engine == 'numpy':
+        return _simulate_lottery_numpy(num_rounds, players_range, cards_per_player_range,
+                                       ticket_price, initial_jackpot, RNGStreams(seed), first_round, timer)
+    if engine != 'python':
+        raise ValueError(f"未知的模拟引擎: {engine}")
+    
     summary_data = []
     jackpot_winners = []
     current_jackpot = initial_jackpot
+    detail_df = pd.DataFrame()
+    streams = RNGStreams(seed) if seed is not None else None
+    last_round_num = first_round + num_rounds - 1
     
-    for round_num in range(1, num_rounds + 1):
+    for round_num in range(first_round, last_round_num + 1):
+        rnd = streams.python_random(round_num) if streams else random
+        
         # 生成本轮玩家数和中奖号码
-        num_players = random.randint(*players_range)
-        winning_numbers = generate_random_numbers()
+        num_players = rnd.randint(*players_range)
+        winning_numbers = generate_random_numbers(rnd)
+        winning_mask = numbers_to_mask(winning_numbers)
         
         # 初始化本轮统计数据
         round_stats = {
@@ -77,46 +110,42 @@ def simulate_lottery(num_rounds: int = 100,
             round_stats[f'{i}th_count'] = 0
             round_stats[f'{i}th_amount'] = 0
         
-        # 存储最后一轮的详细投注数据
-        last_round_bets = [] if round_num == num_rounds else None
+        # 逐注模拟本轮全部投注，循环在kernels中执行（JIT或纯Python后端）
+        last_round = round_num == last_round_num
+        with timer.phase('tickets'):
+            total_cards, match_counts, jackpots, detail = play_round(
+                num_players, cards_per_player_range, winning_mask, rnd, record=last_round)
+        round_stats['total_cards'] = total_cards
+        round_stats['total_bet_amount'] = total_cards * ticket_price
         
-        # 模拟每个玩家的投注
-        for player_id in range(num_players):
-            num_cards = random.randint(*cards_per_player_range)
-            round_stats['total_cards'] += num_cards
-            round_stats['total_bet_amount'] += num_cards * ticket_price
-            
-            # 处理每张彩票
-            for card_id in range(num_cards):
-                ticket = generate_random_numbers()
-                matches = calculate_matches(ticket, winning_numbers)
-                prize = calculate_prize(matches, current_jackpot, round_stats['total_cards'])
-                
-                # 更新奖级统计
-                if matches >= 2:
-                    tier = 7 - matches  # 6匹配=1等奖，5匹配=2等奖，以此类推
-                    round_stats[f'{tier}th_count'] += 1
-                    round_stats[f'{tier}th_amount'] += prize
-                
-                # 记录头奖信息
-                if matches == 6:
-                    jackpot_winners.append({
-                        'round': round_num,
-                        'player_id': player_id,
-                        'card_id': card_id,
-                        'ticket': ticket,
-                        'prize': prize
-                    })
-                
-                # 存储最后一轮的详细数据
-                if last_round_bets is not None:
-                    last_round_bets.append({
-                        'player_id': player_id,
-                        'card_id': card_id,
-                        'ticket': ticket,
-                        'matches': matches,
-                        'prize': prize
-                    })
+        # 更新奖级统计，6匹配=1等奖，5匹配=2等奖，以此类推
+        prizes = [calculate_prize(matches, current_jackpot, total_cards) for matches in range(7)]
+        for matches in range(2, 7):
+            tier = 7 - matches
+            round_stats[f'{tier}th_count'] = int(match_counts[matches])
+            round_stats[f'{tier}th_amount'] = int(match_counts[matches]) * prizes[matches]
+        
+        # 记录头奖信息
+        for player_id, card_id, ticket_mask in jackpots.tolist():
+            jackpot_winners.append({
+                'round': round_num,
+                'player_id': player_id,
+                'card_id': card_id,
+                'ticket': mask_to_numbers(ticket_mask),
+                'prize': prizes[6]
+            })
+        
+        # 存储最后一轮的详细数据
+        if last_round and total_cards:
+            player_ids, card_ids, ticket_masks, ticket_matches = detail
+            with timer.phase('dataframe_build'):
+                detail_df = pd.DataFrame({
+                    'player_id': player_ids,
+                    'card_id': card_ids,
+                    'ticket': masks_to_array(ticket_masks).tolist(),
+                    'matches': ticket_matches.astype(np.int64),
+                    'prize': np.array(prizes)[ticket_matches]
+                })
         
         # 计算总派奖金额
         round_stats['total_payout'] = sum(round_stats[f'{i}th_amount'] for i in range(1, 7))
@@ -127,10 +156,132 @@ def simulate_lottery(num_rounds: int = 100,
         round_stats['jackpot_after'] = current_jackpot
         
         summary_data.append(round_stats)
+        timer.sample_memory()
     
     # 转换为DataFrame
-    summary_df = pd.DataFrame(summary_data)
-    detail_df = pd.DataFrame(last_round_bets) if last_round_bets else pd.DataFrame()
-    jackpot_df = pd.DataFrame(jackpot_winners)
+    with timer.phase('dataframe_build'):
+        summary_df = pd.DataFrame(summary_data)
+        jackpot_df = pd.DataFrame(jackpot_winners)
+    summary_df.attrs['kernel_backend'] = KERNEL_BACKEND
+    summary_df.attrs['timings'] = timer.to_dict()
+    
+    return summary_df, detail_df, jackpot_df
+
+def _simulate_lottery_numpy(num_rounds: int,
+                            players_range: Tuple[int, int],
+                            cards_per_player_range: Tuple[int, int],
+                            ticket_price: float,
+                            initial_jackpot: float,
+                            streams: RNGStreams,
+                            first_round: int,
+                            timer: PhaseTimer) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """向量化版本的simulate_lottery，每轮的全部彩票以位掩码数组批量生成和兑奖"""
+    summary_data = []
+    jackpot_winners = []
+    current_jackpot = initial_jackpot
+    detail_df = pd.DataFrame()
+    
+    last_round_num = first_round + num_rounds - 1
+    
+    for round_num in range(first_round, last_round_num + 1):
+        rng = streams.round_generator(round_num)
+        num_players = int(rng.integers(players_range[0], players_range[1] + 1))
+        winning_numbers = sample_winning_numbers(rng)
+        winning_mask = numbers_to_mask(winning_numbers)
+        
+        # 每个玩家的购买注数，以及每位玩家第一注在本轮彩票中的位置
+        cards = rng.integers(cards_per_player_range[0], cards_per_player_range[1] + 1, size=num_players)
+        card_ends = np.cumsum(cards)
+        card_starts = card_ends - cards
+        total_cards = int(card_ends[-1]) if num_players else 0
+        
+        # 分批生成彩票并统计各匹配数的注数
+        match_counts = np.zeros(7, dtype=np.int64)
+        jackpot_idx = []
+        jackpot_tickets = []
+        last_round = round_num == last_round_num
+        round_tickets = []
+        round_matches = []
+        for start in range(0, total_cards, TICKET_CHUNK_SIZE):
+            n_tickets = min(TICKET_CHUNK_SIZE, total_cards - start)
+            with timer.phase('ticket_generation'):
+                tickets = random_ticket_masks(n_tickets, rng)
+            with timer.phase('matching'):
+                matches = count_matches(tickets, winning_mask)
+                match_counts += np.bincount(matches, minlength=7)
+            
+            hits = np.flatnonzero(matches == 6)
+            if hits.size:
+                jackpot_idx.append(hits + start)
+                jackpot_tickets.append(tickets[hits])
+            if last_round:
+                round_tickets.append(tickets)
+                round_matches.append(matches)
+        
+        # 各奖级派奖金额
+        round_stats = {
+            'round': round_num,
+            'num_players': num_players,
+            'winning_numbers': winning_numbers,
+            'jackpot_before': current_jackpot,
+            'total_cards': total_cards,
+            'total_bet_amount': total_cards * ticket_price,
+            'total_payout': 0
+        }
+        prizes = np.zeros(7)
+        for matches in range(7):
+            prizes[matches] = calculate_prize(matches, current_jackpot, total_cards)
+        for i in range(1, 7):
+            round_stats[f'{i}th_count'] = 0
+            round_stats[f'{i}th_amount'] = 0
+        for matches in range(2, 7):
+            tier = 7 - matches  # 6匹配=1等奖，5匹配=2等奖，以此类推
+            round_stats[f'{tier}th_count'] = int(match_counts[matches])
+            round_stats[f'{tier}th_amount'] = int(match_counts[matches]) * prizes[matches]
+        
+        # 记录头奖信息
+        if jackpot_idx:
+            ticket_idx = np.concatenate(jackpot_idx)
+            player_ids = np.searchsorted(card_ends, ticket_idx, side='right')
+            winning_tickets = masks_to_array(np.concatenate(jackpot_tickets))
+            for idx, player_id, ticket in zip(ticket_idx, player_ids, winning_tickets):
+                jackpot_winners.append({
+                    'round': round_num,
+                    'player_id': int(player_id),
+                    'card_id': int(idx - card_starts[player_id]),
+                    'ticket': ticket.tolist(),
+                    'prize': prizes[6]
+                })
+        
+        # 最后一轮的详细数据，按票号还原玩家编号和卡号
+        if last_round and round_tickets:
+            with timer.phase('dataframe_build'):
+                tickets = np.concatenate(round_tickets)
+                matches = np.concatenate(round_matches)
+                player_ids = np.repeat(np.arange(num_players), cards)
+                detail_df = pd.DataFrame({
+                    'player_id': player_ids,
+                    'card_id': np.arange(total_cards) - card_starts[player_ids],
+                    'ticket': masks_to_array(tickets).tolist(),
+                    'matches': matches.astype(np.int64),
+                    'prize': prizes[matches]
+                })
+        
+        # 计算总派奖金额
+        round_stats['total_payout'] = sum(round_stats[f'{i}th_amount'] for i in range(1, 7))
+        
+        # 更新奖池
+        pool_contribution = round_stats['total_bet_amount'] * 0.5  # 50%投注额进入奖池
+        current_jackpot = current_jackpot + pool_contribution - round_stats['1th_amount']
+        round_stats['jackpot_after'] = current_jackpot
+        
+        summary_data.append(round_stats)
+        timer.sample_memory()
+    
+    with timer.phase('dataframe_build'):
+        summary_df = pd.DataFrame(summary_data)
+        jackpot_df = pd.DataFrame(jackpot_winners)
+    summary_df.attrs['kernel_backend'] = 'numpy'
+    summary_df.attrs['timings'] = timer.to_dict()
     
-    return summary_df, detail_df, jackpot_df
\ No newline at end of file
+    return summary_df, detail_df, jackpot_df
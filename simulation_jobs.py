@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+后台模拟任务
+
+/simulate只提交任务并立即返回任务ID，客户端通过/jobs/<id>、/jobs/<id>/progress和
+/jobs/<id>/result查询状态、进度和报告，/jobs列出全部任务。
+
+任务在进程池中执行，同时执行的任务数有上限，多个任务真正并行，互不覆盖进度。
+工作进程异常退出（如内存不足被杀）后进程池不再可用，池中的任务均标记为失败，
+下一次提交时重新创建进程池。
+工作进程通过队列把每个任务的进度（限速发送）和各阶段计时发回服务进程，
+由后台线程更新任务登记表，并发布到ProgressBroadcaster供SSE订阅。
+已结束的任务在保留期（TTL）后从登记表中移除。
+"""
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from lottery_simulator import LotterySimulator
+from report_generator import chart_source, generate_report
+from phase_timer import add_observer
+from metrics import ACTIVE_JOBS, PHASE_SECONDS, QUEUE_DEPTH, record_rounds
+from progress_stream import ProgressBroadcaster
+
+# 同时执行的模拟任务数
+MAX_WORKERS = 2
+# 排队等待执行的任务数上限
+MAX_QUEUED = 32
+# 已结束任务的保留时间（秒）
+JOB_TTL = 3600
+# 工作进程发送进度的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class JobQueueFull(RuntimeError):
+    """排队的任务已达上限"""
+
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M:%S") if value is not None else None
+
+
+# ---------------------------------------------------------------- 工作进程
+
+_progress_queue = None
+_phase_buffer: List[tuple] = []
+
+
+def _init_worker(progress_queue) -> None:
+    global _progress_queue
+    _progress_queue = progress_queue
+    add_observer(_buffer_phase)
+
+
+def _buffer_phase(name: str, wall: float) -> None:
+    _phase_buffer.append((name, wall))
+
+
+def _take_phases() -> List[tuple]:
+    phases = _phase_buffer[:]
+    del _phase_buffer[:]
+    return phases
+
+
+class _ProgressReporter:
+    """在工作进程中按PROGRESS_INTERVAL限速发送任务进度"""
+
+    def __init__(self, job_id: str, total_rounds: int):
+        self.job_id = job_id
+        self.total_rounds = total_rounds
+        self.simulator: Optional[LotterySimulator] = None
+        self.total_tickets = 0
+        self.last_sent = 0.0
+
+    def on_round(self, round_num: int, total_cards: int) -> None:
+        self.total_tickets += total_cards
+        now = time.monotonic()
+        if now - self.last_sent >= PROGRESS_INTERVAL or round_num == self.total_rounds:
+            self.last_sent = now
+            self.send(round_num)
+
+    def on_tick(self, round_progress: dict) -> None:
+        """轮内进度，轮次按已完成的轮数发送"""
+        now = time.monotonic()
+        if now - self.last_sent >= PROGRESS_INTERVAL:
+            self.last_sent = now
+            self.send(round_progress["round"] - 1)
+
+    def send(self, round_num: int) -> None:
+        _progress_queue.put((self.job_id, "progress", {
+            "current_round": round_num,
+            "total_tickets": self.total_tickets,
+            "summary": self.simulator.get_progress() if self.simulator is not None else None,
+            "phases": _take_phases(),
+        }))
+
+
+def _run_job(job_id: str, params: Dict[str, Any]) -> tuple:
+    """
+    在工作进程中运行一次模拟
+
+    Returns:
+        (generate_report生成的报告, 缩放图表所需的全分辨率数据, 总注数)
+    """
+    _take_phases()
+    _progress_queue.put((job_id, "started", None))
+    reporter = _ProgressReporter(job_id, params["num_rounds"])
+    simulator = LotterySimulator(on_round=reporter.on_round, on_tick=reporter.on_tick, **params)
+    reporter.simulator = simulator
+    summary_df, detail_df, jackpot_df = simulator.run_simulation()
+    report = generate_report(summary_df, detail_df, jackpot_df, timer=simulator.timer)
+    _progress_queue.put((job_id, "phases", {"phases": _take_phases()}))
+    return report, chart_source(summary_df), reporter.total_tickets
+
+
+# ---------------------------------------------------------------- 服务进程
+
+class SimulationJob:
+    """一次模拟任务的参数、状态、进度和报告"""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.report: Optional[dict] = None
+        # 趋势图的全分辨率数据，供按轮次范围缩放
+        self.chart_data = None
+        self.current_round = 0
+        self.total_tickets = 0
+        self.summary: Optional[dict] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (FINISHED, FAILED)
+
+    def to_dict(self) -> dict:
+        """任务状态，可直接序列化为JSON"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": _timestamp(self.created_at),
+            "started_at": _timestamp(self.started_at),
+            "finished_at": _timestamp(self.finished_at),
+            "current_round": self.current_round,
+            "total_rounds": self.params["num_rounds"],
+            "error": self.error,
+        }
+
+    def progress(self) -> dict:
+        """任务进度；模拟器已生成中间摘要时一并返回"""
+        total_rounds = self.params["num_rounds"]
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        data = {
+            "progress": self.current_round / total_rounds * 100 if total_rounds else 0.0,
+            "current_round": self.current_round,
+            "total_rounds": total_rounds,
+            "total_tickets": self.total_tickets,
+            "elapsed_seconds": elapsed,
+        }
+        if self.summary:
+            data["summary"] = self.summary
+        return {"job_id": self.id, "status": self.status, "data": data}
+
+    def stream_state(self) -> dict:
+        """推送给SSE订阅者的一层进度状态"""
+        progress = self.progress()
+        return {"job_id": self.id, "status": self.status, "error": self.error, **progress["data"]}
+
+
+class JobRegistry:
+    """线程安全的任务登记表，任务在进程池中执行"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_queued: int = MAX_QUEUED, ttl: float = JOB_TTL,
+                 broadcaster: Optional[ProgressBroadcaster] = None):
+        """
+        Args:
+            max_workers: 同时执行的任务数
+            max_queued: 排队等待执行的任务数上限，超过时submit抛出JobQueueFull
+            ttl: 已结束任务的保留时间（秒）
+            broadcaster: 发布任务进度的频道（频道名为任务ID）
+        """
+        self.broadcaster = broadcaster
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.jobs: Dict[str, SimulationJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._progress_queue = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # 第一次提交任务时才启动工作进程和进度接收线程；
+        # 服务进程中已有线程，工作进程用spawn启动，避免fork继承锁状态
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            if self._progress_queue is None:
+                self._progress_queue = context.Queue()
+                threading.Thread(target=self._listen, name="simulation-job-progress", daemon=True).start()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                 initializer=_init_worker, initargs=(self._progress_queue,))
+        return self._executor
+
+    def _submit_to_pool(self, job: SimulationJob) -> Future:
+        try:
+            return self._get_executor().submit(_run_job, job.id, job.params)
+        except BrokenProcessPool:
+            # 有工作进程异常退出，旧进程池不再接受任务，换用新的进程池
+            logger.warning("模拟进程池已损坏，重新创建")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            return self._get_executor().submit(_run_job, job.id, job.params)
+
+    def submit(self, params: Dict[str, Any]) -> SimulationJob:
+        """提交任务，立即返回"""
+        job = SimulationJob(params)
+        with self._lock:
+            self._evict_expired()
+            queued = sum(1 for other in self.jobs.values() if other.status == QUEUED)
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"排队的模拟任务已达上限{self.max_queued}，请稍后再试")
+            # 提交成功后才登记，提交失败的任务不会一直停留在排队状态
+            future = self._submit_to_pool(job)
+            self.jobs[job.id] = job
+            self._update_gauges()
+            self._publish(job, force=True)
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def get(self, job_id: str) -> Optional[SimulationJob]:
+        with self._lock:
+            self._evict_expired()
+            return self.jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None) -> List[SimulationJob]:
+        """按提交时间排列的任务，可按状态筛选"""
+        with self._lock:
+            self._evict_expired()
+            jobs = sorted(self.jobs.values(), key=lambda job: job.created_at)
+        return [job for job in jobs if status is None or job.status == status]
+
+    def _evict_expired(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.done and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+            if self.broadcaster is not None:
+                self.broadcaster.discard(job_id)
+
+    def _publish(self, job: SimulationJob, force: bool = False) -> None:
+        if self.broadcaster is not None:
+            self.broadcaster.publish(job.id, job.stream_state(), force)
+
+    def _update_gauges(self) -> None:
+        QUEUE_DEPTH.set(sum(1 for job in self.jobs.values() if job.status == QUEUED))
+        ACTIVE_JOBS.set(sum(1 for job in self.jobs.values() if job.status == RUNNING))
+
+    def _finish(self, job: SimulationJob, future: Future) -> None:
+        error = future.exception()
+        with self._lock:
+            if error is None:
+                job.report, job.chart_data, total_tickets = future.result()
+                # 结果与进度经不同的管道返回，最后几条进度可能尚未处理（之后也会被忽略），
+                # 这里补记剩余的轮数和注数
+                total_rounds = job.params["num_rounds"]
+                record_rounds(max(0, total_rounds - job.current_round), max(0, total_tickets - job.total_tickets))
+                job.current_round = total_rounds
+                job.total_tickets = max(job.total_tickets, total_tickets)
+                job.status = FINISHED
+            else:
+                job.error = str(error)
+                job.status = FAILED
+            job.finished_at = time.time()
+            job.started_at = job.started_at or job.finished_at
+            self._update_gauges()
+            self._publish(job, force=True)
+
+    def _listen(self) -> None:
+        """接收工作进程发回的任务进度"""
+        while True:
+            job_id, kind, payload = self._progress_queue.get()
+            # 单条消息出错不能终止接收线程，否则之后所有任务都收不到进度
+            try:
+                self._handle_message(job_id, kind, payload)
+            except Exception:
+                logger.exception("处理任务%s的%s消息失败", job_id, kind)
+
+    def _handle_message(self, job_id: str, kind: str, payload: Optional[dict]) -> None:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            if kind == "started":
+                if job.status == QUEUED:
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    self._update_gauges()
+                    self._publish(job, force=True)
+                return
+            # 任务结束后才到达的进度已由_finish计入，忽略
+            if kind == "progress" and job.status in (QUEUED, RUNNING):
+                record_rounds(max(0, payload["current_round"] - job.current_round),
+                              max(0, payload["total_tickets"] - job.total_tickets))
+                job.current_round = max(job.current_round, payload["current_round"])
+                job.total_tickets = max(job.total_tickets, payload["total_tickets"])
+                job.summary = payload["summary"] or job.summary
+                self._publish(job)
+        for name, wall in payload["phases"]:
+            PHASE_SECONDS.observe(wall, phase=name)
@@ -7,7 +7,21 @@ const globals = {
     currentPage: 1,
     itemsPerPage: 10,
     currentSort: { field: 'round', direction: 'asc' },
-    progressTimer: null
+    progressTimer: null,
+    progressSource: null,
+    progressState: null,
+    jobId: null,
+    chartPoints: null
+};
+
+const PROGRESS_INTERVAL = 2000;  // 浏览器不支持EventSource时的进度查询间隔（毫秒）
+
+// 服务器以{dtype, bdata}（小端字节的base64）发送的数值序列对应的TypedArray
+const TYPED_ARRAYS = {
+    f8: Float64Array, f4: Float32Array,
+    i4: Int32Array, u4: Uint32Array,
+    i2: Int16Array, u2: Uint16Array,
+    i1: Int8Array, u1: Uint8Array
 };
 // 数据处理函数
 function processDetailedData(data) {
@@ -93,6 +107,33 @@ function logError(message, error, data = null) {
 }
 
 // 格式化函数
+// 把类型数组还原为TypedArray，其他值原样返回
+function decodeTypedArray(value) {
+    if (!value || typeof value.bdata !== 'string' || !TYPED_ARRAYS[value.dtype]) {
+        return value;
+    }
+    const binary = atob(value.bdata);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new TYPED_ARRAYS[value.dtype](bytes.buffer);
+}
+
+// 还原曲线列表中的x和y
+function decodeTraces(traces) {
+    (traces || []).forEach(trace => {
+        trace.x = decodeTypedArray(trace.x);
+        trace.y = decodeTypedArray(trace.y);
+    });
+    return traces;
+}
+
+function decodeCharts(charts) {
+    Object.values(charts || {}).forEach(chart => decodeTraces(chart.data));
+    return charts;
+}
+
 function formatNumber(num) {
     return new Intl.NumberFormat('zh-CN').format(num);
 }
@@ -106,6 +147,14 @@ function formatCurrency(amount) {
     }).format(amount);
 }
 
+function formatDuration(seconds) {
+    const total = Math.round(seconds);
+    const h = Math.floor(total / 3600);
+    const m = Math.floor((total % 3600) / 60);
+    const s = total % 60;
+    return h > 0 ? `${h}小时${m}分${s}秒` : (m > 0 ? `${m}分${s}秒` : `${s}秒`);
+}
+
 function formatPercentage(value) {
     return new Intl.NumberFormat('zh-CN', {
         style: 'percent',
@@ -182,14 +231,18 @@ $(document).ready(function() {
         globals.detailedData = [];
         globals.currentPage = 1;
 
-        // 发送模拟请求
+        // 提交模拟任务，模拟在服务器后台执行
+        stopProgressCheck();
+        $('#progressInfo').empty();
         $.ajax({
             url: '/simulate',
             method: 'POST',
             data: JSON.stringify(formData),
             contentType: 'application/json',
             success: function(response) {
-                handleSimulationResponse(response);
+                logData('模拟任务已提交', response);
+                globals.jobId = response.job_id;
+                startProgressCheck();
             },
             error: function(xhr, status, error) {
                 handleSimulationError(xhr, status, error);
@@ -212,8 +265,9 @@ function handleSimulationResponse(response) {
         // 更新统计数据
         updateSummaryStats(response.summary_stats);
 
-        // 处理图表数据
-        handleChartData(response.charts);
+        // 处理图表数据，曲线已降采样到每条最多chart_resolution.points_per_trace个点
+        globals.chartPoints = response.chart_resolution ? response.chart_resolution.points_per_trace : null;
+        handleChartData(decodeCharts(response.charts));
 
         // 更新奖级统计表格
         updatePrizeStats(response.tables.prize_stats);
@@ -466,7 +520,10 @@ function drawCharts(charts) {
     if (charts.jackpot_trend) {
         logData('绘制头奖趋势图', charts.jackpot_trend);
         Plotly.newPlot('jackpotTrendChart', charts.jackpot_trend.data, charts.jackpot_trend.layout)
-            .then(() => logData('头奖趋势图绘制成功'))
+            .then(() => {
+                logData('头奖趋势图绘制成功');
+                enableChartZoom('jackpotTrendChart', 'jackpot_trend', charts.jackpot_trend.data);
+            })
             .catch(err => logError('头奖趋势图绘制失败', err));
     } else {
         logData('无头奖趋势数据');
@@ -476,13 +533,62 @@ function drawCharts(charts) {
     if (charts.money_comparison) {
         logData('绘制资金对比图', charts.money_comparison);
         Plotly.newPlot('moneyComparisonChart', charts.money_comparison.data, charts.money_comparison.layout)
-            .then(() => logData('资金对比图绘制成功'))
+            .then(() => {
+                logData('资金对比图绘制成功');
+                enableChartZoom('moneyComparisonChart', 'money_comparison', charts.money_comparison.data);
+            })
             .catch(err => logError('资金对比图绘制失败', err));
     } else {
         logData('无资金对比数据');
     }
 }
 
+// 放大趋势图时按可见的轮次范围重新获取数据，双击还原时恢复总览曲线
+function enableChartZoom(elementId, chartName, traces) {
+    const element = document.getElementById(elementId);
+    if (!globals.jobId || !element || !element.on) {
+        return;
+    }
+    const jobId = globals.jobId;
+    const overview = {
+        x: traces.map(trace => trace.x),
+        y: traces.map(trace => trace.y)
+    };
+    element.on('plotly_relayout', function(event) {
+        if (event['xaxis.autorange']) {
+            Plotly.restyle(element, overview);
+            return;
+        }
+        const range = event['xaxis.range'] || [event['xaxis.range[0]'], event['xaxis.range[1]']];
+        if (range[0] === undefined || range[1] === undefined) {
+            return;
+        }
+        const params = {
+            start_round: Math.floor(range[0]),
+            end_round: Math.ceil(range[1])
+        };
+        // 范围内的轮次不超过点数上限时即为全分辨率
+        if (globals.chartPoints) {
+            params.points = globals.chartPoints;
+        }
+        $.ajax({
+            url: `/jobs/${jobId}/charts/${chartName}`,
+            method: 'GET',
+            data: params,
+            success: function(response) {
+                decodeTraces(response.data);
+                Plotly.restyle(element, {
+                    x: response.data.map(trace => trace.x),
+                    y: response.data.map(trace => trace.y)
+                });
+            },
+            error: function(xhr, status, error) {
+                logError('获取缩放数据失败', error);
+            }
+        });
+    });
+}
+
 function updatePrizeStats(prizeStats) {
     if (!prizeStats || !Array.isArray(prizeStats)) {
         logError('无效的奖级统计数据');
@@ -604,52 +710,121 @@ function createJackpotChart(data) {
 }
 
 function startProgressCheck() {
-    if (!globals.progressTimer) {
-        globals.progressTimer = setInterval(checkProgress, 30000);  // 每30秒检查一次
+    if (window.EventSource) {
+        subscribeProgress(globals.jobId);
+    } else if (!globals.progressTimer) {
+        checkProgress();
+        globals.progressTimer = setInterval(checkProgress, PROGRESS_INTERVAL);
     }
 }
 
 function stopProgressCheck() {
+    if (globals.progressSource) {
+        globals.progressSource.close();
+        globals.progressSource = null;
+    }
     if (globals.progressTimer) {
         clearInterval(globals.progressTimer);
         globals.progressTimer = null;
     }
 }
 
+// 订阅服务器推送的任务进度：先收到完整快照，之后只收到变化的字段
+function subscribeProgress(jobId) {
+    if (globals.progressSource) {
+        return;
+    }
+    const source = new EventSource(`/jobs/${jobId}/events`);
+    globals.progressSource = source;
+    globals.progressState = {};
+
+    source.addEventListener('snapshot', function(e) {
+        globals.progressState = JSON.parse(e.data);
+        updateProgressDisplay(globals.progressState);
+    });
+    source.addEventListener('progress', function(e) {
+        Object.assign(globals.progressState, JSON.parse(e.data));
+        updateProgressDisplay(globals.progressState);
+    });
+    source.addEventListener('done', function() {
+        stopProgressCheck();
+        fetchJobResult(jobId);
+    });
+    source.onerror = function() {
+        // 连接无法恢复时改为定时查询
+        if (source.readyState === EventSource.CLOSED) {
+            stopProgressCheck();
+            checkProgress();
+            globals.progressTimer = setInterval(checkProgress, PROGRESS_INTERVAL);
+        }
+    };
+}
+
 function checkProgress() {
+    if (!globals.jobId) {
+        stopProgressCheck();
+        return;
+    }
     $.ajax({
-        url: '/progress',
+        url: `/jobs/${globals.jobId}/progress`,
         method: 'GET',
         success: function(response) {
-            if (response.status === 'running' && response.data) {
+            if (response.data) {
                 updateProgressDisplay(response.data);
-            } else if (response.status === 'not_running') {
+            }
+            if (response.status === 'finished' || response.status === 'failed') {
                 stopProgressCheck();
+                fetchJobResult(globals.jobId);
             }
         },
         error: function(xhr, status, error) {
             console.error('进度查询失败：', error);
+            if (xhr.status === 404) {
+                stopProgressCheck();
+            }
+        }
+    });
+}
+
+function fetchJobResult(jobId) {
+    $.ajax({
+        url: `/jobs/${jobId}/result`,
+        method: 'GET',
+        success: function(response) {
+            $('#progressInfo').empty();
+            handleSimulationResponse(response);
+        },
+        error: function(xhr, status, error) {
+            const message = xhr.responseJSON && xhr.responseJSON.message ? xhr.responseJSON.message : error;
+            handleSimulationError(xhr, status, message);
         }
     });
 }
 
 function updateProgressDisplay(progress) {
-    const stats = progress.current_stats;
-    const completionRate = (progress.completed_rounds / progress.total_rounds * 100).toFixed(1);
+    const completionRate = progress.progress.toFixed(1);
+    const summary = progress.summary;
+    const roundProgress = summary ? summary.round_progress : null;
     
     // 更新进度信息
     $('#progressInfo').html(`
         <div class="alert alert-info">
             <h4>模拟进度：${completionRate}%</h4>
-            <p>已完成轮次：${progress.completed_rounds} / ${progress.total_rounds}</p>
+            <p>已完成轮次：${progress.current_round} / ${progress.total_rounds}</p>
+            <p>已模拟注数：${formatNumber(progress.total_tickets)}</p>
+            ${roundProgress ? `
+            <p>第 ${roundProgress.round} 轮：${roundProgress.round_progress.toFixed(1)}%
+               （${formatNumber(roundProgress.tickets_done)} / 约 ${formatNumber(roundProgress.tickets_expected)} 注）</p>
+            <p>速度：${roundProgress.tickets_per_sec ? formatNumber(Math.round(roundProgress.tickets_per_sec)) : '-'} 注/秒，
+               预计剩余：${roundProgress.eta_seconds !== null ? formatDuration(roundProgress.eta_seconds) : '-'}</p>` : ''}
+            ${summary ? `
             <p>当前统计：</p>
             <ul>
-                <li>平均玩家数：${stats.avg_players.toFixed(2)}</li>
-                <li>总投注金额：￥${stats.total_bet_amount.toLocaleString()}</li>
-                <li>总派奖金额：￥${stats.total_payout.toLocaleString()}</li>
-                <li>一等奖中奖次数：${stats.jackpot_hits}</li>
-                <li>当前返奖率：${stats.current_rtp.toFixed(2)}%</li>
-            </ul>
+                <li>平均玩家数：${formatNumber(summary.player_count)}</li>
+                <li>总投注金额：${formatCurrency(summary.total_bets)}</li>
+                <li>总派奖金额：${formatCurrency(summary.total_payouts)}</li>
+                <li>当前返奖率：${summary.payout_ratio.toFixed(2)}%</li>
+            </ul>` : ''}
         </div>
     `);
-}
\ No newline at end of file
+}
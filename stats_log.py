@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+"""
+阶段性统计的追加式存储
+
+save_interval_stats每10秒产生一条统计快照。原先每条写一个stats_*.json文件，
+各查询端点每次都要列目录并读取全部文件。StatsLog把快照追加到SQLite表中，
+按时间戳建索引，时间范围查询只读取范围内的行；StatsAnalysis增量维护
+analyze_stats的结果，新请求只处理上次之后追加的快照。
+
+快照按TIERS分层汇总：10秒的原始快照保留1小时，之后合并为每分钟一条，
+保留1天，再合并为每小时一条并永久保留。快照中的计数器是本次模拟的累计值，
+合并时取分组内最后一条快照的计数器和与之对应的RTP（累计派奖/累计投注），
+而不是对各快照的RTP取平均；内存取分组内的峰值。查询按时间范围选择分辨率，
+使返回的点数不超过MAX_POINTS，长时间运行的趋势图仍然很便宜。
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 表列与快照字段的对应关系：(列名, 列类型)
+COLUMNS = (
+    ("ts", "REAL NOT NULL"),
+    ("timestamp", "TEXT"),
+    ("elapsed_time", "TEXT"),
+    ("completed_rounds", "INTEGER"),
+    ("total_rounds", "INTEGER"),
+    ("completion_percentage", "REAL"),
+    ("total_players", "INTEGER"),
+    ("total_bets", "REAL"),
+    ("total_payouts", "REAL"),
+    ("jackpot_hits", "INTEGER"),
+    ("rtp", "REAL"),
+    ("prize_1", "INTEGER"),
+    ("prize_2", "INTEGER"),
+    ("prize_3", "INTEGER"),
+    ("prize_4", "INTEGER"),
+    ("memory_usage", "REAL"),
+    ("stats_elapsed_time", "TEXT"),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+# 分层汇总使用的列：模拟批次、合并的原始快照数、所在层级
+ROLLUP_COLUMNS = (
+    ("run_id", "TEXT"),
+    ("samples", "INTEGER NOT NULL DEFAULT 1"),
+    ("tier", "INTEGER NOT NULL DEFAULT 0"),
+)
+ROW_NAMES = COLUMN_NAMES + tuple(name for name, _ in ROLLUP_COLUMNS)
+
+# 导出的列及其pyarrow类型名
+_ARROW_TYPES = {"REAL": "double", "INTEGER": "int64", "TEXT": "string"}
+EXPORT_TYPES = {name: _ARROW_TYPES[kind.split()[0]] for name, kind in COLUMNS[1:] + ROLLUP_COLUMNS[1:]}
+EXPORT_COLUMNS = tuple(EXPORT_TYPES)
+
+# 汇总层级：(分辨率秒数, 该层保留秒数)，最后一层永久保留
+TIERS = ((10, 3600), (60, 86400), (3600, None))
+# 按时间范围选择分辨率时，返回的点数上限
+MAX_POINTS = 1440
+
+TimeValue = Union[None, str, float, int, datetime]
+
+
+def parse_time(value: TimeValue) -> Optional[float]:
+    """把时间（'YYYY-mm-dd HH:MM:SS'、ISO格式、datetime或Unix时间戳）转换为Unix时间戳"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, TIME_FORMAT).timestamp()
+    except ValueError:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            raise ValueError(f"无法识别的时间: {value}")
+
+
+def stats_to_row(stats: Dict[str, Any], run_id: Optional[str] = None) -> tuple:
+    """把save_interval_stats的快照字典转换为表中的一行（原始层级）"""
+    inner = stats.get("stats", {})
+    prize_counts = {str(k): v for k, v in inner.get("prize_counts", {}).items()}
+    timestamp = stats.get("timestamp") or datetime.now().strftime(TIME_FORMAT)
+    return (
+        parse_time(timestamp),
+        timestamp,
+        stats.get("elapsed_time"),
+        int(stats.get("completed_rounds", 0)),
+        int(stats.get("total_rounds", 0)),
+        float(stats.get("completion_percentage", 0)),
+        int(inner.get("total_players", 0)),
+        float(inner.get("total_bets", 0.0)),
+        float(inner.get("total_payouts", 0.0)),
+        int(inner.get("jackpot_hits", 0)),
+        float(inner.get("rtp", 0.0)),
+        int(prize_counts.get("1", 0)),
+        int(prize_counts.get("2", 0)),
+        int(prize_counts.get("3", 0)),
+        int(prize_counts.get("4", 0)),
+        float(inner["memory_usage"]) if inner.get("memory_usage") is not None else None,
+        inner.get("elapsed_time"),
+        run_id,
+        1,
+        0,
+    )
+
+
+def row_to_stats(row) -> Dict[str, Any]:
+    """把表中的一行还原为与原stats_*.json文件相同结构的字典"""
+    return {
+        "timestamp": row["timestamp"],
+        "elapsed_time": row["elapsed_time"],
+        "completed_rounds": row["completed_rounds"],
+        "total_rounds": row["total_rounds"],
+        "completion_percentage": row["completion_percentage"],
+        "stats": {
+            "total_players": row["total_players"],
+            "total_bets": row["total_bets"],
+            "total_payouts": row["total_payouts"],
+            "jackpot_hits": row["jackpot_hits"],
+            "prize_counts": {str(level): row[f"prize_{level}"] for level in range(1, 5)},
+            "rtp": row["rtp"],
+            "memory_usage": row["memory_usage"],
+            "elapsed_time": row["stats_elapsed_time"],
+        },
+    }
+
+
+def merge_rows(rows: List[Any]) -> Dict[str, Any]:
+    """
+    合并同一模拟批次、同一时间分组内的若干行
+
+    计数器是累计值，取最后一行的计数器和对应的RTP；内存取峰值，samples相加。
+    """
+    merged = dict(zip(ROW_NAMES, (rows[-1][name] for name in ROW_NAMES)))
+    merged["id"] = rows[-1]["id"]
+    memory = [row["memory_usage"] for row in rows if row["memory_usage"] is not None]
+    merged["memory_usage"] = max(memory) if memory else None
+    merged["samples"] = sum(row["samples"] for row in rows)
+    return merged
+
+
+def _merge_groups(groups: Dict[Any, List[Any]]) -> List[Dict[str, Any]]:
+    """合并同一时间分组内各模拟批次（run_id -> 行）的行，按时间排列"""
+    merged = [merge_rows(group) for group in groups.values()]
+    merged.sort(key=lambda row: (row["ts"], row["id"]))
+    return merged
+
+
+def downsample(rows: Iterable[Any], bucket: int) -> Iterator[Dict[str, Any]]:
+    """
+    把按时间排列的行按bucket秒合并，每个模拟批次的每个时间分组一行
+
+    同时运行的多个批次的快照在时间上交错，先收集整个时间分组，再按批次合并。
+    """
+    groups: Dict[Any, List[Any]] = {}
+    current = None
+    for row in rows:
+        index = int(row["ts"] // bucket)
+        if index != current:
+            yield from _merge_groups(groups)
+            groups, current = {}, index
+        groups.setdefault(row["run_id"], []).append(row)
+    yield from _merge_groups(groups)
+
+
+
+class StatsAnalysis:
+    """可增量更新的统计趋势分析，结果与原analyze_stats相同"""
+
+    TRENDS = ("rtp", "players_per_round", "bets_per_round", "payouts_per_round", "jackpot_frequency")
+
+    def __init__(self):
+        self.trends: Dict[str, List[float]] = {key: [] for key in self.TRENDS}
+        self.sums = {key: 0.0 for key in self.TRENDS}
+        self.peaks: Dict[str, float] = {}
+        self.count = 0
+        self.first_timestamp: Optional[str] = None
+        self.last_timestamp: Optional[str] = None
+
+    def add(self, stats: Dict[str, Any]) -> None:
+        """加入一条快照"""
+        self.count += 1
+        if self.first_timestamp is None:
+            self.first_timestamp = stats["timestamp"]
+        self.last_timestamp = stats["timestamp"]
+        completed_rounds = stats["completed_rounds"]
+        if completed_rounds <= 0:
+            return
+        inner = stats["stats"]
+        values = {
+            "rtp": inner["rtp"],
+            "players_per_round": inner["total_players"] / completed_rounds,
+            "bets_per_round": inner["total_bets"] / completed_rounds,
+            "payouts_per_round": inner["total_payouts"] / completed_rounds,
+            "jackpot_frequency": inner["jackpot_hits"] / completed_rounds if inner["jackpot_hits"] > 0 else 0,
+        }
+        for key, value in values.items():
+            self.trends[key].append(value)
+            self.sums[key] += value
+            self.peaks[key] = max(self.peaks[key], value) if key in self.peaks else value
+
+    def extend(self, stats_list: Iterable[Dict[str, Any]]) -> 'StatsAnalysis':
+        for stats in stats_list:
+            self.add(stats)
+        return self
+
+    def copy(self) -> 'StatsAnalysis':
+        other = StatsAnalysis()
+        other.trends = {key: list(values) for key, values in self.trends.items()}
+        other.sums = dict(self.sums)
+        other.peaks = dict(self.peaks)
+        other.count = self.count
+        other.first_timestamp = self.first_timestamp
+        other.last_timestamp = self.last_timestamp
+        return other
+
+    def result(self) -> dict:
+        """analyze_stats格式的分析结果"""
+        if self.count == 0:
+            return {}
+        analysis = {
+            "trends": {key: list(values) for key, values in self.trends.items()},
+            "averages": {key: self.sums[key] / len(values) for key, values in self.trends.items() if values},
+            "peaks": dict(self.peaks),
+            "total_duration": "",
+        }
+        if self.count >= 2:
+            start_time = datetime.strptime(self.first_timestamp, TIME_FORMAT)
+            end_time = datetime.strptime(self.last_timestamp, TIME_FORMAT)
+            analysis["total_duration"] = str(end_time - start_time).split(".")[0]
+        return analysis
+
+
+class _AnalysisCache:
+    """某一分辨率下全部快照的增量分析"""
+
+    def __init__(self, bucket: int):
+        self.bucket = bucket
+        # 已结束的时间分组
+        self.analysis = StatsAnalysis()
+        # 最后一个时间分组可能还会追加快照，暂不计入：模拟批次 -> 行
+        self.pending: Dict[Any, List[Any]] = {}
+        self.pending_index: Optional[int] = None
+        # 已处理的最后一行(ts, id)
+        self.cursor: Optional[tuple] = None
+
+    def update(self, rows: Iterable[Any]) -> None:
+        for row in rows:
+            self.cursor = (row["ts"], row["id"])
+            index = int(row["ts"] // self.bucket)
+            if index != self.pending_index:
+                for merged in _merge_groups(self.pending):
+                    self.analysis.add(row_to_stats(merged))
+                self.pending, self.pending_index = {}, index
+            self.pending.setdefault(row["run_id"], []).append(row)
+
+    def result(self) -> dict:
+        if not self.pending:
+            return self.analysis.result()
+        analysis = self.analysis.copy()
+        for merged in _merge_groups(self.pending):
+            analysis.add(row_to_stats(merged))
+        return analysis.result()
+
+
+class StatsLog:
+    """SQLite中按时间戳索引、分层汇总的阶段性统计快照"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = path
+        self.created = not os.path.exists(path)
+        # 增量分析在持有锁时分批读取，需要可重入
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS + ROLLUP_COLUMNS)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS interval_stats (id INTEGER PRIMARY KEY, {columns})")
+        # 旧版本创建的表没有分层汇总的列
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(interval_stats)")}
+        for name, kind in ROLLUP_COLUMNS:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE interval_stats ADD COLUMN {name} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS interval_stats_ts ON interval_stats (ts)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS interval_stats_tier_ts ON interval_stats (tier, ts)")
+        self._conn.commit()
+        # 分辨率层级 -> 增量分析
+        self._analyses: Dict[int, _AnalysisCache] = {}
+
+    def _insert(self, rows: Iterable[tuple]) -> None:
+        placeholders = ", ".join("?" for _ in ROW_NAMES)
+        self._conn.executemany(f"INSERT INTO interval_stats ({', '.join(ROW_NAMES)}) VALUES ({placeholders})",
+                               rows)
+
+    def append(self, stats: Dict[str, Any], run_id: Optional[str] = None) -> None:
+        """
+        追加一条原始快照
+
+        Args:
+            stats: save_interval_stats的快照字典
+            run_id: 模拟批次标识，不同批次的快照不会合并到一起
+        """
+        with self._lock:
+            self._insert([stats_to_row(stats, run_id)])
+            self._conn.commit()
+
+    def _where(self, start: TimeValue, end: TimeValue):
+        clauses, params = ["1 = 1"], []
+        if parse_time(start) is not None:
+            clauses.append("ts >= ?")
+            params.append(parse_time(start))
+        if parse_time(end) is not None:
+            clauses.append("ts <= ?")
+            params.append(parse_time(end))
+        return " AND ".join(clauses), params
+
+    def _iter_stored(self, start: TimeValue, end: TimeValue, after: Optional[tuple],
+                     batch_size: int) -> Iterator[sqlite3.Row]:
+        where, params = self._where(start, end)
+        while True:
+            # 按(ts, id)分页，每批单独加锁，不长时间占用连接
+            page_where, page_params = where, list(params)
+            if after is not None:
+                page_where += " AND (ts > ? OR (ts = ? AND id > ?))"
+                page_params += [after[0], after[0], after[1]]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM interval_stats WHERE {page_where} ORDER BY ts, id LIMIT ?",
+                    page_params + [batch_size]).fetchall()
+            if not rows:
+                return
+            yield from rows
+            after = (rows[-1]["ts"], rows[-1]["id"])
+
+    def iter_rows(self, start: TimeValue = None, end: TimeValue = None, resolution: Optional[int] = None,
+                  after: Optional[tuple] = None, batch_size: int = 1000) -> Iterator[Any]:
+        """
+        按时间顺序逐批读取范围内的行，内存占用与范围大小无关
+
+        Args:
+            start, end: 时间范围，None表示不限
+            resolution: TIERS中的层级，按该层的分辨率合并；None表示返回存储的各行
+            after: 只读取排在该(ts, id)之后的行
+        """
+        rows = self._iter_stored(start, end, after, batch_size)
+        if resolution is None:
+            return rows
+        return downsample(rows, TIERS[resolution][0])
+
+    def query(self, start: TimeValue = None, end: TimeValue = None, limit: Optional[int] = None,
+              resolution: Optional[int] = None) -> List[dict]:
+        """范围内的快照，结构与原stats_*.json文件相同"""
+        result = []
+        for row in self.iter_rows(start, end, resolution):
+            result.append(row_to_stats(row))
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    def count(self, start: TimeValue = None, end: TimeValue = None) -> int:
+        where, params = self._where(start, end)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM interval_stats WHERE {where}", params).fetchone()[0]
+
+    def latest(self) -> Optional[dict]:
+        """最新的一条快照"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM interval_stats ORDER BY ts DESC, id DESC LIMIT 1").fetchone()
+        return row_to_stats(row) if row is not None else None
+
+    def time_range(self, start: TimeValue = None, end: TimeValue = None) -> Dict[str, Optional[str]]:
+        """范围内第一条和最后一条快照的时间"""
+        where, params = self._where(start, end)
+        with self._lock:
+            first = self._conn.execute(f"SELECT timestamp FROM interval_stats WHERE {where} "
+                                       "ORDER BY ts, id LIMIT 1", params).fetchone()
+            last = self._conn.execute(f"SELECT timestamp FROM interval_stats WHERE {where} "
+                                      "ORDER BY ts DESC, id DESC LIMIT 1", params).fetchone()
+        return {"start": first[0] if first else None, "end": last[0] if last else None}
+
+    def resolution_for(self, start: TimeValue = None, end: TimeValue = None) -> int:
+        """
+        时间范围应使用的TIERS层级
+
+        取返回点数不超过MAX_POINTS的最细分辨率；范围内有已汇总到更粗层级的数据时，
+        不低于该层级的分辨率，使整个范围的点间隔一致。
+        """
+        now = time.time()
+        end_ts = parse_time(end)
+        end_ts = now if end_ts is None else min(end_ts, now)
+        start_ts = parse_time(start)
+        if start_ts is None:
+            with self._lock:
+                start_ts = self._conn.execute("SELECT MIN(ts) FROM interval_stats").fetchone()[0]
+            start_ts = end_ts if start_ts is None else start_ts
+        window = max(end_ts - start_ts, 0)
+        for tier, (bucket, retention) in enumerate(TIERS):
+            rolled_up = retention is not None and start_ts < now - retention
+            if not rolled_up and window / bucket <= MAX_POINTS:
+                return tier
+        return len(TIERS) - 1
+
+    def compact(self, now: TimeValue = None) -> int:
+        """
+        把超过各层保留时间的行合并到下一层，返回被合并的行数
+
+        只合并整个时间分组都已超过保留时间的行，每个分组只合并一次。
+        """
+        now = time.time() if parse_time(now) is None else parse_time(now)
+        compacted = 0
+        with self._lock:
+            for tier, (_, retention) in enumerate(TIERS[:-1]):
+                bucket = TIERS[tier + 1][0]
+                cutoff = (now - retention) // bucket * bucket
+                rows = self._conn.execute("SELECT * FROM interval_stats WHERE tier = ? AND ts < ? ORDER BY ts, id",
+                                          (tier, cutoff)).fetchall()
+                if not rows:
+                    continue
+                merged = [tuple(row[name] for name in ROW_NAMES[:-1]) + (tier + 1,)
+                          for row in downsample(rows, bucket)]
+                self._conn.execute("DELETE FROM interval_stats WHERE tier = ? AND ts < ?", (tier, cutoff))
+                self._insert(merged)
+                self._conn.commit()
+                compacted += len(rows)
+                # 合并只改变比下一层更细的分辨率；读到过被合并行的缓存也要重建
+                for resolution, cache in list(self._analyses.items()):
+                    if resolution <= tier or (cache.cursor is not None and cache.cursor[0] < cutoff):
+                        del self._analyses[resolution]
+        return compacted
+
+    def delete_before(self, before: TimeValue) -> int:
+        """删除早于before的快照（各层级），返回删除的行数"""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM interval_stats WHERE ts < ?", (parse_time(before),)).rowcount
+            self._conn.commit()
+            if deleted:
+                self._analyses.clear()
+        return deleted
+
+    def analyze(self, start: TimeValue = None, end: TimeValue = None, resolution: Optional[int] = None) -> dict:
+        """
+        analyze_stats格式的分析结果
+
+        resolution为None时按时间范围选择分辨率。不指定时间范围时使用该分辨率的增量缓存，
+        只处理上次调用之后追加的快照；指定范围时只读取范围内的快照。
+        """
+        if resolution is None:
+            resolution = self.resolution_for(start, end)
+        if parse_time(start) is not None or parse_time(end) is not None:
+            rows = self.iter_rows(start, end, resolution)
+            return StatsAnalysis().extend(row_to_stats(row) for row in rows).result()
+        with self._lock:
+            cache = self._analyses.get(resolution)
+            if cache is None:
+                cache = self._analyses[resolution] = _AnalysisCache(TIERS[resolution][0])
+            cache.update(self._iter_stored(None, None, cache.cursor, 1000))
+            return cache.result()
+
+    def import_json_dir(self, directory: str) -> int:
+        """导入旧版本写出的stats_*.json文件，返回导入的条数"""
+        import json
+        imported = 0
+        for file in sorted(os.listdir(directory)):
+            if file.startswith("stats_") and file.endswith(".json"):
+                with open(os.path.join(directory, file), "r") as f:
+                    self.append(json.load(f))
+                imported += 1
+        return imported
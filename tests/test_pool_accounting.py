@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""PoolAccount：按注数整批记账与逐注分配（逐注金额取整到分）一致"""
+import pytest
+
+from pool_accounting import PoolAccount
+
+
+def contribute_per_ticket(account: PoolAccount, num_tickets: int):
+    """逐注分配的参考实现"""
+    payoff_ticket = None
+    for ticket in range(1, num_tickets + 1):
+        repay = min(account.repay_cents, -account.funding_cents) if account.funding_cents < 0 else 0
+        account.funding_cents += repay
+        account.jackpot_cents += account.insert_cents - repay
+        if repay and account.funding_cents == 0 and payoff_ticket is None:
+            payoff_ticket = ticket
+    return payoff_ticket
+
+
+@pytest.mark.parametrize("ticket_price, pool_insert, return_pool", [
+    (20.0, 0.43, 0.9),
+    # 每注投入0.774、还款0.6966，均不是整分
+    (2.0, 0.387, 0.9),
+    (2.0, 0.5, 0.0),
+])
+def test_contribute_matches_per_ticket_split(ticket_price, pool_insert, return_pool):
+    batched = PoolAccount(ticket_price, pool_insert, return_pool, initial_jackpot=1_000.0)
+    reference = PoolAccount(ticket_price, pool_insert, return_pool, initial_jackpot=1_000.0)
+    for round_no, num_tickets in enumerate([0, 1, 700, 1_999, 3, 2_500, 10_000]):
+        assert batched.contribute(num_tickets) == contribute_per_ticket(reference, num_tickets)
+        assert (batched.jackpot_cents, batched.funding_cents) == (reference.jackpot_cents, reference.funding_cents)
+        if round_no % 3 == 2:
+            batched.reset_jackpot()
+            reference.reset_jackpot()
+
+
+def test_per_ticket_amounts_rounded_to_cents():
+    account = PoolAccount(2.0, 0.387, 0.9, initial_jackpot=0.0)
+    assert account.insert_cents == 77
+    account.contribute(1_000)
+    assert account.jackpot_pool == 770.0
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""分片引擎：相同seed下结果与workers无关，逐位一致"""
+import pandas as pd
+
+import lottery_simulator_new
+from lottery_simulator_new import LotterySimulator
+
+
+def run(workers):
+    simulator = LotterySimulator(num_rounds=3, players_range=(1800, 2200), cards_per_player_range=(1, 3),
+                                 seed=12345, engine="sharded", workers=workers)
+    return simulator.run_simulation()
+
+
+def test_results_independent_of_workers(monkeypatch):
+    # 缩小分片，使每轮分成多个分片
+    monkeypatch.setattr(lottery_simulator_new, "SHARD_PLAYERS", 500)
+    single = run(1)
+    parallel = run(3)
+    for expected, actual in zip(single, parallel):
+        pd.testing.assert_frame_equal(expected, actual, check_exact=True)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""StatsLog.compact：分层汇总保留累计计数器、内存峰值和快照数"""
+import time
+from datetime import datetime
+
+import pytest
+
+from stats_log import TIME_FORMAT, StatsLog
+
+# 整点开始的1小时，每10秒一条快照
+START = int(time.time()) // 3600 * 3600 - 5 * 86400
+SNAPSHOTS = 360
+
+
+def snapshot(index: int) -> dict:
+    return {
+        "timestamp": datetime.fromtimestamp(START + 10 * index).strftime(TIME_FORMAT),
+        "completed_rounds": index,
+        "total_rounds": SNAPSHOTS,
+        "stats": {
+            "total_players": 100 * index,
+            "total_bets": 20.0 * index,
+            "total_payouts": 10.0 * index,
+            "rtp": 0.5,
+            "prize_counts": {"4": index},
+            "memory_usage": float(index % 7),
+        },
+    }
+
+
+@pytest.fixture
+def log(tmp_path):
+    stats_log = StatsLog(str(tmp_path / "stats.sqlite3"))
+    for index in range(SNAPSHOTS):
+        stats_log.append(snapshot(index), run_id="a")
+    stats_log.append(snapshot(0), run_id="b")
+    return stats_log
+
+
+def stored(stats_log: StatsLog, run_id: str):
+    return [row for row in stats_log.iter_rows() if row["run_id"] == run_id]
+
+
+def test_compact_to_minutes(log):
+    assert log.compact(now=START + 7200) == SNAPSHOTS + 1
+    rows = stored(log, "a")
+    assert len(rows) == 60
+    assert all(row["tier"] == 1 and row["samples"] == 6 for row in rows)
+    # 每分钟取最后一条快照的累计值，内存取峰值
+    assert [row["completed_rounds"] for row in rows] == list(range(5, SNAPSHOTS, 6))
+    assert rows[0]["memory_usage"] == 5.0
+    # 不同批次的快照不会合并
+    assert len(stored(log, "b")) == 1
+    assert log.compact(now=START + 7200) == 0
+
+
+def test_compact_to_hours(log):
+    log.compact(now=START + 3 * 86400)
+    rows = stored(log, "a")
+    assert len(rows) == 1
+    row = rows[0]
+    assert (row["tier"], row["samples"], row["completed_rounds"]) == (2, SNAPSHOTS, SNAPSHOTS - 1)
+    assert row["total_bets"] == 20.0 * (SNAPSHOTS - 1)
+    assert row["prize_4"] == SNAPSHOTS - 1
+    assert row["memory_usage"] == 6.0
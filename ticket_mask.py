@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+6选42彩票号码的64位位掩码表示
+
+号码n对应第n位（第0位不使用），一注号码即6个置位的uint64。
+两注号码的匹配数等于按位与之后的置位数（popcount），
+只有在导出时才需要把位掩码还原为升序号码字符串。
+"""
+import numpy as np
+from typing import Iterable, List
+
+MAX_NUMBER = 42  # 号码范围1-42
+PICK_COUNT = 6   # 每注6个号码
+
+# 2**n查找表，用于把号码数组批量转换为位掩码
+_BIT_VALUES = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+
+
+def numbers_to_mask(numbers: Iterable[int]) -> int:
+    """把一注号码转换为位掩码"""
+    mask = 0
+    for number in numbers:
+        mask |= 1 << number
+    return mask
+
+
+def mask_to_numbers(mask: int) -> List[int]:
+    """把位掩码还原为升序号码列表"""
+    return [number for number in range(1, MAX_NUMBER + 1) if mask >> number & 1]
+
+
+def mask_to_str(mask: int) -> str:
+    """把位掩码还原为逗号分隔的升序号码字符串"""
+    return ",".join(map(str, mask_to_numbers(int(mask))))
+
+
+def match_count(ticket_mask: int, winning_mask: int) -> int:
+    """计算两注号码的匹配数量"""
+    return (ticket_mask & winning_mask).bit_count()
+
+
+class Ticket:
+    """以位掩码存放的一注号码"""
+    __slots__ = ('mask',)
+
+    def __init__(self, mask: int):
+        self.mask = int(mask)
+
+    @classmethod
+    def from_numbers(cls, numbers: Iterable[int]) -> 'Ticket':
+        """由号码列表创建"""
+        numbers = list(numbers)
+        if len(set(numbers)) != PICK_COUNT or not all(1 <= n <= MAX_NUMBER for n in numbers):
+            raise ValueError(f"号码必须是{PICK_COUNT}个1-{MAX_NUMBER}之间的不重复数字: {numbers}")
+        return cls(numbers_to_mask(numbers))
+
+    def numbers(self) -> List[int]:
+        """升序号码列表"""
+        return mask_to_numbers(self.mask)
+
+    def matches(self, other: 'Ticket') -> int:
+        """与另一注号码的匹配数量"""
+        return match_count(self.mask, other.mask)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Ticket) and self.mask == other.mask
+
+    def __hash__(self) -> int:
+        return hash(self.mask)
+
+    def __str__(self) -> str:
+        return mask_to_str(self.mask)
+
+    def __repr__(self) -> str:
+        return f"Ticket({self})"
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """批量计算uint64数组每个元素的置位数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks)
+    # numpy < 2.0 没有bitwise_count，使用SWAR算法
+    x = masks - ((masks >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
+
+
+def count_matches(masks: np.ndarray, winning_mask: int) -> np.ndarray:
+    """批量计算每注号码与中奖号码的匹配数量"""
+    return popcount(masks & np.uint64(winning_mask)).astype(np.uint8, copy=False)
+
+
+def masks_from_array(tickets: np.ndarray) -> np.ndarray:
+    """把(n, 6)号码数组转换为uint64位掩码数组"""
+    tickets = np.asarray(tickets)
+    masks = _BIT_VALUES[tickets[:, 0]]
+    for i in range(1, tickets.shape[1]):
+        masks |= _BIT_VALUES[tickets[:, i]]
+    return masks
+
+
+def masks_to_array(masks: np.ndarray) -> np.ndarray:
+    """把位掩码数组还原为(n, 6)升序号码数组"""
+    remaining = np.array(masks, dtype=np.uint64)
+    tickets = np.empty((remaining.size, PICK_COUNT), dtype=np.uint8)
+    # 依次取出最低置位；2的幂转为float64是精确的，其指数即号码
+    for i in range(PICK_COUNT):
+        lowest = remaining & (~remaining + np.uint64(1))
+        tickets[:, i] = np.frexp(lowest.astype(np.float64))[1] - 1
+        remaining ^= lowest
+    return tickets
+
+
+def masks_to_strings(masks: np.ndarray) -> List[str]:
+    """把位掩码数组还原为逗号分隔的升序号码字符串列表，仅在导出时使用"""
+    return [",".join(map(str, row)) for row in masks_to_array(masks).tolist()]
+
+
+def random_ticket_masks(n_tickets: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    批量随机生成n_tickets注号码的位掩码
+
+    先独立抽取6个号码，再整注重抽置位数不足6（即含重复号码）的注，
+    结果等价于逐注random.sample的均匀分布。
+    """
+    draws = rng.integers(1, MAX_NUMBER + 1, size=(PICK_COUNT, n_tickets), dtype=np.uint8)
+    masks = masks_from_array(draws.T)
+    redraw_idx = np.flatnonzero(popcount(masks) != PICK_COUNT)
+    while redraw_idx.size:
+        draws = rng.integers(1, MAX_NUMBER + 1, size=(PICK_COUNT, redraw_idx.size), dtype=np.uint8)
+        redraw = masks_from_array(draws.T)
+        masks[redraw_idx] = redraw
+        redraw_idx = redraw_idx[popcount(redraw) != PICK_COUNT]
+    return masks